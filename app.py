@@ -1,61 +1,410 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from flask_mysqldb import MySQL
-from werkzeug.security import generate_password_hash, check_password_hash
+import io
+import os
+import hashlib
+import click
+from flask import Flask, Response, current_app, g, jsonify, make_response, render_template, request, redirect, url_for, session, flash, stream_with_context
+from flask.cli import AppGroup
 from functools import wraps
 from datetime import datetime, date
+from jinja2 import FileSystemBytecodeCache
 from config import Config
+from assets import Assets
+from db import Database, PoolTimeout
+from cache import TTLCache
+from instrumentation import Instrumentation
+from limits import Limiter, Overloaded, RateLimited
+from passwords import HashPoolBusy, PasswordHasher
+from markbuffer import MarkBuffer, overlay_counters
+from counters import (ALL_RECORDS_SQL, COUNTERS_REBUILD_SQL, SERIES_REBUILD_SQL, counter_delta, adjust_counters,
+                      record_mark, series_change, series_remove, MARKED, DUPLICATE, FULL, ARCHIVED)
+import archive
+import purge
+import importer
+import reports
+import trends
+from attendance import DEFAULT_REQUIRED_PERCENTAGE, course_metrics
 
-app = Flask(__name__)
-app.config.from_object(Config)
+# Database connection pool (MySQL, or SQLite with DB_BACKEND=sqlite)
+mysql = Database()
 
-# Initialize MySQL
-mysql = MySQL(app)
+# Per-endpoint query count, DB time, render time and latency, served at /metrics
+instrumentation = Instrumentation()
+
+# Per-client request budgets and quick 503s while the database pool is backed up
+limiter = Limiter()
+
+# Password hashing in a bounded process pool, off the request threads
+passwords = PasswordHasher()
+
+# Fingerprinted, precompressed static files (after `flask build-assets`)
+assets = Assets()
+
+# Write-behind journal for attendance marks (MARK_BUFFER=true)
+marks_buffer = MarkBuffer()
+
+# Background removal of deleted courses, teachers and users
+purger = purge.Purger()
+
+# Users recently confirmed to exist (with their data version), so login_required skips
+# the lookup. The cache is per process and nothing is broadcast: a user deleted by
+# another process (`flask delete-user`, another worker) is still let in here for up to
+# USER_CACHE_TTL seconds, until the entry expires. Their courses and teachers are hidden.
+user_cache = TTLCache()
+
+# Rendered HTML of cached pages, keyed by (user, path, data version)
+page_cache = TTLCache()
+
+# Routes and CLI commands of this module, added to the app by create_app() under the
+# same endpoint and command names as if they were registered on it directly
+routes = []
+cli = AppGroup('sixtypercent')
+
+def route(rule, **options):
+    def decorator(f):
+        routes.append((rule, f, options))
+        return f
+    return decorator
+
+# App factory: `flask --app app` and serve.py call this; the extensions above hold
+# the last app created, so build one app per process. config overrides Config.
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(config or {})
+
+    # Compiled templates are kept in TEMPLATE_CACHE_DIR, so a new worker or a restart
+    # loads them instead of compiling; `flask compile-templates` fills it on deploy
+    if app.config['TEMPLATE_CACHE_DIR']:
+        cache_dir = os.path.join(app.root_path, app.config['TEMPLATE_CACHE_DIR'])
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(cache_dir))
+
+    mysql.init_app(app)
+    instrumentation.init_app(app, mysql)
+    limiter.init_app(app, mysql)
+    instrumentation.add_collector(limiter.metric_lines)
+    passwords.init_app(app)
+    assets.init_app(app)
+    marks_buffer.init_app(app, mysql)
+    purger.init_app(app, mysql)
+    user_cache.maxsize, user_cache.ttl = app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL']
+    page_cache.maxsize, page_cache.ttl = app.config['PAGE_CACHE_SIZE'], app.config['PAGE_CACHE_TTL']
+
+    app.register_error_handler(PoolTimeout, pool_timeout)
+    app.register_error_handler(HashPoolBusy, hash_pool_busy)
+    app.register_error_handler(RateLimited, rate_limited)
+    app.register_error_handler(Overloaded, overloaded)
+    for rule, view, options in routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    for command in cli.commands.values():
+        app.cli.add_command(command)
+    return app
+
+# All pooled connections are busy - fail fast instead of queueing more requests
+def pool_timeout(e):
+    return 'The server is busy right now. Please try again in a moment.', 503
+
+# Login storm: the hashing queue is full
+def hash_pool_busy(e):
+    return 'Too many logins right now. Please try again in a moment.', 503, {'Retry-After': '2'}
+
+# One client went over its budget for this page
+def rate_limited(e):
+    return 'Too many requests. Please slow down and try again in a moment.', 429, {'Retry-After': str(e.retry_after)}
+
+# Requests are already queueing for database connections - shed new ones
+def overloaded(e):
+    return 'The server is busy right now. Please try again in a moment.', 503, {'Retry-After': '1'}
+
+# Show connection pool statistics for this process
+@cli.command('pool-stats')
+def pool_stats():
+    mysql.pool.warm()
+    for key, value in mysql.pool.stats().items():
+        click.echo(f'{key}: {value}')
+
+# Show the health of each read replica (checks them now)
+@cli.command('replica-status')
+def replica_status():
+    if not current_app.config['MYSQL_REPLICAS']:
+        click.echo('No read replicas configured (DB_REPLICAS).')
+        return
+    for replica in mysql.replicas:
+        replica.check(float(current_app.config['MYSQL_REPLICA_MAX_LAG']))
+        state = 'healthy' if replica.healthy else 'skipped'
+        lag = f', {replica.lag}s behind' if replica.lag is not None else ''
+        click.echo(f'{replica.name}: {state} ({replica.reason}){lag}')
+
+# Fingerprint and precompress static/ into static/<ASSETS_DIR> (run on every deploy)
+@cli.command('build-assets')
+def build_assets():
+    for source, target in sorted(assets.build().items()):
+        encodings = assets.variants[target]
+        click.echo(f"{source} -> {target}" + (f" ({', '.join(encodings)})" if encodings else ''))
+
+# Compile every template into TEMPLATE_CACHE_DIR (run on every deploy), so workers
+# starting afterwards load compiled templates instead of compiling them
+@cli.command('compile-templates')
+def compile_templates():
+    env = current_app.jinja_env
+    if env.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is empty, so compiled templates are not kept.')
+    names = env.list_templates()
+    for name in names:
+        env.get_template(name)
+    click.echo(f"{len(names)} template(s) compiled into {current_app.config['TEMPLATE_CACHE_DIR']}")
+
+# Write every mark waiting in the write-behind journal to the database now
+@cli.command('flush-marks')
+def flush_marks():
+    written, dropped = marks_buffer.flush()
+    click.echo(f'{written} mark(s) written, {dropped} dropped.')
+    for key, value in marks_buffer.stats().items():
+        click.echo(f'{key}: {value}')
+
+# Create the SQLite database from schema_sqlite.sql (DB_BACKEND=sqlite)
+@cli.command('init-sqlite')
+def init_sqlite():
+    if current_app.config['DB_BACKEND'] != 'sqlite':
+        raise click.ClickException('DB_BACKEND is not sqlite; load schema.sql into MySQL instead.')
+    import sqlite_backend
+    sqlite_backend.init_schema(current_app.config['SQLITE_PATH'])
+    click.echo(f"Initialised {current_app.config['SQLITE_PATH']}")
+
+USER_VERSION_SQL = "SELECT id, data_version, data_updated_at FROM users WHERE id = %s AND deleted_at IS NULL"
+
+def load_user_version(user_id):
+    cur = mysql.connection.cursor()
+    cur.execute(USER_VERSION_SQL, (user_id,))
+    user = cur.fetchone()
+    cur.close()
+    if user:
+        user_cache.set(user['id'], user)
+    return user
+
+# Commit a change to the user's courses, teachers or attendance.
+# Bumps users.data_version in the same transaction so cached pages and ETags built
+# from the old version stop matching. The new version is remembered in the session
+# too, so the redirect after a write never sees an older version cached by another worker.
+def commit_user_change(cur, user_id):
+    cur.execute("""
+        UPDATE users SET data_version = data_version + 1, data_updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """, (user_id,))
+    cur.execute(USER_VERSION_SQL, (user_id,))
+    user = cur.fetchone()
+    mysql.connection.commit()
+    user_cache.set(user_id, user)
+    session['data_version'] = user['data_version']
+
+# Response for a request without a logged-in user, or whose user no longer exists
+def login_redirect(expired=False):
+    if expired:
+        session.clear()
+    if request.path.startswith('/api/'):
+        return jsonify(error='Session expired.' if expired else 'Login required.'), 401
+    flash('Your session has expired. Please login again.' if expired else 'Please login first.', 'warning')
+    return redirect(url_for('login'))
+
+# The session user's cached version row, or None when it must be reloaded
+def cached_session_user():
+    user = user_cache.get(session['user_id'])
+    if user is None or user['data_version'] < session.get('data_version', 0):
+        return None
+    return user
 
 # Login required decorator
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
-            flash('Please login first.', 'warning')
-            return redirect(url_for('login'))
-        
-        # Verify user still exists in database
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT id FROM users WHERE id = %s", (session['user_id'],))
-        user = cur.fetchone()
-        cur.close()
+            return login_redirect()
         
+        # Verify user still exists in database (cached for USER_CACHE_TTL seconds)
+        user = cached_session_user() or load_user_version(session['user_id'])
         if not user:
-            session.clear()
-            flash('Your session has expired. Please login again.', 'warning')
-            return redirect(url_for('login'))
+            return login_redirect(expired=True)
         
+        g.user = user
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Page cache key, ETag and Last-Modified of the current page for g.user.
+# Marks still in the write-behind journal have a version of their own.
+def page_validators():
+    user = g.user
+    key = (user['id'], request.full_path, user['data_version'], marks_buffer.version(user['id']))
+    etag = hashlib.sha1(f"{current_app.config['RELEASE_ID']}:{assets.version}:{key}".encode()).hexdigest()
+    return key, etag, user['data_updated_at']
+
+# Only the ETag decides: it also covers RELEASE_ID, the asset version and pending marks,
+# which Last-Modified (the data version's timestamp) knows nothing about
+def is_not_modified(etag):
+    return request.if_none_match.contains(etag)
+
+# Store a freshly rendered page; redirects, errors and pages that flashed a message are not cached
+def store_page(key, response):
+    if response.status_code != 200 or '_flashes' in session:
+        return False
+    page_cache.set(key, response.get_data(as_text=True))
+    return True
+
+def cacheable_response(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+# Conditional GET and rendered-page cache for read-only pages (use below @login_required).
+# The ETag covers the user, the URL and the user's data version, so any write route
+# (which calls commit_user_change) invalidates both the browser copy and the cached HTML.
+# Pages with pending flash messages are always rendered fresh.
+# The data version comes from user_cache, which is per process: after a write in one
+# worker, other workers can serve the older page (or a 304) for up to USER_CACHE_TTL
+# seconds. The session that wrote is not affected, since its cookie carries the new
+# version and a worker whose cached version is older re-reads it.
+def cached_page(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if '_flashes' in session:
+            return f(*args, **kwargs)
+        
+        key, etag, last_modified = page_validators()
+        if is_not_modified(etag):
+            response = make_response('', 304)
+        else:
+            html = page_cache.get(key)
+            if html is not None:
+                response = make_response(html)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if not store_page(key, response):
+                    return response
+        return cacheable_response(response, etag, last_modified)
+    return decorated_function
+
+# Rebuild counters from live and archived records (reconcile after manual SQL or imports)
+@cli.command('rebuild-counters')
+@click.option('--dry-run', is_flag=True, help='Only report enrollments whose counters drifted.')
+def rebuild_counters(dry_run):
+    cur = mysql.connection.cursor()
+    cur.execute(f"""
+        SELECT COUNT(*) as drifted FROM (
+            SELECT e.id,
+                COUNT(ar.id) as held,
+                COALESCE(SUM(CASE WHEN ar.status = 'present' THEN 1 ELSE 0 END), 0) as present,
+                COALESCE(SUM(CASE WHEN ar.status = 'absent' THEN 1 ELSE 0 END), 0) as absent
+            FROM enrollments e
+            LEFT JOIN {ALL_RECORDS_SQL} ar ON e.id = ar.enrollment_id
+            GROUP BY e.id
+        ) actual
+        LEFT JOIN attendance_counters ac ON ac.enrollment_id = actual.id
+        WHERE ac.enrollment_id IS NULL
+            OR ac.classes_held <> actual.held
+            OR ac.present_count <> actual.present
+            OR ac.absent_count <> actual.absent
+    """)
+    drifted = cur.fetchone()['drifted']
+    click.echo(f'{drifted} enrollment(s) with missing or stale counters.')
+    
+    if not dry_run:
+        cur.execute(COUNTERS_REBUILD_SQL)
+        mysql.connection.commit()
+        click.echo('Attendance counters rebuilt.')
+    cur.close()
+
+# Rebuild the attendance trend series with window functions over every record
+@cli.command('rebuild-series')
+@click.option('--dry-run', is_flag=True, help='Only report series points that drifted.')
+def rebuild_series(dry_run):
+    cur = mysql.connection.cursor()
+    cur.execute(f"""
+        SELECT COUNT(*) as drifted FROM (
+            SELECT enrollment_id, class_date,
+                COUNT(*) OVER w as held,
+                SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END) OVER w as present
+            FROM {ALL_RECORDS_SQL} ar
+            WINDOW w AS (PARTITION BY enrollment_id ORDER BY class_date ROWS UNBOUNDED PRECEDING)
+        ) actual
+        LEFT JOIN attendance_series s
+            ON s.enrollment_id = actual.enrollment_id AND s.class_date = actual.class_date
+        WHERE s.enrollment_id IS NULL OR s.held <> actual.held OR s.present <> actual.present
+    """)
+    drifted = cur.fetchone()['drifted']
+    cur.execute(f"""
+        SELECT COUNT(*) as orphaned FROM attendance_series s
+        LEFT JOIN {ALL_RECORDS_SQL} ar ON ar.enrollment_id = s.enrollment_id AND ar.class_date = s.class_date
+        WHERE ar.id IS NULL
+    """)
+    orphaned = cur.fetchone()['orphaned']
+    click.echo(f'{drifted} missing or stale series point(s), {orphaned} without a record.')
+    
+    if not dry_run:
+        cur.execute("DELETE FROM attendance_series")
+        cur.execute(SERIES_REBUILD_SQL)
+        mysql.connection.commit()
+        click.echo('Attendance series rebuilt.')
+    cur.close()
+
+# Admin required decorator (use below @login_required)
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get('username') not in current_app.config['ADMIN_USERNAMES']:
+            flash('You do not have permission to view that page.', 'danger')
+            return redirect(url_for('dashboard'))
         return f(*args, **kwargs)
     return decorated_function
 
 # Home route - redirect to login or dashboard
-@app.route('/')
+@route('/')
 def index():
     if 'user_id' in session:
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
+# Readiness probe: a worker only accepts requests once it is warm. The server master
+# it belongs to lets `serve.py reload` tell new workers from old ones.
+@route('/health')
+def health():
+    return jsonify(status='ok', master=os.getppid())
+
 # Login route
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
         
         cur = mysql.connection.cursor()
-        cur.execute("SELECT id, username, password_hash, full_name FROM users WHERE username = %s", (username,))
+        cur.execute("""
+            SELECT id, username, password_hash, full_name, data_version, data_updated_at
+            FROM users WHERE username = %s AND deleted_at IS NULL
+        """, (username,))
         user = cur.fetchone()
         cur.close()
         
-        if user and check_password_hash(user['password_hash'], password):
+        if user and passwords.verify(user['password_hash'], password):
+            # Upgrade hashes made with older parameters while we have the password
+            if passwords.needs_rehash(user['password_hash']):
+                try:
+                    cur = mysql.connection.cursor()
+                    cur.execute("UPDATE users SET password_hash = %s WHERE id = %s",
+                                (passwords.hash(password), user['id']))
+                    mysql.connection.commit()
+                    cur.close()
+                except HashPoolBusy:
+                    pass
+            
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['full_name'] = user['full_name']
+            session['data_version'] = user['data_version']
+            user_cache.set(user['id'], {'id': user['id'], 'data_version': user['data_version'],
+                                        'data_updated_at': user['data_updated_at']})
             flash(f'Welcome back, {user["full_name"]}!', 'success')
             return redirect(url_for('dashboard'))
         else:
@@ -64,7 +413,7 @@ def login():
     return render_template('login.html')
 
 # Register route
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -73,7 +422,7 @@ def register():
         email = request.form.get('email', '')
         
         # Hash password
-        password_hash = generate_password_hash(password)
+        password_hash = passwords.hash(password)
         
         try:
             cur = mysql.connection.cursor()
@@ -89,245 +438,263 @@ def register():
     return render_template('register.html')
 
 # Logout route
-@app.route('/logout')
+@route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
 
-# Dashboard - main page
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    user_id = session['user_id']
-    cur = mysql.connection.cursor()
-    
-    # Get courses with detailed calculations
-    cur.execute("""
-        SELECT 
-            c.id as course_id,
-            c.course_code,
-            c.course_name,
-            c.total_classes,
-            t.name as teacher_name,
-            COALESCE(ats.required_percentage, 60.00) as required_percentage,
-            COUNT(ar.id) as classes_held,
-            SUM(CASE WHEN ar.status = 'present' THEN 1 ELSE 0 END) as present_count,
-            SUM(CASE WHEN ar.status = 'absent' THEN 1 ELSE 0 END) as absent_count
-        FROM courses c
-        JOIN teachers t ON c.teacher_id = t.id
-        JOIN enrollments e ON c.id = e.course_id
-        LEFT JOIN attendance_records ar ON e.id = ar.enrollment_id
-        LEFT JOIN attendance_settings ats ON c.id = ats.course_id AND ats.user_id = %s
-        WHERE e.user_id = %s
-        GROUP BY c.id, c.course_code, c.course_name, c.total_classes, t.name, ats.required_percentage
-        ORDER BY c.course_code
-    """, (user_id, user_id))
-    courses_data = cur.fetchall()
-    cur.close()
+# Courses with their attendance counters (one row per enrollment, no aggregation).
+# Args: (user_id, user_id). The page queries below are shared with the async handlers in asgi.py.
+DASHBOARD_SQL = """
+    SELECT 
+        c.id as course_id,
+        c.course_code,
+        c.course_name,
+        c.total_classes,
+        t.name as teacher_name,
+        COALESCE(ats.required_percentage, 60.00) as required_percentage,
+        COALESCE(ac.classes_held, 0) as classes_held,
+        COALESCE(ac.present_count, 0) as present_count,
+        COALESCE(ac.absent_count, 0) as absent_count
+    FROM enrollments e
+    JOIN courses c ON c.id = e.course_id
+    JOIN teachers t ON c.teacher_id = t.id
+    LEFT JOIN attendance_counters ac ON ac.enrollment_id = e.id
+    LEFT JOIN attendance_settings ats ON c.id = ats.course_id AND ats.user_id = %s
+    WHERE e.user_id = %s AND c.deleted_at IS NULL
+    ORDER BY c.course_code
+"""
+
+def render_dashboard(courses_data):
+    # Count marks still waiting in the write-behind journal
+    pending = {}
+    for mark in marks_buffer.pending(session['user_id']):
+        pending.setdefault(mark['course_id'], []).append(mark)
     
     # Calculate smart metrics for each course
     courses = []
     for course in courses_data:
-        total_classes = course['total_classes']
-        classes_held = course['classes_held'] or 0
-        present = course['present_count'] or 0
-        absent = course['absent_count'] or 0
-        required_percentage = course['required_percentage']
-        
-        # Calculate percentage based on TOTAL classes (not just held)
-        attendance_percentage = (present / total_classes * 100) if total_classes > 0 else 0
-        
-        # Calculate predictions
-        required_present = (required_percentage * total_classes) / 100
-        classes_needed = max(0, int(required_present - present) + (1 if required_present - present > int(required_present - present) else 0))
-        
-        # Calculate classes can miss
-        # If we need more present classes, we can only miss: remaining - classes_needed
-        # If we already have enough, we can miss all remaining
-        remaining_classes = max(0, total_classes - classes_held)
-        if classes_needed > 0:
-            classes_can_miss = max(0, remaining_classes - classes_needed)
-        else:
-            classes_can_miss = remaining_classes
-        
-        # Determine zone status
-        danger_zone = (remaining_classes > 0 and remaining_classes == classes_needed)
-        dead_zone = (present + remaining_classes) < required_present
-        
-        # Add to course dict
-        course_dict = dict(course)
-        course_dict['attendance_percentage'] = round(attendance_percentage, 2)
-        course_dict['classes_can_miss'] = classes_can_miss
-        course_dict['danger_zone'] = danger_zone
-        course_dict['dead_zone'] = dead_zone
-        course_dict['remaining_classes'] = remaining_classes
-        
+        course_dict = overlay_counters(course, pending.get(course['course_id'], []))
+        course_dict.update(course_metrics(course_dict['total_classes'], course_dict['classes_held'],
+                                          course_dict['present_count'], course_dict['required_percentage']))
         courses.append(course_dict)
     
     return render_template('dashboard.html', courses=courses)
 
-# Course details page
-@app.route('/course/<int:course_id>')
+# Dashboard - main page
+@route('/dashboard')
+@mysql.read_replica
 @login_required
-def course_detail(course_id):
+@cached_page
+def dashboard():
     user_id = session['user_id']
     cur = mysql.connection.cursor()
-    
-    # Get course info and enrollment
-    cur.execute("""
-        SELECT c.*, t.name as teacher_name, e.id as enrollment_id
-        FROM courses c
-        JOIN teachers t ON c.teacher_id = t.id
-        JOIN enrollments e ON c.id = e.course_id
-        WHERE c.id = %s AND e.user_id = %s
-    """, (course_id, user_id))
-    course = cur.fetchone()
-    
+    cur.execute(DASHBOARD_SQL, (user_id, user_id))
+    courses_data = cur.fetchall()
+    cur.close()
+    return render_dashboard(courses_data)
+
+# Parse a history page cursor of the form "YYYY-MM-DD_<record id>"
+def parse_history_cursor(value):
+    if not value:
+        return None
+    try:
+        class_date, record_id = value.split('_', 1)
+        return datetime.strptime(class_date, '%Y-%m-%d').date(), int(record_id)
+    except ValueError:
+        return None
+
+# Course info, enrollment and attendance counters. Args: (course_id, user_id)
+COURSE_DETAIL_SQL = """
+    SELECT c.*, t.name as teacher_name, e.id as enrollment_id,
+        COALESCE(ac.classes_held, 0) as classes_held,
+        COALESCE(ac.present_count, 0) as present_count
+    FROM courses c
+    JOIN teachers t ON c.teacher_id = t.id
+    JOIN enrollments e ON c.id = e.course_id
+    LEFT JOIN attendance_counters ac ON ac.enrollment_id = e.id
+    WHERE c.id = %s AND e.user_id = %s AND c.deleted_at IS NULL
+"""
+
+# Attendance settings. Args: (user_id, course_id)
+COURSE_SETTINGS_SQL = """
+    SELECT required_percentage FROM attendance_settings
+    WHERE user_id = %s AND course_id = %s
+"""
+
+# One page of attendance records, newest first, plus one row to detect a next page.
+# Keyset pagination on (class_date, id) walks the unique_attendance index backwards
+# from the cursor, so every page costs the same no matter how long the history is.
+# The enrollment is resolved in the same query, so it doesn't wait for the course query.
+# Records of archived semesters are read from attendance_archive when asked for.
+def history_query(user_id, course_id, before, page_size, archived=False):
+    table = 'attendance_archive' if archived else 'attendance_records'
+    keyset, args = '', [user_id, course_id]
+    if before:
+        keyset = 'AND (ar.class_date < %s OR (ar.class_date = %s AND ar.id < %s))'
+        args += [before[0], before[0], before[1]]
+    return f"""
+        SELECT ar.id, ar.class_date, ar.status, ar.notes
+        FROM enrollments e
+        JOIN {table} ar ON ar.enrollment_id = e.id
+        WHERE e.user_id = %s AND e.course_id = %s
+        {keyset}
+        ORDER BY ar.class_date DESC, ar.id DESC
+        LIMIT %s
+    """, (*args, page_size + 1)
+
+def render_course_detail(course, attendance, settings, before, page_size, archived=False):
     if not course:
         flash('Course not found.', 'danger')
         return redirect(url_for('dashboard'))
     
-    # Get attendance records
-    cur.execute("""
-        SELECT * FROM attendance_records
-        WHERE enrollment_id = %s
-        ORDER BY class_date DESC
-    """, (course['enrollment_id'],))
-    attendance = cur.fetchall()
+    next_cursor = None
+    if len(attendance) > page_size:
+        attendance = attendance[:page_size]
+        last = attendance[-1]
+        next_cursor = f"{last['class_date'].isoformat()}_{last['id']}"
     
-    # Get attendance settings
-    cur.execute("""
-        SELECT required_percentage FROM attendance_settings
-        WHERE user_id = %s AND course_id = %s
-    """, (user_id, course_id))
-    settings = cur.fetchone()
-    required_percentage = settings['required_percentage'] if settings else 60.0
+    # Marks still waiting in the write-behind journal, listed above the newest records
+    pending = marks_buffer.pending(session['user_id'], course['enrollment_id'])
+    course = overlay_counters(course, pending)
+    if pending and before is None and not archived:
+        attendance = pending + list(attendance)
+    
+    required_percentage = settings['required_percentage'] if settings else DEFAULT_REQUIRED_PERCENTAGE
     
     # Calculate statistics based on total_classes from course
     total_classes = course['total_classes']
-    classes_held = len(attendance)  # Classes marked so far
-    present = sum(1 for a in attendance if a['status'] == 'present')
+    classes_held = course['classes_held']  # Classes marked so far
+    present = course['present_count']
     absent = classes_held - present
-    
-    # Current percentage based on TOTAL classes (not held classes)
-    current_percentage = (present / total_classes * 100) if total_classes > 0 else 0
-    
-    # Calculate classes needed to reach target
-    # Formula: need P such that (present + P) / (total_classes) >= required_percentage / 100
-    # Solving: P >= (required_percentage * total_classes / 100) - present
-    required_present = (required_percentage * total_classes) / 100
-    classes_needed = max(0, int(required_present - present) + (1 if required_present - present > int(required_present - present) else 0))
-    
-    # Remaining classes
-    remaining_classes = max(0, total_classes - classes_held)
-    
-    # Calculate classes user can miss
-    # If we need more present classes, we can only miss: remaining - classes_needed
-    # If we already have enough, we can miss all remaining
-    if classes_needed > 0:
-        classes_can_miss = max(0, remaining_classes - classes_needed)
-    else:
-        classes_can_miss = remaining_classes
-    
-    # Danger Zone: Cannot miss any more classes
-    # This happens when: remaining_classes == classes_needed
-    danger_zone = (remaining_classes > 0 and remaining_classes == classes_needed)
-    
-    # Dead Zone: Even attending all remaining classes won't help
-    # This happens when: present + remaining_classes < required_present
-    dead_zone = (present + remaining_classes) < required_present
-    
-    cur.close()
+    metrics = course_metrics(total_classes, classes_held, present, required_percentage)
     
     return render_template('course_detail.html', 
                          course=course, 
                          attendance=attendance,
+                         next_cursor=next_cursor,
+                         is_first_page=before is None,
+                         archived=archived,
                          total_classes=total_classes,
                          classes_held=classes_held,
-                         remaining_classes=remaining_classes,
+                         remaining_classes=metrics['remaining_classes'],
                          present=present,
                          absent=absent,
-                         current_percentage=round(current_percentage, 2),
+                         current_percentage=metrics['attendance_percentage'],
                          required_percentage=required_percentage,
-                         classes_needed=classes_needed,
-                         classes_can_miss=classes_can_miss,
-                         danger_zone=danger_zone,
-                         dead_zone=dead_zone)
+                         classes_needed=metrics['classes_needed'],
+                         classes_can_miss=metrics['classes_can_miss'],
+                         danger_zone=metrics['danger_zone'],
+                         dead_zone=metrics['dead_zone'])
+
+# Course details page
+@route('/course/<int:course_id>')
+@mysql.read_replica
+@login_required
+@cached_page
+def course_detail(course_id):
+    user_id = session['user_id']
+    page_size = current_app.config['HISTORY_PAGE_SIZE']
+    before = parse_history_cursor(request.args.get('before'))
+    archived = request.args.get('archive') == '1'
+    cur = mysql.connection.cursor()
+    
+    cur.execute(COURSE_DETAIL_SQL, (course_id, user_id))
+    course = cur.fetchone()
+    attendance = settings = None
+    if course:
+        cur.execute(*history_query(user_id, course_id, before, page_size, archived))
+        attendance = cur.fetchall()
+        cur.execute(COURSE_SETTINGS_SQL, (user_id, course_id))
+        settings = cur.fetchone()
+    cur.close()
+    
+    return render_course_detail(course, attendance, settings, before, page_size, archived)
 
 
+# Record one attendance mark and flash the outcome.
+# The total_classes cap is enforced by record_mark() inside the database, so
+# concurrent double-submits can neither exceed it nor fail on the duplicate date.
+# With MARK_BUFFER on, the write-behind journal enforces both instead.
+# class_date is a date; callers parse and reject form input first.
+def save_mark(user_id, course_id, class_date, status, notes, success_message):
+    cur = mysql.connection.cursor()
+    try:
+        if marks_buffer.enabled:
+            # Journalled; the database is written in the background. Nothing was written
+            # yet, so end the snapshot of earlier reads: record() must see the counters
+            # as they are once it holds the journal lock.
+            mysql.connection.rollback()
+            outcome = marks_buffer.record(cur, user_id, course_id, class_date, status, notes)
+        else:
+            outcome = record_mark(cur, user_id, course_id, class_date, status, notes)
+        if outcome == MARKED:
+            if not marks_buffer.enabled:
+                commit_user_change(cur, user_id)
+            flash(success_message, 'success')
+            return
+        mysql.connection.rollback()
+        if outcome == DUPLICATE:
+            flash(f'Attendance for {class_date} was already marked.', 'info')
+        elif outcome == FULL:
+            flash('Cannot add more attendance! All classes for this course are already marked.', 'danger')
+        elif outcome == ARCHIVED:
+            flash('This course\'s semester is archived and can no longer be marked.', 'danger')
+        else:
+            flash('Enrollment not found!', 'danger')
+    except Exception as e:
+        mysql.connection.rollback()
+        flash(f'Error marking attendance: {str(e)}', 'danger')
+    finally:
+        cur.close()
+
 # Mark attendance
-@app.route('/course/<int:course_id>/mark', methods=['GET', 'POST'])
+@route('/course/<int:course_id>/mark', methods=['GET', 'POST'])
+@mysql.read_replica
 @login_required
 def mark_attendance(course_id):
     user_id = session['user_id']
     
     if request.method == 'POST':
-        class_date = request.form['class_date']
         status = request.form['status']
         notes = request.form.get('notes', '')
         
-        cur = mysql.connection.cursor()
-        
-        # Get enrollment_id and course details
-        cur.execute("""
-            SELECT e.id as enrollment_id, c.total_classes
-            FROM enrollments e
-            JOIN courses c ON e.course_id = c.id
-            WHERE e.user_id = %s AND e.course_id = %s
-        """, (user_id, course_id))
-        result = cur.fetchone()
+        if status not in ['present', 'absent']:
+            flash('Invalid status!', 'danger')
+            return redirect(url_for('course_detail', course_id=course_id))
         
-        if result:
-            enrollment_id = result['enrollment_id']
-            total_classes = result['total_classes']
-            
-            # Check current attendance count
-            cur.execute("""
-                SELECT COUNT(*) as count FROM attendance_records
-                WHERE enrollment_id = %s
-            """, (enrollment_id,))
-            count_result = cur.fetchone()
-            classes_held = count_result['count'] if count_result else 0
-            
-            # Validate against total_classes
-            if classes_held >= total_classes:
-                flash(f'Cannot add more attendance! Already marked {classes_held} out of {total_classes} total classes.', 'danger')
-                cur.close()
-                return redirect(url_for('course_detail', course_id=course_id))
-            
-            try:
-                cur.execute("""
-                    INSERT INTO attendance_records (enrollment_id, class_date, status, notes)
-                    VALUES (%s, %s, %s, %s)
-                """, (enrollment_id, class_date, status, notes))
-                mysql.connection.commit()
-                flash('Attendance marked successfully!', 'success')
-            except Exception as e:
-                flash(f'Error marking attendance: {str(e)}', 'danger')
-        else:
-            flash('Enrollment not found!', 'danger')
+        try:
+            class_date = date.fromisoformat(request.form.get('class_date', ''))
+        except ValueError:
+            flash('Invalid class date! Use YYYY-MM-DD.', 'danger')
+            return render_mark_form(user_id, course_id), 400
         
-        cur.close()
+        save_mark(user_id, course_id, class_date, status, notes, 'Attendance marked successfully!')
         return redirect(url_for('course_detail', course_id=course_id))
     
-    # GET request
+    return render_mark_form(user_id, course_id)
+
+# The mark form of one course, with its counters including journalled marks
+def render_mark_form(user_id, course_id):
     cur = mysql.connection.cursor()
     cur.execute("""
-        SELECT c.*, COUNT(ar.id) as classes_held
+        SELECT c.*, COALESCE(ac.classes_held, 0) as classes_held
         FROM courses c
         LEFT JOIN enrollments e ON c.id = e.course_id AND e.user_id = %s
-        LEFT JOIN attendance_records ar ON e.id = ar.enrollment_id
-        WHERE c.id = %s
-        GROUP BY c.id
+        LEFT JOIN attendance_counters ac ON ac.enrollment_id = e.id
+        WHERE c.id = %s AND c.deleted_at IS NULL
     """, (user_id, course_id))
     course = cur.fetchone()
     cur.close()
+    if course:
+        course = overlay_counters(course, [mark for mark in marks_buffer.pending(user_id)
+                                           if mark['course_id'] == course_id])
     
     return render_template('mark_attendance.html', course=course, course_id=course_id)
 
 # Quick mark attendance (from dashboard)
-@app.route('/course/<int:course_id>/quick-mark/<status>', methods=['POST'])
+@route('/course/<int:course_id>/quick-mark/<status>', methods=['POST'])
 @login_required
 def quick_mark_attendance(course_id, status):
     user_id = session['user_id']
@@ -337,87 +704,336 @@ def quick_mark_attendance(course_id, status):
         flash('Invalid status!', 'danger')
         return redirect(url_for('dashboard'))
     
+    # Use today's date
+    save_mark(user_id, course_id, date.today(), status, 'Quick marked from dashboard',
+              f'Attendance marked as {status.upper()} for today!')
+    return redirect(url_for('dashboard'))
+
+# Batch quick-mark API: mark several courses at once in a single transaction
+# POST {"marks": [{"course_id": 1, "date": "2025-10-01", "status": "present", "notes": ""}, ...]}
+# "date" defaults to today. Either every mark is recorded or none is.
+@route('/api/attendance/marks', methods=['POST'])
+@login_required
+def api_mark_attendance():
+    user_id = session['user_id']
+    payload = request.get_json(silent=True)
+    marks = payload.get('marks') if isinstance(payload, dict) else None
+    if not isinstance(marks, list) or not marks:
+        return jsonify(error='Expected a JSON object with a non-empty "marks" list.'), 400
+    if len(marks) > current_app.config['API_MAX_MARKS']:
+        return jsonify(error=f"At most {current_app.config['API_MAX_MARKS']} marks per request."), 400
+    
+    parsed, errors = [], []
+    for index, mark in enumerate(marks):
+        if isinstance(mark, dict):
+            mark = dict(mark, class_date=mark.get('date') or mark.get('class_date') or date.today().isoformat())
+        else:
+            mark = 'Expected an object'
+        record, error = importer.parse_row(mark)
+        if error:
+            errors.append({'index': index, 'error': error})
+        else:
+            parsed.append((index, record))
+    if errors:
+        return jsonify(errors=errors), 400
+    
     cur = mysql.connection.cursor()
+    try:
+        # One set-based validation for all marks, then one multi-row insert
+        values, deltas, rejected, enrollments = importer.plan_marks(cur, user_id, parsed)
+        if rejected:
+            mysql.connection.rollback()
+            return jsonify(errors=[{'index': index, 'error': error} for index, error in rejected]), 409
+        importer.write_marks(cur, values, deltas)
+        commit_user_change(cur, user_id)
+    except Exception as e:
+        mysql.connection.rollback()
+        return jsonify(error=f'Error marking attendance: {str(e)}'), 500
+    finally:
+        cur.close()
     
-    # Get enrollment_id and course details
-    cur.execute("""
-        SELECT e.id as enrollment_id, c.total_classes
-        FROM enrollments e
-        JOIN courses c ON e.course_id = c.id
-        WHERE e.user_id = %s AND e.course_id = %s
-    """, (user_id, course_id))
-    result = cur.fetchone()
+    # Updated metrics for every course that was marked, from the locked counters + deltas
+    courses = []
+    for enrollment in enrollments:
+        if enrollment['enrollment_id'] not in deltas:
+            continue
+        held, present, absent = deltas[enrollment['enrollment_id']]
+        course = {
+            'course_id': enrollment['course_id'],
+            'course_code': enrollment['course_code'],
+            'total_classes': enrollment['total_classes'],
+            'classes_held': enrollment['classes_held'] + held,
+            'present_count': enrollment['present_count'] + present,
+            'absent_count': enrollment['absent_count'] + absent,
+            'required_percentage': float(enrollment['required_percentage']),
+        }
+        course.update(course_metrics(course['total_classes'], course['classes_held'],
+                                     course['present_count'], enrollment['required_percentage']))
+        courses.append(course)
     
-    if result:
-        enrollment_id = result['enrollment_id']
-        total_classes = result['total_classes']
-        
-        # Check current attendance count
-        cur.execute("""
-            SELECT COUNT(*) as count FROM attendance_records
-            WHERE enrollment_id = %s
-        """, (enrollment_id,))
-        count_result = cur.fetchone()
-        classes_held = count_result['count'] if count_result else 0
-        
-        # Validate against total_classes
-        if classes_held >= total_classes:
-            flash(f'Cannot add more attendance! Already marked {classes_held} out of {total_classes} total classes.', 'danger')
-            cur.close()
-            return redirect(url_for('dashboard'))
-        
-        # Use today's date
-        from datetime import date
-        today = date.today()
-        
-        try:
-            cur.execute("""
-                INSERT INTO attendance_records (enrollment_id, class_date, status, notes)
-                VALUES (%s, %s, %s, %s)
-            """, (enrollment_id, today, status, 'Quick marked from dashboard'))
-            mysql.connection.commit()
-            flash(f'Attendance marked as {status.upper()} for today!', 'success')
-        except Exception as e:
-            flash(f'Error marking attendance: {str(e)}', 'danger')
-    else:
-        flash('Enrollment not found!', 'danger')
+    return jsonify(marked=len(values), courses=courses)
+
+# Attendance trend of one course for charting, as parallel arrays per class date
+# GET -> {"dates": [...], "held": [...], "present": [...], "percentage": [...],
+#         "zones": [["2025-10-01", "ok"], ["2025-11-12", "danger"], ...], ...}
+@route('/api/courses/<int:course_id>/trend')
+@mysql.read_replica
+@login_required
+def course_trend(course_id):
+    user_id = session['user_id']
+    _, etag, last_modified = page_validators()
+    if is_not_modified(etag):
+        return cacheable_response(make_response('', 304), etag, last_modified)
     
+    cur = mysql.connection.cursor()
+    cur.execute(COURSE_DETAIL_SQL, (course_id, user_id))
+    course = cur.fetchone()
+    if not course:
+        cur.close()
+        return jsonify(error='Course not found.'), 404
+    cur.execute(COURSE_SETTINGS_SQL, (user_id, course_id))
+    settings = cur.fetchone()
+    cur.execute(trends.TREND_SQL, (course['enrollment_id'],))
+    series = trends.with_pending(cur.fetchall(), marks_buffer.pending(user_id, course['enrollment_id']))
     cur.close()
-    return redirect(url_for('dashboard'))
+    
+    required_percentage = settings['required_percentage'] if settings else DEFAULT_REQUIRED_PERCENTAGE
+    return cacheable_response(jsonify(trends.trend_payload(course, series, required_percentage)),
+                              etag, last_modified)
 
 # Update attendance
-@app.route('/attendance/<int:attendance_id>/edit', methods=['POST'])
+@route('/attendance/<int:attendance_id>/edit', methods=['POST'])
 @login_required
 def edit_attendance(attendance_id):
+    user_id = session['user_id']
     status = request.form['status']
     notes = request.form.get('notes', '')
     
+    if status not in ['present', 'absent']:
+        flash('Invalid status!', 'danger')
+        return redirect(request.referrer or url_for('dashboard'))
+    
     cur = mysql.connection.cursor()
+    # Lock the record and read its old status so the counters and series can be corrected
+    cur.execute("""
+        SELECT ar.enrollment_id, ar.class_date, ar.status
+        FROM attendance_records ar
+        JOIN enrollments e ON ar.enrollment_id = e.id
+        WHERE ar.id = %s AND e.user_id = %s
+        FOR UPDATE
+    """, (attendance_id, user_id))
+    record = cur.fetchone()
+    
+    if not record:
+        cur.close()
+        flash('Attendance record not found.', 'danger')
+        return redirect(request.referrer or url_for('dashboard'))
+    
     cur.execute("""
         UPDATE attendance_records 
         SET status = %s, notes = %s
         WHERE id = %s
     """, (status, notes, attendance_id))
-    mysql.connection.commit()
+    if record['status'] != status:
+        _, old_present, old_absent = counter_delta(record['status'], -1)
+        _, new_present, new_absent = counter_delta(status)
+        adjust_counters(cur, record['enrollment_id'], 0, old_present + new_present, old_absent + new_absent)
+        series_change(cur, record['enrollment_id'], record['class_date'], record['status'], status)
+    commit_user_change(cur, user_id)
     cur.close()
     
     flash('Attendance updated successfully!', 'success')
     return redirect(request.referrer or url_for('dashboard'))
 
 # Delete attendance record
-@app.route('/attendance/<int:attendance_id>/delete', methods=['POST'])
+@route('/attendance/<int:attendance_id>/delete', methods=['POST'])
 @login_required
 def delete_attendance(attendance_id):
+    user_id = session['user_id']
     cur = mysql.connection.cursor()
+    cur.execute("""
+        SELECT ar.enrollment_id, ar.class_date, ar.status
+        FROM attendance_records ar
+        JOIN enrollments e ON ar.enrollment_id = e.id
+        WHERE ar.id = %s AND e.user_id = %s
+        FOR UPDATE
+    """, (attendance_id, user_id))
+    record = cur.fetchone()
+    
+    if not record:
+        cur.close()
+        flash('Attendance record not found.', 'danger')
+        return redirect(request.referrer or url_for('dashboard'))
+    
     cur.execute("DELETE FROM attendance_records WHERE id = %s", (attendance_id,))
-    mysql.connection.commit()
+    adjust_counters(cur, record['enrollment_id'], *counter_delta(record['status'], -1))
+    series_remove(cur, record['enrollment_id'], record['class_date'], record['status'])
+    commit_user_change(cur, user_id)
     cur.close()
     
     flash('Attendance record deleted successfully!', 'success')
     return redirect(request.referrer or url_for('dashboard'))
 
+# Bulk import attendance records from a CSV or JSON Lines upload
+@route('/attendance/import', methods=['GET', 'POST'])
+@login_required
+def import_attendance():
+    report = None
+    
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a file to import.', 'danger')
+            return redirect(url_for('import_attendance'))
+        
+        fmt = request.form.get('format') or importer.detect_format(upload.filename)
+        if fmt not in importer.FORMATS:
+            flash('Unsupported file format.', 'danger')
+            return redirect(url_for('import_attendance'))
+        
+        # Read the upload as a text stream; rows are parsed batch by batch
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        report = importer.import_attendance(mysql.connection, session['user_id'], stream, fmt,
+                                            batch_size=current_app.config['IMPORT_BATCH_SIZE'])
+        if report.inserted:
+            cur = mysql.connection.cursor()
+            commit_user_change(cur, session['user_id'])
+            cur.close()
+        flash(f'Import finished: {report.summary()}', 'success' if not report.failed else 'warning')
+    
+    return render_template('import_attendance.html', report=report)
+
+# Bulk import attendance from the command line
+@cli.command('import-attendance')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--username', required=True, help='User that owns the enrollments.')
+@click.option('--format', 'fmt', type=click.Choice(importer.FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction.')
+def import_attendance_command(path, username, fmt, batch_size):
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT id FROM users WHERE username = %s", (username,))
+    user = cur.fetchone()
+    cur.close()
+    if not user:
+        raise click.ClickException(f'User {username!r} not found.')
+    
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = importer.import_attendance(mysql.connection, user['id'], stream,
+                                            fmt or importer.detect_format(path),
+                                            batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'])
+    if report.inserted:
+        # Invalidate the user's cached pages (no session here, so not commit_user_change)
+        cur = mysql.connection.cursor()
+        cur.execute("""
+            UPDATE users SET data_version = data_version + 1, data_updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (user['id'],))
+        mysql.connection.commit()
+        cur.close()
+    
+    for line, message in report.errors:
+        click.echo(f'line {line}: {message}', err=True)
+    if report.failed > len(report.errors):
+        click.echo(f'... {report.failed - len(report.errors)} more errors not shown', err=True)
+    click.echo(report.summary())
+
+# Institution-wide attendance report, streamed as CSV or JSON Lines
+# Filters: ?semester=...&course_code=...&zone=dead|danger|at-risk|ok&format=csv|jsonl
+@route('/admin/reports/attendance')
+@mysql.read_replica
+@login_required
+@admin_required
+def attendance_report():
+    fmt = request.args.get('format', 'csv')
+    zone = request.args.get('zone') or None
+    if fmt not in reports.FORMATS or (zone and zone not in reports.ZONES):
+        return 'Invalid format or zone.', 400
+    
+    rows = reports.iter_report_rows(mysql.connection,
+                                    semester=request.args.get('semester') or None,
+                                    course_code=request.args.get('course_code') or None,
+                                    zone=zone)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(reports.render(rows, fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=attendance_report.{fmt}'})
+
+# Institution-wide attendance report from the command line
+@cli.command('attendance-report')
+@click.option('--format', 'fmt', type=click.Choice(reports.FORMATS), default='csv')
+@click.option('--semester', help='Only courses in this semester.')
+@click.option('--course-code', help='Only this course code.')
+@click.option('--zone', type=click.Choice(reports.ZONES), help='Only enrollments in this zone.')
+@click.option('--output', type=click.File('w'), default='-', help='Output file (default: stdout).')
+def attendance_report_command(fmt, semester, course_code, zone, output):
+    rows = reports.iter_report_rows(mysql.connection, semester=semester, course_code=course_code, zone=zone)
+    for chunk in reports.render(rows, fmt):
+        output.write(chunk)
+
+# Close a semester and move its attendance records into attendance_archive
+@cli.command('archive-semester')
+@click.argument('semester')
+@click.option('--batch-size', type=int, default=None, help='Records moved per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be archived.')
+def archive_semester_command(semester, batch_size, dry_run):
+    cur = mysql.connection.cursor()
+    cur.execute("""
+        SELECT COUNT(DISTINCT c.id) as courses, COUNT(ar.id) as records
+        FROM courses c
+        LEFT JOIN enrollments e ON e.course_id = c.id
+        LEFT JOIN attendance_records ar ON ar.enrollment_id = e.id
+        WHERE c.semester = %s AND c.deleted_at IS NULL
+    """, (semester,))
+    found = cur.fetchone()
+    cur.close()
+    if not found['courses']:
+        raise click.ClickException(f'No courses in semester {semester!r}.')
+    click.echo(f"{found['courses']} course(s), {found['records']} live record(s) in {semester!r}.")
+    if dry_run:
+        return
+    
+    closed, moved = archive.archive_semester(mysql.connection, semester,
+                                             batch_size=batch_size or current_app.config['ARCHIVE_BATCH_SIZE'])
+    click.echo(f'Closed {closed} course(s), moved {moved} record(s) to attendance_archive.')
+
+# Remove a user account: hidden (and logged out) at once, data purged in the background
+@cli.command('delete-user')
+@click.argument('username')
+def delete_user_command(username):
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT id FROM users WHERE username = %s AND deleted_at IS NULL", (username,))
+    user = cur.fetchone()
+    if not user:
+        cur.close()
+        raise click.ClickException(f'No user {username!r}.')
+    for table in ('users', 'courses', 'teachers'):
+        column = 'id' if table == 'users' else 'user_id'
+        cur.execute(f"UPDATE {table} SET deleted_at = CURRENT_TIMESTAMP WHERE {column} = %s AND deleted_at IS NULL",
+                    (user['id'],))
+    mysql.connection.commit()
+    cur.close()
+    # Running workers keep a cached session of the user for up to USER_CACHE_TTL seconds
+    click.echo(f'Deleted {username!r}; run `flask purge-deleted` or let the purge job remove their data. '
+               f"Their open sessions end within {current_app.config['USER_CACHE_TTL']:g}s.")
+
+# Remove deleted courses, teachers and users now, in rate-limited batches
+@cli.command('purge-deleted')
+@click.option('--dry-run', is_flag=True, help='Only count rows waiting to be purged.')
+def purge_deleted_command(dry_run):
+    cur = mysql.connection.cursor()
+    pending = purge.pending_deletions(cur)
+    mysql.connection.commit()
+    cur.close()
+    click.echo('Waiting: ' + ', '.join(f'{count} {table}' for table, count in pending.items()))
+    if dry_run:
+        return
+    deleted = purger.run_once()
+    if deleted is None:
+        raise click.ClickException('Another process is purging right now.')
+    click.echo('Deleted: ' + (', '.join(f'{count} {table}' for table, count in deleted.items()) or 'nothing'))
+
 # Manage courses (view user's own courses)
-@app.route('/courses')
+@route('/courses')
+@mysql.read_replica
 @login_required
 def courses():
     user_id = session['user_id']
@@ -429,7 +1045,7 @@ def courses():
         EXISTS(SELECT 1 FROM enrollments WHERE user_id = %s AND course_id = c.id) as is_enrolled
         FROM courses c
         JOIN teachers t ON c.teacher_id = t.id
-        WHERE c.user_id = %s
+        WHERE c.user_id = %s AND c.deleted_at IS NULL
         ORDER BY c.course_code
     """, (user_id, user_id))
     all_courses = cur.fetchall()
@@ -438,7 +1054,7 @@ def courses():
     return render_template('courses.html', courses=all_courses)
 
 # Add new course
-@app.route('/course/add', methods=['GET', 'POST'])
+@route('/course/add', methods=['GET', 'POST'])
 @login_required
 def add_course():
     user_id = session['user_id']
@@ -462,6 +1078,7 @@ def add_course():
             
             # Auto-enroll user in their own course
             cur.execute("INSERT INTO enrollments (user_id, course_id) VALUES (%s, %s)", (user_id, course_id))
+            cur.execute("INSERT INTO attendance_counters (enrollment_id) VALUES (%s)", (cur.lastrowid,))
             
             # Create attendance setting with user-specified percentage
             cur.execute("""
@@ -469,7 +1086,7 @@ def add_course():
                 VALUES (%s, %s, %s)
             """, (user_id, course_id, required_percentage))
             
-            mysql.connection.commit()
+            commit_user_change(cur, user_id)
             flash('Course added successfully!', 'success')
             return redirect(url_for('courses'))
         except Exception as e:
@@ -480,14 +1097,14 @@ def add_course():
     
     # GET request - show form with teachers list
     cur = mysql.connection.cursor()
-    cur.execute("SELECT * FROM teachers WHERE user_id = %s ORDER BY name", (user_id,))
+    cur.execute("SELECT * FROM teachers WHERE user_id = %s AND deleted_at IS NULL ORDER BY name", (user_id,))
     teachers = cur.fetchall()
     cur.close()
     
     return render_template('add_course.html', teachers=teachers)
 
 # Add new teacher
-@app.route('/teacher/add', methods=['GET', 'POST'])
+@route('/teacher/add', methods=['GET', 'POST'])
 @login_required
 def add_teacher():
     user_id = session['user_id']
@@ -503,7 +1120,7 @@ def add_teacher():
                 INSERT INTO teachers (user_id, name, email, department)
                 VALUES (%s, %s, %s, %s)
             """, (user_id, name, email, department))
-            mysql.connection.commit()
+            commit_user_change(cur, user_id)
             flash('Teacher added successfully!', 'success')
             
             # Redirect back to add course if that's where we came from
@@ -519,18 +1136,20 @@ def add_teacher():
     return render_template('add_teacher.html')
 
 # View all teachers
-@app.route('/teachers')
+@route('/teachers')
+@mysql.read_replica
 @login_required
 def teachers():
     user_id = session['user_id']
     cur = mysql.connection.cursor()
     
+    # Rows come back in idx_user_name order; counting per teacher avoids a GROUP BY sort
     cur.execute("""
-        SELECT t.*, COUNT(c.id) as course_count
+        SELECT t.*,
+            (SELECT COUNT(*) FROM courses c
+             WHERE c.teacher_id = t.id AND c.user_id = %s AND c.deleted_at IS NULL) as course_count
         FROM teachers t
-        LEFT JOIN courses c ON t.id = c.teacher_id AND c.user_id = %s
-        WHERE t.user_id = %s
-        GROUP BY t.id
+        WHERE t.user_id = %s AND t.deleted_at IS NULL
         ORDER BY t.name
     """, (user_id, user_id))
     teachers_list = cur.fetchall()
@@ -539,14 +1158,14 @@ def teachers():
     return render_template('teachers.html', teachers=teachers_list)
 
 # Edit teacher
-@app.route('/teacher/<int:teacher_id>/edit', methods=['GET', 'POST'])
+@route('/teacher/<int:teacher_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_teacher(teacher_id):
     user_id = session['user_id']
     cur = mysql.connection.cursor()
     
     # Check if teacher belongs to user
-    cur.execute("SELECT * FROM teachers WHERE id = %s AND user_id = %s", (teacher_id, user_id))
+    cur.execute("SELECT * FROM teachers WHERE id = %s AND user_id = %s AND deleted_at IS NULL", (teacher_id, user_id))
     teacher = cur.fetchone()
     
     if not teacher:
@@ -565,7 +1184,7 @@ def edit_teacher(teacher_id):
                 SET name = %s, email = %s, department = %s
                 WHERE id = %s AND user_id = %s
             """, (name, email, department, teacher_id, user_id))
-            mysql.connection.commit()
+            commit_user_change(cur, user_id)
             flash('Teacher updated successfully!', 'success')
             cur.close()
             return redirect(url_for('teachers'))
@@ -577,26 +1196,31 @@ def edit_teacher(teacher_id):
     return render_template('edit_teacher.html', teacher=teacher)
 
 # Delete teacher
-@app.route('/teacher/<int:teacher_id>/delete', methods=['POST'])
+@route('/teacher/<int:teacher_id>/delete', methods=['POST'])
 @login_required
 def delete_teacher(teacher_id):
     user_id = session['user_id']
     
     cur = mysql.connection.cursor()
     # Check if teacher belongs to user
-    cur.execute("SELECT id FROM teachers WHERE id = %s AND user_id = %s", (teacher_id, user_id))
+    cur.execute("SELECT id FROM teachers WHERE id = %s AND user_id = %s AND deleted_at IS NULL", (teacher_id, user_id))
     teacher = cur.fetchone()
     
     if teacher:
         # Check if teacher has courses
-        cur.execute("SELECT COUNT(*) as count FROM courses WHERE teacher_id = %s AND user_id = %s", (teacher_id, user_id))
+        cur.execute("""
+            SELECT COUNT(*) as count FROM courses
+            WHERE teacher_id = %s AND user_id = %s AND deleted_at IS NULL
+        """, (teacher_id, user_id))
         result = cur.fetchone()
         
         if result['count'] > 0:
             flash('Cannot delete teacher who has courses assigned.', 'danger')
         else:
-            cur.execute("DELETE FROM teachers WHERE id = %s", (teacher_id,))
-            mysql.connection.commit()
+            # Hidden now, removed by the purge job once their deleted courses are gone
+            cur.execute("UPDATE teachers SET deleted_at = CURRENT_TIMESTAMP WHERE id = %s", (teacher_id,))
+            commit_user_change(cur, user_id)
+            purger.wake()
             flash('Teacher deleted successfully!', 'success')
     else:
         flash('Teacher not found.', 'danger')
@@ -606,14 +1230,14 @@ def delete_teacher(teacher_id):
 
 # Delete course
 # Edit course
-@app.route('/course/<int:course_id>/edit', methods=['GET', 'POST'])
+@route('/course/<int:course_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_course(course_id):
     user_id = session['user_id']
     cur = mysql.connection.cursor()
     
     # Check if course belongs to user
-    cur.execute("SELECT * FROM courses WHERE id = %s AND user_id = %s", (course_id, user_id))
+    cur.execute("SELECT * FROM courses WHERE id = %s AND user_id = %s AND deleted_at IS NULL", (course_id, user_id))
     course = cur.fetchone()
     
     if not course:
@@ -653,7 +1277,7 @@ def edit_course(course_id):
                 ON DUPLICATE KEY UPDATE required_percentage = %s
             """, (user_id, course_id, new_required_percentage, new_required_percentage))
             
-            mysql.connection.commit()
+            commit_user_change(cur, user_id)
             flash('Course updated successfully!', 'success')
             cur.close()
             return redirect(url_for('courses'))
@@ -662,26 +1286,28 @@ def edit_course(course_id):
             flash(f'Failed to update course. Error: {str(e)}', 'danger')
     
     # GET request - show form with current course data and teachers list
-    cur.execute("SELECT * FROM teachers WHERE user_id = %s ORDER BY name", (user_id,))
+    cur.execute("SELECT * FROM teachers WHERE user_id = %s AND deleted_at IS NULL ORDER BY name", (user_id,))
     teachers = cur.fetchall()
     cur.close()
     
     return render_template('edit_course.html', course=course, teachers=teachers, required_percentage=required_percentage)
 
 # Delete course
-@app.route('/course/<int:course_id>/delete', methods=['POST'])
+@route('/course/<int:course_id>/delete', methods=['POST'])
 @login_required
 def delete_course(course_id):
     user_id = session['user_id']
     
     cur = mysql.connection.cursor()
     # Check if course belongs to user
-    cur.execute("SELECT id FROM courses WHERE id = %s AND user_id = %s", (course_id, user_id))
+    cur.execute("SELECT id FROM courses WHERE id = %s AND user_id = %s AND deleted_at IS NULL", (course_id, user_id))
     course = cur.fetchone()
     
     if course:
-        cur.execute("DELETE FROM courses WHERE id = %s", (course_id,))
-        mysql.connection.commit()
+        # Hidden now; its enrollments and attendance are removed in small batches by the purge job
+        cur.execute("UPDATE courses SET deleted_at = CURRENT_TIMESTAMP WHERE id = %s", (course_id,))
+        commit_user_change(cur, user_id)
+        purger.wake()
         flash('Course deleted successfully!', 'success')
     else:
         flash('Course not found or you do not have permission to delete it.', 'danger')
@@ -690,14 +1316,14 @@ def delete_course(course_id):
     return redirect(url_for('courses'))
 
 # Enroll in a course (auto-enrolled when creating, this is for re-enrollment)
-@app.route('/course/<int:course_id>/enroll', methods=['POST'])
+@route('/course/<int:course_id>/enroll', methods=['POST'])
 @login_required
 def enroll_course(course_id):
     user_id = session['user_id']
     
     cur = mysql.connection.cursor()
     # Verify course belongs to user
-    cur.execute("SELECT id FROM courses WHERE id = %s AND user_id = %s", (course_id, user_id))
+    cur.execute("SELECT id FROM courses WHERE id = %s AND user_id = %s AND deleted_at IS NULL", (course_id, user_id))
     course = cur.fetchone()
     
     if not course:
@@ -707,21 +1333,25 @@ def enroll_course(course_id):
     
     try:
         cur.execute("INSERT INTO enrollments (user_id, course_id) VALUES (%s, %s)", (user_id, course_id))
+        cur.execute("INSERT INTO attendance_counters (enrollment_id) VALUES (%s)", (cur.lastrowid,))
         # Create default attendance setting
         cur.execute("""
             INSERT INTO attendance_settings (user_id, course_id, required_percentage)
             VALUES (%s, %s, 60.00)
         """, (user_id, course_id))
-        mysql.connection.commit()
+        commit_user_change(cur, user_id)
         flash('Successfully enrolled in course!', 'success')
-    except Exception as e:
-        flash('Already enrolled or enrollment failed.', 'danger')
-    cur.close()
+    except mysql.connection.IntegrityError:
+        # unique_enrollment or unique_setting: already enrolled; undo what was inserted
+        mysql.connection.rollback()
+        flash('You are already enrolled in this course.', 'info')
+    finally:
+        cur.close()
     
     return redirect(url_for('courses'))
 
 # Unenroll from a course (DEPRECATED - removed, use delete instead)
-# @app.route('/course/<int:course_id>/unenroll', methods=['POST'])
+# @route('/course/<int:course_id>/unenroll', methods=['POST'])
 # @login_required
 # def unenroll_course(course_id):
 #     user_id = session['user_id']
@@ -735,7 +1365,7 @@ def enroll_course(course_id):
 #     return redirect(url_for('courses'))
 
 # Update required attendance percentage (DEPRECATED - now handled in edit_course)
-# @app.route('/course/<int:course_id>/settings', methods=['POST'])
+# @route('/course/<int:course_id>/settings', methods=['POST'])
 # @login_required
 # def update_settings(course_id):
 #     user_id = session['user_id']
@@ -758,4 +1388,4 @@ def enroll_course(course_id):
 #     return redirect(url_for('course_detail', course_id=course_id))
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,63 @@
+# Semester archival
+# attendance_records only needs the current semester's rows. Closing a semester marks
+# its courses archived (no new marks) and moves their records into attendance_archive,
+# a compact table clustered by enrollment, in batches of one transaction each. Records
+# keep their ids, so history pages and cursors work the same on the archive.
+# Counters already include every record and are not touched.
+
+
+def close_semester(cur, semester):
+    # Mark the semester's courses archived and bump their students' data version so
+    # cached course pages drop the marking controls. Returns the number of courses.
+    cur.execute("""
+        UPDATE courses SET archived_at = CURRENT_TIMESTAMP
+        WHERE semester = %s AND archived_at IS NULL AND deleted_at IS NULL
+    """, (semester,))
+    closed = cur.rowcount
+    cur.execute("""
+        UPDATE users SET data_version = data_version + 1, data_updated_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT e.user_id FROM enrollments e
+            JOIN courses c ON e.course_id = c.id
+            WHERE c.semester = %s
+        )
+    """, (semester,))
+    return closed
+
+
+def archive_semester(conn, semester, batch_size=5000):
+    # Returns (courses closed, records moved). Safe to re-run: it closes any courses
+    # added since and moves whatever is still left in attendance_records.
+    cur = conn.cursor()
+    try:
+        closed = close_semester(cur, semester)
+        conn.commit()
+
+        moved = 0
+        while True:
+            cur.execute("""
+                SELECT ar.id FROM attendance_records ar
+                JOIN enrollments e ON ar.enrollment_id = e.id
+                JOIN courses c ON e.course_id = c.id
+                WHERE c.semester = %s AND c.archived_at IS NOT NULL AND c.deleted_at IS NULL
+                ORDER BY ar.id
+                LIMIT %s
+            """, (semester, batch_size))
+            ids = [row['id'] for row in cur.fetchall()]
+            if not ids:
+                break
+            placeholders = ', '.join(['%s'] * len(ids))
+            cur.execute(f"""
+                INSERT INTO attendance_archive (id, enrollment_id, class_date, status, notes, created_at)
+                SELECT id, enrollment_id, class_date, status, notes, created_at
+                FROM attendance_records WHERE id IN ({placeholders})
+            """, ids)
+            cur.execute(f"DELETE FROM attendance_records WHERE id IN ({placeholders})", ids)
+            conn.commit()
+            moved += len(ids)
+        return closed, moved
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
@@ -0,0 +1,399 @@
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from flask import g, make_response, request, session
+from werkzeug.exceptions import HTTPException
+
+from app import (create_app, COURSE_DETAIL_SQL, COURSE_SETTINGS_SQL, DASHBOARD_SQL, USER_VERSION_SQL,
+                 cacheable_response, cached_session_user, history_query, instrumentation, is_not_modified,
+                 login_redirect, mysql, page_cache, page_validators, parse_history_cursor,
+                 render_course_detail, render_dashboard, store_page, user_cache)
+from db import PoolTimeout, parse_replica
+from instrumentation import record_query
+
+# ASGI serving mode
+#
+#     uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+#
+# The hot read pages (dashboard and course details) are served by async handlers on
+# aiomysql pools, so a request waiting on MySQL doesn't hold a thread, and the course
+# page runs its three independent queries concurrently on separate connections. Like
+# their Flask views, they read from a replica when DB_REPLICAS lists one.
+# Every other route runs the regular Flask app on a thread pool (ASGI_THREADS), with
+# streamed responses passed through chunk by chunk. Sessions, flashes, templates,
+# page caching and /metrics behave exactly as under WSGI.
+#
+# Async handlers need the MySQL backend; with DB_BACKEND=sqlite all routes use threads.
+
+
+class AsyncMySQL:
+    # aiomysql pools for the async handlers, created on the server's event loop: one for
+    # the primary and one per read replica. A request reads from the replica that
+    # mysql.connection would pick for a read-only view (mysql.replica_choices()), so
+    # pinning after a write and the lag checks apply here too.
+    def __init__(self, app):
+        self.app = app
+        self._pools = {}      # replica name, or None for the primary -> aiomysql pool
+        self._timeouts = {}   # same keys -> acquire timeouts
+        self._lock = asyncio.Lock()
+
+    async def pool(self, replica=None):
+        name = replica.name if replica else None
+        if name not in self._pools:
+            async with self._lock:
+                if name not in self._pools:
+                    import aiomysql
+                    config = self.app.config
+                    settings, extra = {}, {}
+                    if replica:
+                        settings = next(parse_replica(dsn) for dsn in config['MYSQL_REPLICAS']
+                                        if dsn.rsplit('@', 1)[-1] == name)
+                        extra = {'connect_timeout': int(config['MYSQL_REPLICA_CONNECT_TIMEOUT'])}
+                    self._pools[name] = await aiomysql.create_pool(
+                        host=settings.get('host', config['MYSQL_HOST']),
+                        user=settings.get('user', config['MYSQL_USER']),
+                        password=settings.get('password', config['MYSQL_PASSWORD']),
+                        db=settings.get('db', config['MYSQL_DB']),
+                        port=int(settings.get('port', config['MYSQL_PORT'])),
+                        charset=config['MYSQL_CHARSET'],
+                        minsize=int(config['MYSQL_POOL_MIN_SIZE']),
+                        maxsize=int(config['MYSQL_POOL_MAX_SIZE']),
+                        pool_recycle=int(config['MYSQL_POOL_RECYCLE']),
+                        # Reads only; autocommit keeps pooled connections off stale snapshots
+                        autocommit=True,
+                        cursorclass=aiomysql.DictCursor,
+                        **extra,
+                    )
+        return self._pools[name]
+
+    async def acquire(self, replica=None):
+        pool = await self.pool(replica)
+        timeout = float(self.app.config['MYSQL_POOL_TIMEOUT'])
+        try:
+            return pool, await asyncio.wait_for(pool.acquire(), timeout)
+        except asyncio.TimeoutError:
+            name = replica.name if replica else None
+            self._timeouts[name] = self._timeouts.get(name, 0) + 1
+            raise PoolTimeout(f'No database connection available after {timeout}s')
+
+    # The replica of this request (None for the primary) is chosen before its first
+    # query awaits, so the concurrent queries of one page all read from it
+    async def connection(self):
+        if 'async_replica' not in g:
+            g.async_replica = next(iter(mysql.replica_choices()), None)
+        replica = g.async_replica
+        if replica is not None:
+            try:
+                return await self.acquire(replica)
+            except PoolTimeout:
+                pass
+            except Exception as e:
+                # Down since its last check; skip it until the next one
+                replica.healthy, replica.reason = False, f'unreachable: {e}'
+                g.async_replica = None
+        return await self.acquire()
+
+    async def fetch(self, query, args=None, one=False):
+        pool, conn = await self.connection()
+        try:
+            start = time.perf_counter()
+            async with conn.cursor() as cur:
+                await cur.execute(query, args)
+                rows = await (cur.fetchone() if one else cur.fetchall())
+            record_query(query, time.perf_counter() - start)
+            return rows
+        finally:
+            pool.release(conn)
+
+    async def close(self):
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.close()
+            await pool.wait_closed()
+
+    # For Instrumentation.add_collector: the async pools next to the threads' pool
+    def metric_lines(self):
+        lines = []
+        for key, kind in (('size', 'gauge'), ('idle', 'gauge'), ('in_use', 'gauge'), ('max_size', 'gauge'),
+                          ('timeouts', 'counter')):
+            name = f'sixtypercent_db_async_pool_{key}'
+            lines.append(f'# TYPE {name} {kind}')
+            for target, pool in sorted(self._pools.items(), key=lambda item: item[0] or ''):
+                value = {'size': pool.size, 'idle': pool.freesize, 'in_use': pool.size - pool.freesize,
+                         'max_size': pool.maxsize, 'timeouts': self._timeouts.get(target, 0)}[key]
+                lines.append(f'{name}{{pool="{target or "primary"}"}} {value}')
+        return lines
+
+
+app = create_app()
+db = AsyncMySQL(app)
+instrumentation.add_collector(db.metric_lines)
+
+
+# Async counterparts of app.login_required and app.cached_page
+def login_required(f):
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return login_redirect()
+
+        user = cached_session_user()
+        if user is None:
+            user = await db.fetch(USER_VERSION_SQL, (session['user_id'],), one=True)
+            if user:
+                user_cache.set(user['id'], user)
+        if not user:
+            return login_redirect(expired=True)
+
+        g.user = user
+        return await f(*args, **kwargs)
+    return decorated_function
+
+
+def cached_page(f):
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        if '_flashes' in session:
+            return await f(*args, **kwargs)
+
+        key, etag, last_modified = page_validators()
+        if is_not_modified(etag):
+            response = make_response('', 304)
+        else:
+            html = page_cache.get(key)
+            if html is not None:
+                response = make_response(html)
+            else:
+                response = make_response(await f(*args, **kwargs))
+                if not store_page(key, response):
+                    return response
+        return cacheable_response(response, etag, last_modified)
+    return decorated_function
+
+
+@login_required
+@cached_page
+async def dashboard():
+    user_id = session['user_id']
+    return render_dashboard(await db.fetch(DASHBOARD_SQL, (user_id, user_id)))
+
+
+@login_required
+@cached_page
+async def course_detail(course_id):
+    user_id = session['user_id']
+    page_size = app.config['HISTORY_PAGE_SIZE']
+    before = parse_history_cursor(request.args.get('before'))
+    archived = request.args.get('archive') == '1'
+    course, attendance, settings = await asyncio.gather(
+        db.fetch(COURSE_DETAIL_SQL, (course_id, user_id), one=True),
+        db.fetch(*history_query(user_id, course_id, before, page_size, archived)),
+        db.fetch(COURSE_SETTINGS_SQL, (user_id, course_id), one=True),
+    )
+    return render_course_detail(course, attendance, settings, before, page_size, archived)
+
+
+# Flask endpoint -> async handler, used for GET/HEAD requests
+ASYNC_VIEWS = {'dashboard': dashboard, 'course_detail': course_detail}
+
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def _status_code(status):
+    return int(status.split(' ', 1)[0])
+
+
+def _header_list(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+class Application:
+    def __init__(self, app, threads):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        self.async_enabled = app.config['DB_BACKEND'] == 'mysql'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = await read_body(receive)
+        environ = build_environ(scope, body)
+        view = self.match_async(environ)
+        if view is not None:
+            await self.run_async(environ, view, send)
+        else:
+            await self.run_wsgi(environ, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.async_enabled:
+                        await db.pool()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await db.close()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def match_async(self, environ):
+        if not self.async_enabled or environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            return None
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+        return ASYNC_VIEWS.get(endpoint)
+
+    # Same steps as Flask.wsgi_app / full_dispatch_request, awaiting the view
+    async def run_async(self, environ, view, send):
+        ctx = self.app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                try:
+                    rv = self.app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = self.app.handle_user_exception(e)
+                response = self.app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = self.app.handle_exception(e)
+
+            started = {}
+
+            def start_response(status, headers, exc_info=None):
+                started['status'], started['headers'] = status, headers
+
+            body = b''.join(response(environ, start_response))
+        finally:
+            ctx.pop(error)
+
+        await send({'type': 'http.response.start', 'status': _status_code(started['status']),
+                    'headers': _header_list(started['headers'])})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # Run the Flask WSGI app on the thread pool, relaying the response through a
+    # bounded queue so streamed responses keep flowing without being buffered
+    async def run_wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=16)
+        disconnected = threading.Event()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            put(('start', status, headers))
+
+        def worker():
+            try:
+                result = self.app(environ, start_response)
+                try:
+                    for chunk in result:
+                        if disconnected.is_set():
+                            break
+                        if chunk:
+                            put(('body', chunk))
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+            except Exception:
+                self.app.logger.exception('Unhandled error in WSGI worker')
+                put(('error',))
+            finally:
+                put(('end',))
+
+        future = loop.run_in_executor(self.executor, worker)
+        started = False
+        while True:
+            item = await queue.get()
+            if item[0] == 'end':
+                break
+            if disconnected.is_set():
+                continue
+            try:
+                if item[0] == 'start':
+                    await send({'type': 'http.response.start', 'status': _status_code(item[1]),
+                                'headers': _header_list(item[2])})
+                    started = True
+                elif item[0] == 'body':
+                    await send({'type': 'http.response.body', 'body': item[1], 'more_body': True})
+                elif item[0] == 'error' and not started:
+                    await send({'type': 'http.response.start', 'status': 500,
+                                'headers': [(b'content-type', b'text/plain')]})
+                    started = True
+            except Exception:
+                # Client went away; let the worker stop and drain what it already queued
+                disconnected.set()
+        await future
+        if started and not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b''})
+
+
+application = Application(app, threads=app.config['ASGI_THREADS'])
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:application', host='0.0.0.0', port=5000)
@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+# Fingerprinted static assets
+# `flask --app app build-assets` copies every file in static/ to static/<ASSETS_DIR>/
+# under a name that contains a hash of its content (style.css -> style.3f2a9c1e7b04.css),
+# next to precompressed .gz and .br variants, and writes a manifest.json mapping the
+# two. With a manifest present, url_for('static', filename='style.css') resolves to the
+# fingerprinted file, which is served with far-future immutable cache headers and the
+# best precompressed variant the browser accepts, so repeat visits never ask for it.
+# A changed file gets a new name, so browsers fetch it right after a deploy.
+#
+# Without a manifest (development) static files are served as before.
+
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot'}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))    # preference order
+
+
+def _fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _write_variants(path, data):
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    for suffix, compressed in variants.items():
+        # Not worth a variant when compression barely helps
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+
+
+def build(static_folder, output_dir='dist'):
+    # Returns the manifest {source name: fingerprinted name}, both relative to static/.
+    # Files from earlier builds are kept so pages rendered before a deploy still load.
+    out = os.path.join(static_folder, output_dir)
+    os.makedirs(out, exist_ok=True)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != out and not d.startswith('.'))
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            stem, ext = os.path.splitext(relative)
+            target = f'{output_dir}/{stem}.{_fingerprint(source)}{ext}'
+            target_path = os.path.join(static_folder, target)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with open(source, 'rb') as f:
+                data = f.read()
+            with open(target_path, 'wb') as f:
+                f.write(data)
+            if ext.lower() in COMPRESSIBLE:
+                _write_variants(target_path, data)
+            manifest[relative] = target
+
+    with open(os.path.join(out, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.variants = {}      # fingerprinted name -> available encodings
+        self.version = ''
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('ASSETS_DIR', 'dist')
+        app.config.setdefault('ASSETS_MAX_AGE', 31536000)
+        self.load()
+        app.url_defaults(self._fingerprinted_url)
+        app.view_functions['static'] = self.send_static
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.app.static_folder, self.app.config['ASSETS_DIR'], 'manifest.json')
+
+    def load(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        self.variants = {target: self._encodings(target) for target in manifest.values()}
+        self.manifest = manifest
+        # Part of page ETags, so cached pages pointing at old asset names are replaced
+        self.version = hashlib.sha1(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:12] if manifest else ''
+
+    def _encodings(self, target):
+        return [encoding for encoding, suffix in ENCODINGS
+                if os.path.exists(os.path.join(self.app.static_folder, target + suffix))]
+
+    def build(self):
+        manifest = build(self.app.static_folder, self.app.config['ASSETS_DIR'])
+        self.load()
+        return manifest
+
+    def _fingerprinted_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
+
+    def send_static(self, filename):
+        encodings = self.variants.get(filename)
+        if encodings is None:
+            # Files of earlier builds are still immutable
+            if not filename.startswith(self.app.config['ASSETS_DIR'] + '/') or filename.endswith('manifest.json'):
+                return self.app.send_static_file(filename)
+            encodings = self._encodings(filename)
+
+        accepted = request.accept_encodings
+        encoding = next((e for e in encodings if accepted[e]), None)
+        path = filename + dict(ENCODINGS)[encoding] if encoding else filename
+        response = send_from_directory(self.app.static_folder, path,
+                                       mimetype=mimetypes.guess_type(filename)[0],
+                                       max_age=self.app.config['ASSETS_MAX_AGE'])
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
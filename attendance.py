@@ -0,0 +1,92 @@
+# Attendance metrics
+# Single source of truth for the attendance math shown on the dashboard, the course
+# details page and the reports. Percentages are taken over the course's TOTAL classes
+# (not just the ones held so far).
+#
+# course_metrics() handles one enrollment and is what the request handlers use.
+# course_metrics_batch() computes the same fields for N enrollments at once with NumPy
+# column operations, for institution-wide reports.
+
+DEFAULT_REQUIRED_PERCENTAGE = 60.0
+
+
+def course_metrics(total_classes, classes_held, present, required_percentage):
+    classes_held = classes_held or 0
+    present = present or 0
+
+    # Calculate percentage based on TOTAL classes (not just held)
+    attendance_percentage = (present / total_classes * 100) if total_classes > 0 else 0
+
+    # Calculate classes needed to reach target
+    # Formula: need P such that (present + P) / (total_classes) >= required_percentage / 100
+    # Solving: P >= (required_percentage * total_classes / 100) - present
+    required_present = (required_percentage * total_classes) / 100
+    shortfall = required_present - present
+    classes_needed = max(0, int(shortfall) + (1 if shortfall > int(shortfall) else 0))
+
+    # Remaining classes
+    remaining_classes = max(0, total_classes - classes_held)
+
+    # Calculate classes user can miss
+    # If we need more present classes, we can only miss: remaining - classes_needed
+    # If we already have enough, we can miss all remaining
+    if classes_needed > 0:
+        classes_can_miss = max(0, remaining_classes - classes_needed)
+    else:
+        classes_can_miss = remaining_classes
+
+    # Danger Zone: Cannot miss any more classes
+    # This happens when: remaining_classes == classes_needed
+    danger_zone = (remaining_classes > 0 and remaining_classes == classes_needed)
+
+    # Dead Zone: Even attending all remaining classes won't help
+    # This happens when: present + remaining_classes < required_present
+    dead_zone = (present + remaining_classes) < required_present
+
+    return {
+        'attendance_percentage': round(attendance_percentage, 2),
+        'classes_needed': classes_needed,
+        'remaining_classes': remaining_classes,
+        'classes_can_miss': classes_can_miss,
+        'danger_zone': danger_zone,
+        'dead_zone': dead_zone,
+    }
+
+
+def course_metrics_batch(total_classes, classes_held, present, required_percentage):
+    # Column-wise version of course_metrics(): each argument is a sequence (or NumPy
+    # array) with one entry per enrollment; returns a dict of NumPy arrays.
+    import numpy as np
+
+    total = np.asarray(total_classes, dtype=np.int64)
+    held = np.asarray(classes_held, dtype=np.int64)
+    present = np.asarray(present, dtype=np.int64)
+    # Required percentages are DECIMAL(5,2); work in integer hundredths so the
+    # ceiling and comparisons are exact, like the Decimal math in course_metrics()
+    required_hundredths = np.rint(np.asarray(required_percentage, dtype=np.float64) * 100).astype(np.int64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage = np.where(total > 0, present / np.where(total > 0, total, 1) * 100, 0.0)
+    attendance_percentage = np.round(percentage, 2)
+
+    # required_present * 10000, and the shortfall ceiling-divided back to whole classes
+    required_scaled = required_hundredths * total
+    shortfall_scaled = required_scaled - present * 10000
+    classes_needed = np.maximum(0, -(-shortfall_scaled // 10000))
+
+    remaining_classes = np.maximum(0, total - held)
+    classes_can_miss = np.where(classes_needed > 0,
+                                np.maximum(0, remaining_classes - classes_needed),
+                                remaining_classes)
+    danger_zone = (remaining_classes > 0) & (remaining_classes == classes_needed)
+    dead_zone = (present + remaining_classes) * 10000 < required_scaled
+
+    return {
+        'attendance_percentage': attendance_percentage,
+        'classes_needed': classes_needed,
+        'remaining_classes': remaining_classes,
+        'classes_can_miss': classes_can_miss,
+        'danger_zone': danger_zone,
+        'dead_zone': dead_zone,
+    }
+
@@ -0,0 +1,138 @@
+"""Per-request latency on the MySQL and SQLite storage backends.
+
+Drives the app in-process through Flask's test client (no HTTP, no page cache), so the
+numbers are server-side latency: routing, SQL and template rendering. Each backend runs
+in its own subprocess with DB_BACKEND set; SQLite uses a fresh WAL database in a temp
+directory, MySQL uses the database from .env (run it against a scratch database - a
+bench user with courses and records is created there).
+
+    python benchmarks/backend_latency.py
+    python benchmarks/backend_latency.py --backends sqlite --requests 1000 --records 200
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from stats import percentile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ROUTES = ('dashboard', 'course', 'mark', 'api_marks')
+
+
+def run_worker(args):
+    sys.path.insert(0, ROOT)
+    if os.environ['DB_BACKEND'] == 'sqlite':
+        import sqlite_backend
+        sqlite_backend.init_schema(os.environ['SQLITE_PATH'])
+    from app import create_app
+    app = create_app()
+
+    client = app.test_client()
+    username, password = f'bench_latency_{os.getpid()}', 'bench-password'
+    client.post('/register', data={'username': username, 'password': password, 'confirm_password': password,
+                                   'full_name': 'Latency Bench', 'email': ''})
+    client.post('/login', data={'username': username, 'password': password})
+    client.post('/teacher/add', data={'name': 'Bench Teacher', 'email': '', 'department': ''})
+    teacher_id = re.findall(r'/teacher/(\d+)/edit', client.get('/teachers').data.decode())[0]
+
+    total_classes = args.records + args.requests * 2
+    for n in range(args.courses):
+        client.post('/course/add', data={'course_code': f'BENCH{n}', 'course_name': f'Bench {n}',
+                                         'teacher_id': teacher_id, 'semester': 'Bench',
+                                         'total_classes': total_classes})
+    course_ids = sorted({int(i) for i in re.findall(r'/course/(\d+)', client.get('/dashboard').data.decode())})
+
+    # Seed history through the batch API
+    start_day = date(2020, 1, 1)
+    chunk = app.config['API_MAX_MARKS']
+    for course_id in course_ids:
+        days = [start_day + timedelta(days=i) for i in range(args.records)]
+        for i in range(0, len(days), chunk):
+            marks = [{'course_id': course_id, 'class_date': d.isoformat(), 'status': 'present' if j % 4 else 'absent'}
+                     for j, d in enumerate(days[i:i + chunk])]
+            client.post('/api/attendance/marks', json={'marks': marks})
+
+    next_day = {course_id: start_day + timedelta(days=args.records) for course_id in course_ids}
+
+    def request(route, n):
+        course_id = course_ids[n % len(course_ids)]
+        if route == 'dashboard':
+            return client.get('/dashboard')
+        if route == 'course':
+            return client.get(f'/course/{course_id}')
+        day = next_day[course_id]
+        next_day[course_id] += timedelta(days=1)
+        if route == 'mark':
+            return client.post(f'/course/{course_id}/mark',
+                               data={'class_date': day.isoformat(), 'status': 'present', 'notes': ''})
+        return client.post('/api/attendance/marks',
+                           json={'marks': [{'course_id': course_id, 'class_date': day.isoformat(), 'status': 'absent'}]})
+
+    results = {}
+    for route in ROUTES:
+        for n in range(args.warmup):
+            request(route, n)
+        latencies, errors = [], 0
+        for n in range(args.requests):
+            started = time.perf_counter()
+            response = request(route, n)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+        latencies.sort()
+        results[route] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        }
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default='sqlite,mysql', help='Comma separated: sqlite, mysql')
+    parser.add_argument('--requests', type=int, default=300, help='Timed requests per route')
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per route')
+    parser.add_argument('--courses', type=int, default=5)
+    parser.add_argument('--records', type=int, default=100, help='Seeded records per course')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends.split(','):
+            env = dict(os.environ, DB_BACKEND=backend, SQLITE_PATH=os.path.join(tmp, 'bench.db'),
+                       PAGE_CACHE_TTL='0', SLOW_REQUEST_MS='0', RATE_LIMITS='')
+            command = [sys.executable, os.path.abspath(__file__), '--worker',
+                       '--requests', str(args.requests), '--warmup', str(args.warmup),
+                       '--courses', str(args.courses), '--records', str(args.records)]
+            print(f'Running {backend}...', flush=True)
+            proc = subprocess.run(command, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'exit {proc.returncode}'
+                print(f'  {backend} failed: {error}')
+                continue
+            results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"\n{'backend':<10}{'route':<12}{'errors':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for backend, routes in results.items():
+        for route, stats in routes.items():
+            print(f"{backend:<10}{route:<12}{stats['errors']:>8}{stats['mean_ms']:>10}"
+                  f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
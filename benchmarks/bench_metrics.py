@@ -0,0 +1,55 @@
+"""Compare per-row course_metrics() with the vectorised course_metrics_batch().
+
+Usage: python benchmarks/bench_metrics.py [N ...]     (default: 10000 1000000)
+"""
+import os
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from attendance import course_metrics, course_metrics_batch  # noqa: E402
+
+FIELDS = ('attendance_percentage', 'classes_needed', 'remaining_classes',
+          'classes_can_miss', 'danger_zone', 'dead_zone')
+
+
+def make_enrollments(n, seed=42):
+    rng = np.random.default_rng(seed)
+    total = rng.integers(0, 120, n)
+    held = (total * rng.random(n)).astype(np.int64)
+    present = (held * rng.random(n)).astype(np.int64)
+    required = rng.integers(0, 10001, n) / 100          # DECIMAL(5,2) in [0, 100]
+    return total, held, present, required
+
+
+def run(n):
+    total, held, present, required = make_enrollments(n)
+    # Rows as the request handlers see them (MySQL returns DECIMAL as Decimal)
+    rows = list(zip(total.tolist(), held.tolist(), present.tolist(),
+                    (Decimal(f'{r:.2f}') for r in required.tolist())))
+
+    start = time.perf_counter()
+    scalar = [course_metrics(*row) for row in rows]
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = course_metrics_batch(total, held, present, required)
+    batch_seconds = time.perf_counter() - start
+
+    mismatches = 0
+    for field in FIELDS:
+        expected = np.array([m[field] for m in scalar])
+        mismatches += int(np.count_nonzero(expected != batch[field]))
+
+    print(f'{n:>10,} enrollments | per-row {scalar_seconds:8.3f}s | batch {batch_seconds:8.4f}s | '
+          f'speedup {scalar_seconds / batch_seconds:7.1f}x | mismatched fields {mismatches}')
+    return mismatches
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 1_000_000]
+    failed = sum(run(n) for n in sizes)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,105 @@
+"""Fire parallel attendance marks at one enrollment and check the cap held.
+
+Runs against a live server and its database (settings from .env):
+
+    python benchmarks/concurrent_marks.py --username demo --password demo123 --course-id 1
+    python benchmarks/concurrent_marks.py ... --same-date      # double-submit of one mark
+
+Without --same-date every request uses a different date, so at most the remaining
+classes may be recorded. With --same-date exactly one record may be created and the
+other requests must be answered as already marked, not as errors. Exits non-zero if
+the counters disagree with attendance_records or total_classes was exceeded.
+"""
+import argparse
+import http.cookiejar
+import os
+import sys
+import threading
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+
+import MySQLdb
+import MySQLdb.cursors
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from config import Config  # noqa: E402
+
+
+def login(base_url, username, password):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    data = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+    opener.open(f'{base_url}/login', data).read()
+    if not any(cookie.name == 'session' for cookie in jar):
+        sys.exit('Login failed')
+    return opener
+
+
+def enrollment_state(user, course_id):
+    conn = MySQLdb.connect(host=Config.MYSQL_HOST, user=Config.MYSQL_USER, passwd=Config.MYSQL_PASSWORD,
+                           db=Config.MYSQL_DB, port=Config.MYSQL_PORT, cursorclass=MySQLdb.cursors.DictCursor)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT c.total_classes, ac.classes_held,
+            (SELECT COUNT(*) FROM attendance_records ar WHERE ar.enrollment_id = e.id) as records
+        FROM enrollments e
+        JOIN users u ON u.id = e.user_id
+        JOIN courses c ON c.id = e.course_id
+        LEFT JOIN attendance_counters ac ON ac.enrollment_id = e.id
+        WHERE u.username = %s AND e.course_id = %s
+    """, (user, course_id))
+    state = cur.fetchone()
+    conn.close()
+    if not state:
+        sys.exit('Enrollment not found')
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--course-id', type=int, required=True)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--same-date', action='store_true')
+    args = parser.parse_args()
+
+    before = enrollment_state(args.username, args.course_id)
+    opener = login(args.base_url, args.username, args.password)
+    start_date = date(2000, 1, 1) + timedelta(days=before['records'] * 2)
+    barrier = threading.Barrier(args.requests)
+    failures = []
+
+    def mark(i):
+        class_date = start_date if args.same_date else start_date + timedelta(days=i)
+        data = urllib.parse.urlencode({'class_date': class_date.isoformat(), 'status': 'present'}).encode()
+        barrier.wait()
+        try:
+            opener.open(f'{args.base_url}/course/{args.course_id}/mark', data).read()
+        except Exception as e:
+            failures.append(e)
+
+    threads = [threading.Thread(target=mark, args=(i,)) for i in range(args.requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    after = enrollment_state(args.username, args.course_id)
+    created = after['records'] - before['records']
+    remaining = before['total_classes'] - before['records']
+    expected = min(1 if args.same_date else args.requests, remaining)
+    print(f'{args.requests} parallel requests, {len(failures)} HTTP failures, {created} records created '
+          f'(expected {expected}), counters {after["classes_held"]} vs records {after["records"]}, '
+          f'total_classes {after["total_classes"]}')
+
+    ok = (not failures and created == expected and after['classes_held'] == after['records']
+          and after['records'] <= after['total_classes'])
+    print('OK' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Generate a synthetic dataset for benchmarks.
+
+Creates users bench_user_1 .. bench_user_N (password: see --password), each with
+their own teachers, courses, enrollments, settings, attendance records, the
+running-total attendance series and attendance counters. Rows are written with explicit ids through multi-row INSERTs
+in large batches, with unique/foreign key checks disabled for the session.
+
+    python benchmarks/generate_data.py --users 1000 --courses 6 --records 30
+    python benchmarks/generate_data.py --users 100000 --courses 5 --records 20   # ~10M records
+
+Settings come from .env like the app. Run it against a scratch database.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import MySQLdb
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from config import Config  # noqa: E402
+
+DEPARTMENTS = ['Computer Science', 'Mathematics', 'Physics', 'Chemistry', 'English', 'History']
+SUBJECTS = ['CS', 'MATH', 'PHY', 'CHEM', 'ENG', 'HIST']
+REQUIRED_PERCENTAGES = [60, 60, 60, 70, 75, 80]
+SEMESTER = 'Fall 2025'
+SEMESTER_START = date(2025, 9, 1)
+
+
+class BulkWriter:
+    # Buffers rows per table and flushes them as multi-row INSERTs
+    def __init__(self, conn, batch_size):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, table, columns, row):
+        key = (table, columns)
+        rows = self.pending.setdefault(key, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(key)
+
+    def flush(self, key=None):
+        for table, columns in ([key] if key else list(self.pending)):
+            rows = self.pending.get((table, columns))
+            if not rows:
+                continue
+            placeholders = ', '.join(['%s'] * len(columns))
+            cur = self.conn.cursor()
+            cur.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+            cur.close()
+            self.conn.commit()
+            self.counts[table] = self.counts.get(table, 0) + len(rows)
+            rows.clear()
+
+
+def next_id(conn, table):
+    cur = conn.cursor()
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    value = cur.fetchone()[0]
+    cur.close()
+    return value
+
+
+def class_dates(count):
+    # Weekday class dates from the start of the semester
+    day, dates = SEMESTER_START, []
+    while len(dates) < count:
+        if day.weekday() < 5:
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+def generate(conn, args):
+    rng = random.Random(args.seed)
+    password_hash = generate_password_hash(args.password)
+    writer = BulkWriter(conn, args.batch_size)
+
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM users WHERE username LIKE 'bench\\_user\\_%'")
+    offset = cur.fetchone()[0]
+    cur.execute("SET unique_checks = 0, foreign_key_checks = 0")
+    cur.close()
+
+    user_id = next_id(conn, 'users')
+    teacher_id = next_id(conn, 'teachers')
+    course_id = next_id(conn, 'courses')
+    enrollment_id = next_id(conn, 'enrollments')
+    record_id = next_id(conn, 'attendance_records')
+
+    for n in range(offset + 1, offset + args.users + 1):
+        writer.add('users', ('id', 'username', 'password_hash', 'full_name', 'email'),
+                   (user_id, f'bench_user_{n}', password_hash, f'Bench User {n}', f'bench{n}@example.com'))
+        propensity = rng.uniform(0.4, 1.0)   # how often this student attends
+
+        teacher_ids = []
+        for t in range(args.teachers):
+            writer.add('teachers', ('id', 'user_id', 'name', 'email', 'department'),
+                       (teacher_id, user_id, f'Teacher {n}-{t + 1}', f'teacher{n}_{t + 1}@example.com',
+                        DEPARTMENTS[t % len(DEPARTMENTS)]))
+            teacher_ids.append(teacher_id)
+            teacher_id += 1
+
+        for c in range(args.courses):
+            total_classes = rng.randint(max(args.records, 30), max(args.records, 30) + 20)
+            writer.add('courses', ('id', 'user_id', 'course_code', 'course_name', 'teacher_id', 'semester', 'total_classes'),
+                       (course_id, user_id, f'{SUBJECTS[c % len(SUBJECTS)]}{101 + c}', f'Course {c + 1}',
+                        teacher_ids[c % len(teacher_ids)], SEMESTER, total_classes))
+            writer.add('enrollments', ('id', 'user_id', 'course_id'), (enrollment_id, user_id, course_id))
+            writer.add('attendance_settings', ('user_id', 'course_id', 'required_percentage'),
+                       (user_id, course_id, rng.choice(REQUIRED_PERCENTAGES)))
+
+            present = absent = 0
+            for class_date in class_dates(args.records):
+                status = 'present' if rng.random() < propensity else 'absent'
+                if status == 'present':
+                    present += 1
+                else:
+                    absent += 1
+                writer.add('attendance_records', ('id', 'enrollment_id', 'class_date', 'status', 'notes'),
+                           (record_id, enrollment_id, class_date, status, None))
+                # Same running totals as SERIES_REBUILD_SQL (dates are ascending)
+                writer.add('attendance_series', ('enrollment_id', 'class_date', 'held', 'present'),
+                           (enrollment_id, class_date, present + absent, present))
+                record_id += 1
+            writer.add('attendance_counters', ('enrollment_id', 'classes_held', 'present_count', 'absent_count'),
+                       (enrollment_id, present + absent, present, absent))
+
+            course_id += 1
+            enrollment_id += 1
+        user_id += 1
+
+        if n % 1000 == 0:
+            print(f'  {n - offset} users generated...', flush=True)
+
+    writer.flush()
+    return writer.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--teachers', type=int, default=4, help='Teachers per user (at least 1)')
+    parser.add_argument('--courses', type=int, default=5, help='Courses (and enrollments) per user')
+    parser.add_argument('--records', type=int, default=20, help='Attendance records per enrollment')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per multi-row INSERT')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    args.teachers = max(1, args.teachers)
+
+    conn = MySQLdb.connect(host=Config.MYSQL_HOST, user=Config.MYSQL_USER, passwd=Config.MYSQL_PASSWORD,
+                           db=Config.MYSQL_DB, port=Config.MYSQL_PORT, charset='utf8mb4')
+    start = time.perf_counter()
+    counts = generate(conn, args)
+    elapsed = time.perf_counter() - start
+    conn.close()
+
+    total = sum(counts.values())
+    for table, count in counts.items():
+        print(f'{table:>20}: {count:,}')
+    print(f'{total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Route-level load benchmark.
+
+Logs in simulated users (bench_user_1 .. bench_user_N from generate_data.py) and drives
+the dashboard, course detail, quick-mark and mark routes concurrently, then reports
+throughput and p50/p95/p99 latency per route.
+
+    python benchmarks/load_test.py --users 200 --concurrency 50 --duration 60
+    python benchmarks/load_test.py --mix dashboard=6,course=3,quick_mark=1,mark=0 --results results.jsonl
+
+Redirects are not followed, so write routes are timed without the page they redirect to.
+Run it against a server without RATE_LIMITS or SHED_POOL_WAIT_MS (the defaults): 429 and
+503 answers from the limiter count as errors and are reported separately.
+With --results, one JSON line per run is appended so regressions can be tracked over time.
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+
+from stats import percentile
+
+ROUTES = ('dashboard', 'course', 'quick_mark', 'mark')
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class SimulatedUser:
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url
+        self.jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.jar), NoRedirect)
+        self.username = username
+        self.password = password
+        self.course_ids = []
+
+    def request(self, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base_url + path, body, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            if 300 <= e.code < 400:
+                return e.code, b''
+            raise
+
+    def login(self):
+        self.request('/login', {'username': self.username, 'password': self.password})
+        status, html = self.request('/dashboard')
+        if status != 200:
+            raise RuntimeError(f'login failed for {self.username}')
+        self.course_ids = sorted({int(i) for i in re.findall(rb'/course/(\d+)', html)})
+
+    def run(self, route, rng):
+        course_id = rng.choice(self.course_ids) if self.course_ids else 0
+        if route == 'dashboard':
+            return self.request('/dashboard')
+        if route == 'course':
+            return self.request(f'/course/{course_id}')
+        if route == 'quick_mark':
+            return self.request(f'/course/{course_id}/quick-mark/{rng.choice(["present", "absent"])}', {})
+        class_date = date(2026, 1, 1) + timedelta(days=rng.randrange(365))
+        return self.request(f'/course/{course_id}/mark',
+                            {'class_date': class_date.isoformat(), 'status': rng.choice(['present', 'absent']),
+                             'notes': 'load test'})
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        route, weight = part.split('=')
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f'unknown route {route!r}')
+        mix[route] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=100, help='Simulated users to log in')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('dashboard=5,course=3,quick_mark=1,mark=1'))
+    parser.add_argument('--results', help='Append a JSON summary line to this file')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f'Logging in {args.users} users...')
+    users = [SimulatedUser(args.base_url, f'bench_user_{n}', args.password) for n in range(1, args.users + 1)]
+    for user in users:
+        user.login()
+
+    routes, weights = zip(*args.mix.items())
+    latencies = {route: [] for route in ROUTES}
+    errors = {route: 0 for route in ROUTES}
+    shed = {route: 0 for route in ROUTES}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def worker(n):
+        rng = random.Random(args.seed + n)
+        while time.monotonic() < deadline:
+            user = rng.choice(users)
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            limited = False
+            try:
+                status, _ = user.run(route, rng)
+                failed = status >= 400
+            except urllib.error.HTTPError as e:
+                failed, limited = True, e.code in (429, 503)
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                if failed:
+                    errors[route] += 1
+                    shed[route] += limited
+                else:
+                    latencies[route].append(elapsed)
+
+    print(f'Running {args.concurrency} workers for {args.duration:.0f}s...')
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    summary = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'concurrency': args.concurrency,
+               'users': args.users, 'duration': round(wall, 2), 'routes': {}}
+    print(f"\n{'route':<12}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route in ROUTES:
+        values = sorted(latencies[route])
+        if not values and not errors[route]:
+            continue
+        stats = {
+            'requests': len(values),
+            'errors': errors[route],
+            'rps': round(len(values) / wall, 1),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+        }
+        summary['routes'][route] = stats
+        print(f"{route:<12}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    total = sum(len(v) for v in latencies.values())
+    print(f'\n{total} requests in {wall:.1f}s = {total / wall:.1f} req/s')
+    if sum(shed.values()):
+        print(f'{sum(shed.values())} errors were 429/503 answers: is the server running with '
+              f'RATE_LIMITS or SHED_POOL_WAIT_MS set?')
+
+    if args.results:
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+    sys.exit(1 if sum(errors.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Login throughput with and without the password hashing pool.
+
+Simulates a semester-start login storm in-process (Flask test client, SQLite backend
+in a temp directory): --concurrency threads log in as fast as they can while a probe
+thread keeps loading the dashboard. Each configuration runs in its own subprocess:
+
+    inline  HASH_POOL_WORKERS=0 - hashing on the request threads
+    pool    HASH_POOL_WORKERS=--workers, HASH_POOL_QUEUE=--queue
+
+Reported per configuration: successful logins/s, logins rejected with 503 (hashing pool
+busy, or database pool timeouts), and the dashboard latency seen by the probe while the
+storm runs. The pool only pays off with spare cores; on a single core both configurations
+are CPU bound.
+
+    python benchmarks/login_storm.py
+    python benchmarks/login_storm.py --concurrency 64 --duration 20 --workers 4 --queue 16
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from stats import percentile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def run_worker(args):
+    sys.path.insert(0, ROOT)
+    import sqlite_backend
+    sqlite_backend.init_schema(os.environ['SQLITE_PATH'])
+    from app import create_app, passwords
+    app = create_app()
+
+    password = 'bench-password'
+    password_hash = passwords.hash(password)
+    conn = sqlite_backend.connect(os.environ['SQLITE_PATH'])
+    cur = conn.cursor()
+    cur.executemany("INSERT INTO users (username, password_hash, full_name) VALUES (%s, %s, %s)",
+                    [(f'storm_{n}', password_hash, f'Storm {n}') for n in range(args.concurrency + 1)])
+    conn.commit()
+    conn.close()
+    passwords.warm()
+
+    probe = app.test_client()
+    probe.post('/login', data={'username': f'storm_{args.concurrency}', 'password': password})
+    probe.get('/dashboard')
+
+    deadline = time.monotonic() + args.duration
+    lock = threading.Lock()
+    counts = {'ok': 0, 'rejected': 0, 'failed': 0}
+    probe_latencies = []
+
+    def storm(n):
+        client = app.test_client()
+        while time.monotonic() < deadline:
+            response = client.post('/login', data={'username': f'storm_{n}', 'password': password})
+            outcome = 'ok' if response.status_code == 302 else 'rejected' if response.status_code == 503 else 'failed'
+            with lock:
+                counts[outcome] += 1
+            client.get('/logout')
+
+    def probe_dashboard():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            probe.get('/dashboard')
+            probe_latencies.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=storm, args=(n,)) for n in range(args.concurrency)]
+    threads.append(threading.Thread(target=probe_dashboard))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    probe_latencies.sort()
+    print(json.dumps({
+        'logins_per_second': round(counts['ok'] / wall, 1),
+        'rejected': counts['rejected'],
+        'failed': counts['failed'],
+        'dashboard_p50_ms': round(percentile(probe_latencies, 50) * 1000, 2),
+        'dashboard_p95_ms': round(percentile(probe_latencies, 95) * 1000, 2),
+        'dashboard_p99_ms': round(percentile(probe_latencies, 99) * 1000, 2),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=32, help='Threads logging in')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per configuration')
+    parser.add_argument('--workers', type=int, default=2, help='HASH_POOL_WORKERS for the pool run')
+    parser.add_argument('--queue', type=int, default=8, help='HASH_POOL_QUEUE for the pool run')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    configs = {
+        'inline': {'HASH_POOL_WORKERS': '0'},
+        'pool': {'HASH_POOL_WORKERS': str(args.workers), 'HASH_POOL_QUEUE': str(args.queue)},
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, settings in configs.items():
+            env = dict(os.environ, DB_BACKEND='sqlite', SQLITE_PATH=os.path.join(tmp, f'{name}.db'),
+                       PAGE_CACHE_TTL='0', RATE_LIMITS='', **settings)
+            command = [sys.executable, os.path.abspath(__file__), '--worker',
+                       '--concurrency', str(args.concurrency), '--duration', str(args.duration)]
+            print(f'Running {name}...', flush=True)
+            proc = subprocess.run(command, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'exit {proc.returncode}'
+                print(f'  {name} failed: {error}')
+                continue
+            results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"\n{'config':<8}{'logins/s':>10}{'503s':>8}{'errors':>8}{'dash p50':>10}{'dash p95':>10}{'dash p99':>10}")
+    for name, stats in results.items():
+        print(f"{name:<8}{stats['logins_per_second']:>10}{stats['rejected']:>8}{stats['failed']:>8}"
+              f"{stats['dashboard_p50_ms']:>10}{stats['dashboard_p95_ms']:>10}{stats['dashboard_p99_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Attendance mark throughput with and without the write-behind buffer.
+
+Simulates the start of a class in-process (Flask test client, SQLite backend in a temp
+directory): --concurrency students each submit marks as fast as they can for
+--duration seconds. Every database commit is delayed by --commit-ms to stand in for
+the fsync and round trip of an InnoDB commit. Each configuration runs in its own
+subprocess:
+
+    direct    MARK_BUFFER=false - one transaction per mark
+    buffered  MARK_BUFFER=true  - journalled, flushed in batches of --batch
+
+Reported per configuration: acknowledged marks/s, database commits made for them
+(including the final drain of the journal), commits per mark, the request latency
+p50/p95/p99, and the time the drain took. The run fails if the database doesn't end
+up with exactly the acknowledged marks.
+
+    python benchmarks/mark_buffer.py
+    python benchmarks/mark_buffer.py --concurrency 64 --duration 20 --commit-ms 5 --batch 1000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from stats import percentile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PASSWORD = 'bench-password'
+
+
+def seed(conn, students, password_hash):
+    # One course per student with room for every mark the run can make
+    cur = conn.cursor()
+    cur.executemany("INSERT INTO users (id, username, password_hash, full_name) VALUES (%s, %s, %s, %s)",
+                    [(n + 1, f'student_{n}', password_hash, f'Student {n}') for n in range(students)])
+    cur.executemany("INSERT INTO teachers (id, user_id, name) VALUES (%s, %s, %s)",
+                    [(n + 1, n + 1, f'Teacher {n}') for n in range(students)])
+    cur.executemany("""INSERT INTO courses (id, user_id, course_code, course_name, teacher_id, semester, total_classes)
+                       VALUES (%s, %s, 'BENCH', 'Bench course', %s, 'Bench', 100000)""",
+                    [(n + 1, n + 1, n + 1) for n in range(students)])
+    cur.executemany("INSERT INTO enrollments (id, user_id, course_id) VALUES (%s, %s, %s)",
+                    [(n + 1, n + 1, n + 1) for n in range(students)])
+    cur.executemany("INSERT INTO attendance_counters (enrollment_id, classes_held, present_count, absent_count) "
+                    "VALUES (%s, 0, 0, 0)", [(n + 1,) for n in range(students)])
+    conn.commit()
+    cur.close()
+
+
+def run_worker(args):
+    sys.path.insert(0, ROOT)
+    import sqlite_backend
+    sqlite_backend.init_schema(os.environ['SQLITE_PATH'])
+    from app import create_app, marks_buffer, mysql, passwords
+    app = create_app()
+    from instrumentation import InstrumentedConnection
+
+    commits = {'count': 0}
+    lock = threading.Lock()
+
+    class SlowCommitConnection(InstrumentedConnection):
+        # A commit that costs what it would over the network on a durable InnoDB
+        def commit(self):
+            time.sleep(args.commit_ms / 1000)
+            with lock:
+                commits['count'] += 1
+            return super().commit()
+
+    with app.app_context():
+        seed(mysql.connection, args.concurrency, passwords.hash(PASSWORD))
+    clients = []
+    for n in range(args.concurrency):
+        client = app.test_client()
+        client.post('/login', data={'username': f'student_{n}', 'password': PASSWORD})
+        clients.append(client)
+    mysql.connection_wrapper = SlowCommitConnection
+
+    deadline = time.monotonic() + args.duration
+    acknowledged = [0] * args.concurrency
+    latencies = [[] for _ in range(args.concurrency)]
+    failures = {'count': 0}
+
+    def student(n):
+        client, class_date = clients[n], date(2020, 1, 1)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = client.post(f'/course/{n + 1}/mark', data={
+                'class_date': class_date.isoformat(), 'status': 'present', 'notes': ''})
+            latencies[n].append(time.perf_counter() - started)
+            if response.status_code == 302:
+                acknowledged[n] += 1
+            else:
+                with lock:
+                    failures['count'] += 1
+            class_date += timedelta(days=1)
+
+    threads = [threading.Thread(target=student, args=(n,)) for n in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    drain_started = time.perf_counter()
+    if marks_buffer.enabled:
+        marks_buffer.stop()
+        marks_buffer.flush()
+    drain = time.perf_counter() - drain_started
+
+    mysql.connection_wrapper = InstrumentedConnection
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute("SELECT COUNT(*) as records FROM attendance_records")
+        records = cur.fetchone()['records']
+        cur.close()
+
+    marks = sum(acknowledged)
+    latencies = sorted(latency for per_student in latencies for latency in per_student)
+    print(json.dumps({
+        'marks_per_second': round(marks / wall, 1),
+        'marks': marks,
+        'records': records,
+        'failed': failures['count'],
+        'commits': commits['count'],
+        'commits_per_mark': round(commits['count'] / marks, 3) if marks else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'drain_s': round(drain, 2),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=32, help='Students marking at once')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per configuration')
+    parser.add_argument('--commit-ms', type=float, default=2, help='Simulated cost of one database commit')
+    parser.add_argument('--batch', type=int, default=500, help='MARK_FLUSH_BATCH for the buffered run')
+    parser.add_argument('--interval', type=float, default=0.5, help='MARK_FLUSH_INTERVAL for the buffered run')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    configs = {
+        'direct': {'MARK_BUFFER': 'false'},
+        'buffered': {'MARK_BUFFER': 'true', 'MARK_FLUSH_BATCH': str(args.batch),
+                     'MARK_FLUSH_INTERVAL': str(args.interval)},
+    }
+    results, ok = {}, True
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, settings in configs.items():
+            env = dict(os.environ, DB_BACKEND='sqlite', SQLITE_PATH=os.path.join(tmp, f'{name}.db'),
+                       MARK_JOURNAL_PATH=os.path.join(tmp, f'{name}-journal.db'),
+                       PAGE_CACHE_TTL='0', HASH_POOL_WORKERS='0', RATE_LIMITS='', SHED_POOL_WAIT_MS='0',
+                       **settings)
+            command = [sys.executable, os.path.abspath(__file__), '--worker',
+                       '--concurrency', str(args.concurrency), '--duration', str(args.duration),
+                       '--commit-ms', str(args.commit_ms)]
+            print(f'Running {name}...', flush=True)
+            proc = subprocess.run(command, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'exit {proc.returncode}'
+                print(f'  {name} failed: {error}')
+                ok = False
+                continue
+            results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"\n{'config':<10}{'marks/s':>10}{'marks':>8}{'commits':>9}{'per mark':>10}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'drain s':>9}")
+    for name, stats in results.items():
+        print(f"{name:<10}{stats['marks_per_second']:>10}{stats['marks']:>8}{stats['commits']:>9}"
+              f"{stats['commits_per_mark']:>10}{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+              f"{stats['drain_s']:>9}")
+        if stats['records'] != stats['marks'] or stats['failed']:
+            print(f"  {name}: {stats['marks']} marks acknowledged but {stats['records']} recorded, "
+                  f"{stats['failed']} failed requests")
+            ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
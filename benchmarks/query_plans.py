@@ -0,0 +1,370 @@
+"""Query-plan regression guard.
+
+Loads a scaled dataset, drives every route and maintenance command through Flask's
+test client and CLI runner, captures each distinct SQL statement the app issues, and
+runs EXPLAIN on it. Exits non-zero when a statement served to users does any of:
+
+    - a full table scan (or full index scan) over more than --max-rows rows
+    - a filesort or temporary table (MySQL), or a temp B-tree (SQLite), on top of such a scan
+
+SQLite plans carry no row estimates, so a scan's size is the table's row count, and a
+temp B-tree is only reported when the same plan scans a large table.
+Maintenance commands (rebuilds, reports and archiving) read whole tables by design.
+Their plans are printed but they never fail the run. The admin report served over HTTP
+and the purge job are checked like any other route.
+
+    python benchmarks/query_plans.py                          # SQLite in a temp file
+    python benchmarks/query_plans.py --backend mysql          # database from .env (scratch!)
+    python benchmarks/query_plans.py --users 5000 --max-rows 500 --verbose
+"""
+import argparse
+import io
+import os
+import re
+import sys
+import tempfile
+from datetime import date, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PASSWORD = 'bench-password'
+SEMESTER = 'Plan Fall'
+# Seeded users are spread over ten semesters, so a semester filter is as selective as in
+# a database holding several years; the logged-in user's courses are in SEMESTER
+SEMESTERS = [SEMESTER] + [f'Plan Term {n}' for n in range(1, 10)]
+ARCHIVE_SEMESTER = 'Plan Archive'    # one small course, archived by the CLI run
+
+# Labels whose statements are expected to read whole tables
+BATCH_LABELS = {'cli rebuild-counters', 'cli rebuild-series', 'cli attendance-report', 'cli archive-semester',
+}
+
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|SET\b|JOIN\b|LEFT\b|GROUP\b|ORDER\b|LIMIT\b|VALUES\b|SELECT\b)(\w+))?', re.I)
+_SQLITE_SCAN = re.compile(r'^SCAN (\w+)')
+_SKIP = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|ANALYZE|SET)\b', re.I)
+
+
+def seed(conn, users, courses, records, password_hash):
+    # Bulk rows with explicit ids above the current maximum, so it also runs on a used database
+    cur = conn.cursor()
+
+    def next_id(table):
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) as max_id FROM {table}")
+        return cur.fetchone()['max_id'] + 1
+
+    user_base, teacher_base, course_base = next_id('users'), next_id('teachers'), next_id('courses')
+    enrollment_base, record_base = next_id('enrollments'), next_id('attendance_records')
+    tag = f'qp{user_base}'
+    rows = {name: [] for name in ('users', 'teachers', 'courses', 'enrollments', 'counters', 'settings', 'records',
+                                  'series')}
+    for u in range(users):
+        user_id, teacher_id = user_base + u, teacher_base + u
+        rows['users'].append((user_id, f'{tag}_{u}', password_hash, f'Plan User {u}'))
+        rows['teachers'].append((teacher_id, user_id, f'Teacher {u}'))
+        for k in range(courses):
+            n = u * courses + k
+            course_id, enrollment_id = course_base + n, enrollment_base + n
+            rows['courses'].append((course_id, user_id, f'PLAN{k}', f'Plan course {k}', teacher_id,
+                                    SEMESTERS[u % len(SEMESTERS)], records * 2))
+            rows['enrollments'].append((enrollment_id, user_id, course_id))
+            rows['settings'].append((user_id, course_id))
+            present = 0
+            for r in range(records):
+                status = 'present' if (n + r) % 4 else 'absent'
+                present += status == 'present'
+                class_date = date(2025, 1, 1) + timedelta(days=r)
+                rows['records'].append((record_base + n * records + r, enrollment_id, class_date, status))
+                rows['series'].append((enrollment_id, class_date, r + 1, present))
+            rows['counters'].append((enrollment_id, records, present, records - present))
+
+    statements = {
+        'users': "INSERT INTO users (id, username, password_hash, full_name) VALUES (%s, %s, %s, %s)",
+        'teachers': "INSERT INTO teachers (id, user_id, name) VALUES (%s, %s, %s)",
+        'courses': """INSERT INTO courses (id, user_id, course_code, course_name, teacher_id, semester, total_classes)
+                      VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+        'enrollments': "INSERT INTO enrollments (id, user_id, course_id) VALUES (%s, %s, %s)",
+        'counters': """INSERT INTO attendance_counters (enrollment_id, classes_held, present_count, absent_count)
+                       VALUES (%s, %s, %s, %s)""",
+        'settings': "INSERT INTO attendance_settings (user_id, course_id, required_percentage) VALUES (%s, %s, 60.00)",
+        'records': "INSERT INTO attendance_records (id, enrollment_id, class_date, status) VALUES (%s, %s, %s, %s)",
+        'series': "INSERT INTO attendance_series (enrollment_id, class_date, held, present) VALUES (%s, %s, %s, %s)",
+    }
+    for name, sql in statements.items():
+        for i in range(0, len(rows[name]), 5000):
+            cur.executemany(sql, rows[name][i:i + 5000])
+        conn.commit()
+    cur.close()
+    return f'{tag}_0'
+
+
+class Capture:
+    # Collects each distinct statement with the arguments of its first run
+    def __init__(self):
+        self.label = None
+        self.statements = {}
+
+    def add(self, query, args):
+        from flask import has_request_context, request
+        label = request.endpoint if has_request_context() else self.label
+        key = ' '.join(query.split())
+        if key not in self.statements and not _SKIP.match(key):
+            self.statements[key] = (label, query, args)
+
+
+def install_capture(mysql, capture):
+    from instrumentation import InstrumentedConnection, InstrumentedCursor
+
+    class CapturingCursor(InstrumentedCursor):
+        def execute(self, query, args=None):
+            capture.add(query, args)
+            return super().execute(query, args)
+
+        def executemany(self, query, args):
+            args = list(args)
+            if args:
+                capture.add(query, args[0])
+            return super().executemany(query, args)
+
+    class CapturingConnection(InstrumentedConnection):
+        def cursor(self, *args, **kwargs):
+            return CapturingCursor(self._conn.cursor(*args, **kwargs))
+
+    mysql.connection_wrapper = CapturingConnection
+
+
+def exercise(app, capture, username):
+    # Every route and command, with the ids of the seeded user's own rows
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    page = client.get('/dashboard').data.decode()
+    course_ids = sorted({int(i) for i in re.findall(r'/course/(\d+)', page)})
+    course_id, other_course_id = course_ids[0], course_ids[-1]
+    teacher_id = int(re.findall(r'/teacher/(\d+)/edit', client.get('/teachers').data.decode())[0])
+    history = client.get(f'/course/{course_id}').data.decode()
+    record_ids = [int(i) for i in re.findall(r'/attendance/(\d+)/edit', history)]
+    cursor = re.search(r'before=([\w-]+)', history)
+
+    client.get('/')
+    client.get(f"/course/{course_id}?before={cursor.group(1) if cursor else '2100-01-01_1'}")
+    client.get(f'/course/{course_id}?archive=1')
+    client.get(f'/api/courses/{course_id}/trend')
+    client.get('/courses')
+    client.get(f'/course/{course_id}/mark')
+    client.post(f'/course/{course_id}/mark', data={'class_date': '2030-01-01', 'status': 'present', 'notes': ''})
+    client.post(f'/course/{course_id}/mark', data={'class_date': '2030-01-01', 'status': 'present', 'notes': ''})
+    client.post(f'/course/{other_course_id}/quick-mark/absent')
+    client.post('/api/attendance/marks', json={'marks': [
+        {'course_id': course_id, 'class_date': '2030-01-02', 'status': 'present'},
+        {'course_code': 'PLAN1', 'class_date': '2030-01-02', 'status': 'absent'}]})
+    client.post(f'/attendance/{record_ids[0]}/edit', data={'status': 'absent', 'notes': 'plan'})
+    client.post(f'/attendance/{record_ids[1]}/delete')
+    client.get('/attendance/import')
+    client.post('/attendance/import', content_type='multipart/form-data', data={
+        'file': (io.BytesIO(b'course_code,class_date,status\nPLAN0,2030-02-01,present\n'), 'plan.csv')})
+    client.get('/admin/reports/attendance?zone=at-risk').data
+    client.get(f'/admin/reports/attendance?semester={SEMESTER}').data
+    client.get('/course/add')
+    client.post('/teacher/add', data={'name': 'Plan Extra', 'email': '', 'department': ''})
+    client.get('/teacher/add')
+    client.get(f'/teacher/{teacher_id}/edit')
+    client.post(f'/teacher/{teacher_id}/edit', data={'name': 'Plan Teacher', 'email': '', 'department': ''})
+    client.post('/course/add', data={'course_code': 'PLANX', 'course_name': 'Extra', 'teacher_id': teacher_id,
+                                     'semester': SEMESTER, 'total_classes': 10})
+    extra = max(int(i) for i in re.findall(r'/course/(\d+)', client.get('/courses').data.decode()))
+    client.post(f'/course/{extra}/enroll')
+    client.get(f'/course/{extra}/edit')
+    client.post(f'/course/{extra}/edit', data={'course_code': 'PLANX', 'course_name': 'Extra', 'teacher_id': teacher_id,
+                                               'semester': SEMESTER, 'total_classes': 12, 'required_percentage': 70})
+    client.post(f'/teacher/{teacher_id}/delete')
+    client.post(f'/course/{extra}/delete')
+    client.post('/course/add', data={'course_code': 'PLANA', 'course_name': 'Archived', 'teacher_id': teacher_id,
+                                     'semester': ARCHIVE_SEMESTER, 'total_classes': 10})
+    archived = max(int(i) for i in re.findall(r'/course/(\d+)', client.get('/courses').data.decode()))
+    for day in (1, 2):
+        client.post(f'/course/{archived}/mark', data={'class_date': f'2030-04-0{day}', 'status': 'present',
+                                                      'notes': ''})
+
+    # Write-behind marks: the validation read, then the flusher's batch
+    from app import marks_buffer
+    marks_buffer.enabled = True
+    client.post(f'/course/{course_id}/mark', data={'class_date': '2030-03-01', 'status': 'present', 'notes': ''})
+    capture.label = 'mark flusher'
+    marks_buffer.stop()
+    marks_buffer.flush()
+    capture.label = None
+    marks_buffer.enabled = False
+    client.get('/logout')
+    client.post('/register', data={'username': f'{username}_new', 'password': PASSWORD, 'confirm_password': PASSWORD,
+                                   'full_name': 'Plan New', 'email': ''})
+
+    runner = app.test_cli_runner()
+    for command in (['rebuild-counters', '--dry-run'], ['rebuild-series', '--dry-run'], ['attendance-report', '--zone', 'dead'],
+                    ['archive-semester', ARCHIVE_SEMESTER], ['purge-deleted', '--dry-run'], ['purge-deleted']):
+        capture.label = f'cli {command[0]}'
+        result = runner.invoke(args=command)
+        assert result.exit_code == 0, f'{command}: {result.output}{result.exception or ""}'
+    capture.label = None
+
+
+def table_aliases(query, views=None):
+    # Name or alias -> the tables it may stand for. One alias can name different tables
+    # in different subqueries, and a view brings the aliases of its own definition,
+    # which is what SQLite's plan shows once the view is flattened.
+    views = views or {}
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(query):
+        if table in views:
+            inner = table_aliases(views[table], views)
+            for name, tables in inner.items():
+                aliases.setdefault(name, set()).update(tables)
+            tables = set().union(*inner.values())
+        else:
+            tables = {table}
+        for name in (table, alias) if alias else (table,):
+            aliases.setdefault(name, set()).update(tables)
+    return aliases
+
+
+def sqlite_views(conn):
+    return {row['name']: row['sql'] for row in conn.raw.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view'")}
+
+
+def explain_sqlite(conn, query, args, sizes, max_rows):
+    import sqlite_backend
+    sql, _ = sqlite_backend.translate(query, args is not None)
+    plan = conn.raw.execute('EXPLAIN QUERY PLAN ' + sql, tuple(args) if args is not None else ()).fetchall()
+    aliases = table_aliases(query, sqlite_views(conn))
+    lines = [row['detail'] for row in plan]
+    # Scans of derived tables are covered by the steps that produce them
+    derived = {line.split(' ', 1)[1] for line in lines if line.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    issues, large_scan = [], False
+    for line in lines:
+        scan = _SQLITE_SCAN.match(line)
+        if scan and scan.group(1) not in derived and not line.startswith('SCAN (') and 'CONSTANT ROW' not in line:
+            # A name the query does not define is unknown; assume the worst
+            tables = sorted(aliases.get(scan.group(1), ()), key=lambda t: -sizes.get(t, 0))
+            table = tables[0] if tables else max(sizes, key=sizes.get)
+            rows = sizes.get(table, 0)
+            if rows > max_rows:
+                large_scan = True
+                name = ' or '.join(tables) if tables else f'{scan.group(1)}, unknown table, assumed {table}'
+                issues.append(f'full scan of {name} ({rows} rows): {line}')
+    if large_scan:
+        issues += [f'temp B-tree over a large scan: {line}' for line in lines if 'TEMP B-TREE' in line]
+    return lines, issues
+
+
+def explain_mysql(conn, query, args, sizes, max_rows):
+    cur = conn.cursor()
+    cur.execute('EXPLAIN ' + query, args)
+    plan = cur.fetchall()
+    cur.close()
+    lines, issues = [], []
+    for row in plan:
+        extra = row.get('Extra') or ''
+        rows = int(row.get('rows') or 0)
+        lines.append(f"{row.get('table')}: type={row.get('type')} key={row.get('key')} rows={rows} {extra}")
+        if row.get('type') in ('ALL', 'index') and rows > max_rows:
+            kind = 'full scan' if row['type'] == 'ALL' else 'full index scan'
+            issues.append(f"{kind} of {row.get('table')} ({rows} rows)")
+        for flag in ('Using filesort', 'Using temporary'):
+            if flag in extra and rows > max_rows:
+                issues.append(f"{flag.lower()} over {rows} rows of {row.get('table')}")
+    return lines, issues
+
+
+def table_sizes(conn):
+    cur = conn.cursor()
+    sizes = {}
+    for table in ('users', 'teachers', 'courses', 'enrollments', 'attendance_records', 'attendance_archive',
+                  'attendance_counters', 'attendance_series', 'attendance_settings'):
+        cur.execute(f'SELECT COUNT(*) as n FROM {table}')
+        sizes[table] = cur.fetchone()['n']
+    cur.close()
+    return sizes
+
+
+def check_plans(app, users, courses, records, max_rows):
+    # Seed, drive every route and command, and EXPLAIN each captured statement.
+    # Returns the table sizes and (label, statement, plan lines, issues, verdict) per statement;
+    # the verdict is 'ok', 'batch' (issues in a maintenance statement) or 'FAIL'.
+    from app import mysql, passwords
+    backend = app.config['DB_BACKEND']
+    with app.app_context():
+        username = seed(mysql.connection, users, courses, records, passwords.hash(PASSWORD))
+        cur = mysql.connection.cursor()
+        if backend == 'sqlite':
+            cur.execute('ANALYZE')
+        else:
+            cur.execute('ANALYZE TABLE users, teachers, courses, enrollments, attendance_records, '
+                        'attendance_archive, attendance_counters, attendance_series, attendance_settings')
+            cur.fetchall()
+        mysql.connection.commit()
+        cur.close()
+
+    capture = Capture()
+    wrapper = mysql.connection_wrapper
+    install_capture(mysql, capture)
+    app.config['ADMIN_USERNAMES'] = {username}
+    try:
+        exercise(app, capture, username)
+    finally:
+        mysql.connection_wrapper = wrapper
+
+    explain = explain_sqlite if backend == 'sqlite' else explain_mysql
+    results = []
+    with app.app_context():
+        conn = mysql.connection
+        sizes = table_sizes(conn)
+        for key, (label, query, query_args) in sorted(capture.statements.items(), key=lambda s: str(s[1][0])):
+            try:
+                lines, issues = explain(conn, query, query_args, sizes, max_rows)
+            except Exception as e:
+                lines, issues = [], [f'EXPLAIN failed: {e}']
+            finally:
+                conn.rollback()
+            verdict = 'ok' if not issues else 'batch' if label in BATCH_LABELS else 'FAIL'
+            results.append((label, key, lines, issues, verdict))
+    return sizes, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=('sqlite', 'mysql'), default='sqlite')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--courses', type=int, default=5, help='Courses per user')
+    parser.add_argument('--records', type=int, default=20, help='Attendance records per course')
+    parser.add_argument('--max-rows', type=int, default=1000, help='Largest scan or sort allowed')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan, not only failures')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.update(DB_BACKEND=args.backend, SQLITE_PATH=os.path.join(tmp.name, 'plans.db'),
+                      MARK_JOURNAL_PATH=os.path.join(tmp.name, 'marks.db'), PAGE_CACHE_TTL='0', HASH_POOL_WORKERS='0',
+                      RATE_LIMITS='')
+    sys.path.insert(0, ROOT)
+    if args.backend == 'sqlite':
+        import sqlite_backend
+        sqlite_backend.init_schema(os.environ['SQLITE_PATH'])
+    from app import create_app
+    app = create_app()
+
+    print(f'Seeding {args.users} users x {args.courses} courses x {args.records} records...', flush=True)
+    sizes, results = check_plans(app, args.users, args.courses, args.records, args.max_rows)
+    print(f"{len(results)} distinct statements; table sizes: "
+          + ', '.join(f'{t}={n}' for t, n in sizes.items()) + '\n')
+    failures = 0
+    for label, key, lines, issues, verdict in results:
+        failures += verdict == 'FAIL'
+        if verdict != 'ok' or args.verbose:
+            print(f'[{verdict}] {label}: {key[:160]}')
+            for line in (lines if args.verbose else []):
+                print(f'        {line}')
+            for issue in issues:
+                print(f'    !! {issue}')
+
+    print(f'\n{failures} statement(s) with plan regressions.')
+    tmp.cleanup()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
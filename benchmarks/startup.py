@@ -0,0 +1,104 @@
+"""Worker startup time: from `import app` to the first response.
+
+Each run is a fresh Python process (SQLite backend in a temp directory) that times:
+
+    import    importing app.py and everything it pulls in
+    create    create_app()
+    first     the first request, GET /login, which renders login.html and base.html
+    ready     import + create + first: how long a cold worker keeps its first user waiting
+    rest      loading every other template, which later first requests (or serve.py's
+              pre-fork warm-up) pay
+    process   wall time of the whole process, interpreter start and exit included
+
+for two configurations:
+
+    compile   TEMPLATE_CACHE_DIR empty - every template compiled from source
+    cached    TEMPLATE_CACHE_DIR set and filled - compiled templates loaded from disk
+
+Medians over --runs runs are reported; one discarded run per configuration warms the
+OS file cache (and fills the template cache).
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+METRICS = ('import', 'create', 'first', 'ready', 'rest', 'process')
+
+
+def run_worker():
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    response = app.test_client().get('/login')
+    responded = time.perf_counter()
+    if response.status_code != 200:
+        sys.exit(f'GET /login returned {response.status_code}')
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    loaded = time.perf_counter()
+    print(json.dumps({
+        'import': (imported - started) * 1000,
+        'create': (created - imported) * 1000,
+        'first': (responded - created) * 1000,
+        'ready': (responded - started) * 1000,
+        'rest': (loaded - responded) * 1000,
+    }))
+
+
+def run_once(env):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker'],
+                          env=env, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'exit {proc.returncode}'
+        sys.exit(f'Worker failed: {error}')
+    return dict(json.loads(proc.stdout.strip().splitlines()[-1]), process=elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Measured runs per configuration')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker()
+        return
+
+    sys.path.insert(0, ROOT)
+    import sqlite_backend
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_backend.init_schema(os.path.join(tmp, 'startup.db'))
+        configs = {
+            'compile': {'TEMPLATE_CACHE_DIR': ''},
+            'cached': {'TEMPLATE_CACHE_DIR': os.path.join(tmp, 'template-cache')},
+        }
+        for name, settings in configs.items():
+            env = dict(os.environ, DB_BACKEND='sqlite', SQLITE_PATH=os.path.join(tmp, 'startup.db'),
+                       MARK_JOURNAL_PATH=os.path.join(tmp, 'marks.db'), HASH_POOL_WORKERS='0', **settings)
+            print(f'Running {name}...', flush=True)
+            run_once(env)
+            runs = [run_once(env) for _ in range(args.runs)]
+            results[name] = {metric: statistics.median(run[metric] for run in runs) for metric in METRICS}
+
+    print(f"\n{'config':<10}" + ''.join(f'{metric + " ms":>12}' for metric in METRICS))
+    for name, medians in results.items():
+        print(f'{name:<10}' + ''.join(f'{medians[metric]:>12.1f}' for metric in METRICS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+"""Helpers shared by the benchmark scripts.
+
+The scripts run as files (python benchmarks/<name>.py), so this directory is on
+sys.path and they import it as `from stats import percentile`.
+"""
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an ascending list; 0.0 for no samples
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
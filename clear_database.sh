@@ -25,7 +25,10 @@ echo "🗑️  Clearing database..."
 
 sudo mariadb sixtypercent <<EOF
 SET FOREIGN_KEY_CHECKS = 0;
+TRUNCATE TABLE attendance_counters;
+TRUNCATE TABLE attendance_series;
 TRUNCATE TABLE attendance_records;
+TRUNCATE TABLE attendance_archive;
 TRUNCATE TABLE attendance_settings;
 TRUNCATE TABLE enrollments;
 TRUNCATE TABLE courses;
@@ -45,6 +48,9 @@ if [ $? -eq 0 ]; then
         (SELECT COUNT(*) FROM courses) as courses,
         (SELECT COUNT(*) FROM enrollments) as enrollments,
         (SELECT COUNT(*) FROM attendance_records) as attendance_records,
+        (SELECT COUNT(*) FROM attendance_archive) as attendance_archive,
+        (SELECT COUNT(*) FROM attendance_counters) as attendance_counters,
+        (SELECT COUNT(*) FROM attendance_series) as attendance_series,
         (SELECT COUNT(*) FROM attendance_settings) as attendance_settings;
     "
     echo ""
@@ -0,0 +1,179 @@
+# Attendance counters
+# attendance_counters holds classes_held/present_count/absent_count per enrollment so
+# read paths never aggregate attendance_records. Every write to attendance_records must
+# adjust the counters with the same cursor, before the commit, so both change together.
+# Counters cover archived records too (attendance_archive), which never change.
+#
+# attendance_series holds one row per enrollment and class date with the running totals
+# of classes held and attended up to that date, for the trend endpoint. Writes keep it
+# in step the same way: a mark, edit or delete on date D only touches the series rows
+# on or after D, which for the usual case (marking the newest class) is the single new
+# row. Batch writes recompute each touched enrollment's suffix with a window function.
+
+# Every record, live or archived, for rebuilding and checking the counters and series
+ALL_RECORDS_SQL = """(
+    SELECT id, enrollment_id, class_date, status FROM attendance_records
+    UNION ALL
+    SELECT id, enrollment_id, class_date, status FROM attendance_archive
+)"""
+
+COUNTERS_REBUILD_SQL = f"""
+    INSERT INTO attendance_counters (enrollment_id, classes_held, present_count, absent_count)
+    SELECT e.id,
+        COUNT(ar.id),
+        COALESCE(SUM(CASE WHEN ar.status = 'present' THEN 1 ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN ar.status = 'absent' THEN 1 ELSE 0 END), 0)
+    FROM enrollments e
+    LEFT JOIN {ALL_RECORDS_SQL} ar ON e.id = ar.enrollment_id
+    GROUP BY e.id
+    ON DUPLICATE KEY UPDATE
+        classes_held = VALUES(classes_held),
+        present_count = VALUES(present_count),
+        absent_count = VALUES(absent_count)
+"""
+
+ADJUST_SQL = """
+    INSERT INTO attendance_counters (enrollment_id, classes_held, present_count, absent_count)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        classes_held = classes_held + VALUES(classes_held),
+        present_count = present_count + VALUES(present_count),
+        absent_count = absent_count + VALUES(absent_count)
+"""
+
+# Trend series: running totals per enrollment and class date, from every record
+SERIES_REBUILD_SQL = f"""
+    INSERT INTO attendance_series (enrollment_id, class_date, held, present)
+    SELECT enrollment_id, class_date,
+        COUNT(*) OVER w,
+        SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END) OVER w
+    FROM {ALL_RECORDS_SQL} ar
+    WINDOW w AS (PARTITION BY enrollment_id ORDER BY class_date ROWS UNBOUNDED PRECEDING)
+"""
+
+SHIFT_SQL = """
+    UPDATE attendance_series
+    SET held = held + %s, present = present + %s
+    WHERE enrollment_id = %s AND class_date > %s
+"""
+
+
+def _present(status):
+    return 1 if status == 'present' else 0
+
+
+def series_append(cur, enrollment_id, class_date, status):
+    # A new record on class_date: later points gain one class, then the point itself
+    # continues from the latest earlier point (totals only grow, so MAX is that point)
+    cur.execute(SHIFT_SQL, (1, _present(status), enrollment_id, class_date))
+    cur.execute("""
+        INSERT INTO attendance_series (enrollment_id, class_date, held, present)
+        SELECT %s, %s, COALESCE(MAX(held), 0) + 1, COALESCE(MAX(present), 0) + %s
+        FROM attendance_series
+        WHERE enrollment_id = %s AND class_date < %s
+    """, (enrollment_id, class_date, _present(status), enrollment_id, class_date))
+
+
+def series_remove(cur, enrollment_id, class_date, status):
+    cur.execute("DELETE FROM attendance_series WHERE enrollment_id = %s AND class_date = %s",
+                (enrollment_id, class_date))
+    cur.execute(SHIFT_SQL, (-1, -_present(status), enrollment_id, class_date))
+
+
+def series_change(cur, enrollment_id, class_date, old_status, new_status):
+    change = _present(new_status) - _present(old_status)
+    if change:
+        cur.execute("""
+            UPDATE attendance_series SET present = present + %s
+            WHERE enrollment_id = %s AND class_date >= %s
+        """, (change, enrollment_id, class_date))
+
+
+def refresh_series(cur, earliest):
+    # earliest: {enrollment_id: first class_date written}. Recomputes each enrollment's
+    # series from that date on with a window over its live records.
+    for enrollment_id, class_date in earliest.items():
+        cur.execute("DELETE FROM attendance_series WHERE enrollment_id = %s AND class_date >= %s",
+                    (enrollment_id, class_date))
+        cur.execute("""
+            INSERT INTO attendance_series (enrollment_id, class_date, held, present)
+            SELECT enrollment_id, class_date, held, present FROM (
+                SELECT enrollment_id, class_date,
+                    COUNT(*) OVER w as held,
+                    SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END) OVER w as present
+                FROM attendance_records
+                WHERE enrollment_id = %s
+                WINDOW w AS (ORDER BY class_date ROWS UNBOUNDED PRECEDING)
+            ) running
+            WHERE class_date >= %s
+        """, (enrollment_id, class_date))
+
+
+def counter_delta(status, sign=1):
+    # (held, present, absent) change caused by adding (sign=1) or removing (sign=-1) one record
+    return (sign, sign if status == 'present' else 0, sign if status == 'absent' else 0)
+
+
+def adjust_counters(cur, enrollment_id, held=0, present=0, absent=0):
+    cur.execute(ADJUST_SQL, (enrollment_id, held, present, absent))
+
+
+def adjust_counters_many(cur, deltas):
+    # deltas: {enrollment_id: [held, present, absent]} - applied as one multi-row upsert
+    rows = [(enrollment_id, *delta) for enrollment_id, delta in deltas.items() if any(delta)]
+    if rows:
+        cur.executemany(ADJUST_SQL, rows)
+
+
+# Outcomes of record_mark()
+MARKED, DUPLICATE, FULL, NOT_ENROLLED, ARCHIVED = 'marked', 'duplicate', 'full', 'not_enrolled', 'archived'
+
+
+def record_mark(cur, user_id, course_id, class_date, status, notes):
+    # Race-free insert of one attendance record that enforces total_classes in the database.
+    # 1. A conditional UPDATE bumps the counters only while classes_held < total_classes.
+    #    It holds the counter row lock until commit, so concurrent marks for the same
+    #    enrollment serialise here and the cap can never be exceeded. Archived courses
+    #    (closed semesters) and deleted courses take no new marks.
+    # 2. The record is inserted through the enrollment lookup; a duplicate date
+    #    (unique_attendance) inserts nothing.
+    # On MARKED the caller commits; on any other outcome it must roll back so the
+    # counter bump is undone. A DUPLICATE means the mark already exists (idempotent);
+    # when the UPDATE matches nothing, an existing mark for the date is still reported
+    # as DUPLICATE rather than FULL, so retrying the last mark of a course is harmless.
+    held, present, absent = counter_delta(status)
+    cur.execute("""
+        UPDATE attendance_counters
+        SET classes_held = classes_held + %s,
+            present_count = present_count + %s,
+            absent_count = absent_count + %s
+        WHERE enrollment_id = (SELECT id FROM enrollments WHERE user_id = %s AND course_id = %s)
+        AND classes_held < (SELECT total_classes FROM courses
+                            WHERE id = %s AND archived_at IS NULL AND deleted_at IS NULL)
+    """, (held, present, absent, user_id, course_id, course_id))
+    if cur.rowcount == 0:
+        cur.execute("""
+            SELECT c.archived_at,
+                EXISTS(SELECT 1 FROM attendance_records ar
+                       WHERE ar.enrollment_id = e.id AND ar.class_date = %s) as marked
+            FROM enrollments e
+            JOIN courses c ON e.course_id = c.id
+            WHERE e.user_id = %s AND e.course_id = %s AND c.deleted_at IS NULL
+        """, (class_date, user_id, course_id))
+        enrollment = cur.fetchone()
+        if not enrollment:
+            return NOT_ENROLLED
+        if enrollment['archived_at']:
+            return ARCHIVED
+        return DUPLICATE if enrollment['marked'] else FULL
+
+    cur.execute("""
+        INSERT INTO attendance_records (enrollment_id, class_date, status, notes)
+        SELECT id, %s, %s, %s FROM enrollments WHERE user_id = %s AND course_id = %s
+        ON DUPLICATE KEY UPDATE id = id
+    """, (class_date, status, notes, user_id, course_id))
+    if cur.rowcount != 1:
+        return DUPLICATE
+    cur.execute("SELECT enrollment_id FROM attendance_records WHERE id = %s", (cur.lastrowid,))
+    series_append(cur, cur.fetchone()['enrollment_id'], class_date, status)
+    return MARKED
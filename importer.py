@@ -0,0 +1,243 @@
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+from counters import counter_delta, adjust_counters_many, refresh_series
+
+# Bulk attendance import
+# Rows are read lazily from a text stream (CSV with a header row, or JSON Lines), so
+# memory use depends on the batch size rather than the file size. Each batch is
+# validated with one enrollment query and one duplicate query, then written with a
+# multi-row INSERT and a multi-row counter upsert inside its own transaction.
+#
+# Accepted fields per row: course_id or course_code, class_date (YYYY-MM-DD),
+# status (present/absent) and optional notes.
+
+FORMATS = ('csv', 'jsonl')
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []   # (line number, message), capped at MAX_REPORTED_ERRORS
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f'{self.rows} rows read, {self.inserted} inserted, {self.failed} rejected '
+                f'in {self.elapsed:.2f}s ({self.rows_per_second:.0f} rows/s)')
+
+
+def detect_format(filename, default='csv'):
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+# Yield (line number, raw dict or error message) without reading ahead of the consumer
+def iter_rows(stream, fmt):
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, f'Invalid JSON: {e}'
+                continue
+            if not isinstance(row, dict):
+                yield line_num, 'Expected a JSON object'
+                continue
+            yield line_num, row
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+# Normalise one raw row; returns (parsed dict, None) or (None, error message)
+def parse_row(row):
+    if isinstance(row, str):
+        return None, row
+
+    course_id = row.get('course_id')
+    course_code = (row.get('course_code') or '').strip()
+    if course_id not in (None, ''):
+        try:
+            course_id = int(course_id)
+        except (TypeError, ValueError):
+            return None, f'Invalid course_id: {course_id!r}'
+    elif course_code:
+        course_id = None
+    else:
+        return None, 'Missing course_id or course_code'
+
+    class_date = row.get('class_date')
+    try:
+        class_date = datetime.strptime(str(class_date).strip(), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None, f'Invalid class_date: {class_date!r} (expected YYYY-MM-DD)'
+
+    status = str(row.get('status') or '').strip().lower()
+    if status not in ('present', 'absent'):
+        return None, f'Invalid status: {row.get("status")!r}'
+
+    notes = str(row.get('notes') or '')
+    if len(notes) > 255:
+        return None, 'Notes longer than 255 characters'
+
+    return {'course_id': course_id, 'course_code': course_code, 'class_date': class_date,
+            'status': status, 'notes': notes}, None
+
+
+def import_attendance(conn, user_id, stream, fmt='csv', batch_size=1000):
+    report = ImportReport()
+    rows = iter_rows(stream, fmt)
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        report.rows += len(batch)
+
+        parsed = []
+        for line, raw in batch:
+            record, error = parse_row(raw)
+            if error:
+                report.error(line, error)
+            else:
+                parsed.append((line, record))
+
+        if parsed:
+            _import_batch(conn, user_id, parsed, report)
+
+    return report.finish()
+
+
+def _import_batch(conn, user_id, parsed, report):
+    cur = conn.cursor()
+    try:
+        values, deltas, rejected, _ = plan_marks(cur, user_id, parsed)
+        write_marks(cur, values, deltas)
+        conn.commit()
+        report.inserted += len(values)
+        for line, message in rejected:
+            report.error(line, message)
+    except Exception as e:
+        conn.rollback()
+        first_line = parsed[0][0]
+        for line, _ in parsed:
+            report.error(line, f'Batch starting at line {first_line} failed: {e}')
+    finally:
+        cur.close()
+
+
+# Validate a batch of parsed marks with set-based queries.
+# parsed is a list of (key, record) where key identifies the row in error messages.
+# Locks the user's matching enrollments/counters until the caller commits, so the
+# total_classes cap holds against concurrent writers.
+# Returns (insert values, counter deltas, [(key, error)], enrollment rows).
+def plan_marks(cur, user_id, parsed):
+    course_ids = sorted({r['course_id'] for _, r in parsed if r['course_id'] is not None})
+    course_codes = sorted({r['course_code'] for _, r in parsed if r['course_id'] is None})
+    conditions, args = [], [user_id]
+    if course_ids:
+        conditions.append(f"c.id IN ({', '.join(['%s'] * len(course_ids))})")
+        args.extend(course_ids)
+    if course_codes:
+        conditions.append(f"c.course_code IN ({', '.join(['%s'] * len(course_codes))})")
+        args.extend(course_codes)
+    cur.execute(f"""
+        SELECT e.id as enrollment_id, c.id as course_id, c.course_code, c.total_classes, c.archived_at,
+            COALESCE(ac.classes_held, 0) as classes_held,
+            COALESCE(ac.present_count, 0) as present_count,
+            COALESCE(ac.absent_count, 0) as absent_count,
+            COALESCE(ats.required_percentage, 60.00) as required_percentage
+        FROM enrollments e
+        JOIN courses c ON e.course_id = c.id
+        LEFT JOIN attendance_counters ac ON ac.enrollment_id = e.id
+        LEFT JOIN attendance_settings ats ON ats.course_id = c.id AND ats.user_id = e.user_id
+        WHERE e.user_id = %s AND c.deleted_at IS NULL AND ({' OR '.join(conditions)})
+        FOR UPDATE
+    """, args)
+    enrollments = cur.fetchall()
+    by_id = {e['course_id']: e for e in enrollments}
+    by_code = {e['course_code']: e for e in enrollments}
+
+    # Dates already recorded for these enrollments within the batch's date range
+    existing = set()
+    if enrollments:
+        dates = [r['class_date'] for _, r in parsed]
+        enrollment_ids = [e['enrollment_id'] for e in enrollments]
+        cur.execute(f"""
+            SELECT enrollment_id, class_date FROM attendance_records
+            WHERE enrollment_id IN ({', '.join(['%s'] * len(enrollment_ids))})
+            AND class_date BETWEEN %s AND %s
+        """, (*enrollment_ids, min(dates), max(dates)))
+        existing = {(r['enrollment_id'], r['class_date']) for r in cur.fetchall()}
+
+    held = {e['enrollment_id']: e['classes_held'] for e in enrollments}
+    values, deltas, rejected = [], {}, []
+    for key, r in parsed:
+        enrollment = by_id.get(r['course_id']) if r['course_id'] is not None else by_code.get(r['course_code'])
+        if not enrollment:
+            rejected.append((key, f"Not enrolled in course {r['course_id'] or r['course_code']}"))
+            continue
+
+        enrollment_id = enrollment['enrollment_id']
+        if enrollment['archived_at']:
+            rejected.append((key, f"{enrollment['course_code']} belongs to an archived semester"))
+            continue
+        if (enrollment_id, r['class_date']) in existing:
+            rejected.append((key, f"Attendance for {r['class_date']} already recorded"))
+            continue
+        if held[enrollment_id] >= enrollment['total_classes']:
+            rejected.append((key, f"{enrollment['course_code']} already has all {enrollment['total_classes']} classes marked"))
+            continue
+
+        existing.add((enrollment_id, r['class_date']))
+        held[enrollment_id] += 1
+        values.append((enrollment_id, r['class_date'], r['status'], r['notes']))
+        delta = deltas.setdefault(enrollment_id, [0, 0, 0])
+        for i, change in enumerate(counter_delta(r['status'])):
+            delta[i] += change
+
+    return values, deltas, rejected, enrollments
+
+
+# Multi-row insert of planned marks plus the matching counter upsert and series refresh
+def write_marks(cur, values, deltas):
+    if not values:
+        return
+    cur.executemany("""
+        INSERT INTO attendance_records (enrollment_id, class_date, status, notes)
+        VALUES (%s, %s, %s, %s)
+    """, values)
+    adjust_counters_many(cur, deltas)
+    earliest = {}
+    for enrollment_id, class_date, _, _ in values:
+        if enrollment_id not in earliest or class_date < earliest[enrollment_id]:
+            earliest[enrollment_id] = class_date
+    refresh_series(cur, earliest)
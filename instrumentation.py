@@ -0,0 +1,258 @@
+import ipaddress
+import threading
+import time
+
+from flask import Response, abort, before_render_template, g, has_app_context, request, template_rendered
+
+# Per-request instrumentation
+# Records, per endpoint, the number of queries, time spent in the database, time spent
+# rendering templates and total latency, and serves them at /metrics in the Prometheus
+# text format. Metrics are kept per worker process; scrape every worker (or put the
+# workers behind separate ports) when running several.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class InstrumentedCursor:
+    # Times every statement and fetch on the wrapped cursor
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            record_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, args):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            record_query(query, time.perf_counter() - start)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed(self._cursor.fetchmany, size) if size is not None else self._timed(self._cursor.fetchmany)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            _record_db_time(time.perf_counter() - start)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            _record_db_time(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _request_stats():
+    return g.get('request_stats') if has_app_context() else None
+
+
+# Count one statement against the current request (also used by the async handlers)
+def record_query(query, seconds):
+    stats = _request_stats()
+    if stats is None:
+        return
+    stats['queries'] += 1
+    stats['db_seconds'] += seconds
+    if stats['statements'] is not None:
+        stats['statements'].append((' '.join(query.split()), seconds))
+
+
+def _record_db_time(seconds):
+    stats = _request_stats()
+    if stats is not None:
+        stats['db_seconds'] += seconds
+
+
+class Instrumentation:
+    def __init__(self, app=None, mysql=None):
+        self._lock = threading.Lock()
+        self._endpoints = {}   # endpoint -> dict of histograms
+        self._responses = {}   # (endpoint, status) -> count
+        self._collectors = []  # callables returning extra metric lines
+        self.mysql = mysql
+        if app is not None:
+            self.init_app(app, mysql)
+
+    def init_app(self, app, mysql):
+        self.app = app
+        self.mysql = mysql
+        app.config.setdefault('SLOW_REQUEST_MS', 0)
+        app.config.setdefault('METRICS_TOKEN', '')
+        mysql.connection_wrapper = InstrumentedConnection
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def _before_request(self):
+        g.request_stats = {
+            'started': time.perf_counter(),
+            'queries': 0,
+            'db_seconds': 0.0,
+            'render_seconds': 0.0,
+            'render_started': None,
+            'statements': [] if self.app.config['SLOW_REQUEST_MS'] else None,
+        }
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = _request_stats()
+        if stats is not None:
+            stats['render_started'] = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = _request_stats()
+        if stats is not None and stats['render_started'] is not None:
+            stats['render_seconds'] += time.perf_counter() - stats['render_started']
+            stats['render_started'] = None
+
+    def _after_request(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None or request.endpoint == 'metrics':
+            return response
+
+        endpoint = request.endpoint or 'unknown'
+        total = time.perf_counter() - stats['started']
+        with self._lock:
+            histograms = self._endpoints.get(endpoint)
+            if histograms is None:
+                histograms = self._endpoints[endpoint] = {
+                    'duration': Histogram(LATENCY_BUCKETS),
+                    'db': Histogram(LATENCY_BUCKETS),
+                    'render': Histogram(LATENCY_BUCKETS),
+                    'queries': Histogram(QUERY_BUCKETS),
+                }
+            histograms['duration'].observe(total)
+            histograms['db'].observe(stats['db_seconds'])
+            histograms['render'].observe(stats['render_seconds'])
+            histograms['queries'].observe(stats['queries'])
+            key = (endpoint, response.status_code)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+        slow_ms = self.app.config['SLOW_REQUEST_MS']
+        if slow_ms and total * 1000 >= slow_ms:
+            lines = [f'Slow request {request.method} {request.full_path} ({endpoint}) {total * 1000:.1f}ms: '
+                     f"{stats['queries']} queries, db {stats['db_seconds'] * 1000:.1f}ms, "
+                     f"render {stats['render_seconds'] * 1000:.1f}ms"]
+            lines += [f'  {seconds * 1000:8.2f}ms  {sql[:500]}' for sql, seconds in stats['statements']]
+            self.app.logger.warning('\n'.join(lines))
+        return response
+
+    # /metrics - Prometheus text format.
+    # With METRICS_TOKEN set, requires "Authorization: Bearer <token>"; otherwise only
+    # loopback clients may scrape.
+    def metrics_view(self):
+        token = self.app.config['METRICS_TOKEN']
+        if token:
+            if request.headers.get('Authorization') != f'Bearer {token}':
+                abort(403)
+        elif not ipaddress.ip_address(request.remote_addr or '0.0.0.0').is_loopback:
+            abort(403)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def render(self):
+        lines = []
+        with self._lock:
+            families = (
+                ('duration', 'sixtypercent_request_duration_seconds', 'Total request latency'),
+                ('db', 'sixtypercent_request_db_seconds', 'Time spent in database calls per request'),
+                ('render', 'sixtypercent_request_render_seconds', 'Time spent rendering templates per request'),
+                ('queries', 'sixtypercent_request_queries', 'SQL statements issued per request'),
+            )
+            for key, name, help_text in families:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for endpoint, histograms in sorted(self._endpoints.items()):
+                    lines.extend(_histogram_lines(name, {'endpoint': endpoint}, histograms[key]))
+
+            lines.append('# HELP sixtypercent_responses_total Responses by endpoint and status')
+            lines.append('# TYPE sixtypercent_responses_total counter')
+            for (endpoint, status), count in sorted(self._responses.items()):
+                lines.append(f'sixtypercent_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+        if self.mysql is not None:
+            pool = self.mysql.pool.stats()
+            for key, kind in (('size', 'gauge'), ('idle', 'gauge'), ('in_use', 'gauge'), ('max_size', 'gauge'),
+                              ('created', 'counter'), ('closed', 'counter'), ('recycled', 'counter'),
+                              ('ping_failures', 'counter'), ('waits', 'counter'), ('timeouts', 'counter'),
+                              ('wait_seconds_total', 'counter'), ('wait_seconds_max', 'gauge'),
+                              ('waiting', 'gauge'), ('oldest_wait_seconds', 'gauge')):
+                name = f'sixtypercent_db_pool_{key}'
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {pool[key]}')
+
+            if self.mysql.app.config.get('MYSQL_REPLICAS'):
+                lines.append('# TYPE sixtypercent_db_replica_healthy gauge')
+                lines.extend(f'sixtypercent_db_replica_healthy{{replica="{replica.name}"}} {int(replica.healthy)}'
+                             for replica in self.mysql.replicas)
+                lines.append('# TYPE sixtypercent_db_replica_lag_seconds gauge')
+                lines.extend(f'sixtypercent_db_replica_lag_seconds{{replica="{replica.name}"}} {replica.lag}'
+                             for replica in self.mysql.replicas if replica.lag is not None)
+
+        for collect in self._collectors:
+            lines.extend(collect())
+        return '\n'.join(lines) + '\n'
+
+    # Add metrics from another extension: collect() returns Prometheus text lines
+    def add_collector(self, collect):
+        if collect not in self._collectors:
+            self._collectors.append(collect)
+
+
+def _histogram_lines(name, labels, histogram):
+    label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+    lines = []
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {count}')
+    lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{label_text}}} {histogram.sum}')
+    lines.append(f'{name}_count{{{label_text}}} {histogram.count}')
+    return lines
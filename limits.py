@@ -0,0 +1,143 @@
+import math
+import threading
+import time
+
+from flask import request, session
+
+from cache import TTLCache
+
+# Load shedding in front of the database
+# Nothing stopped one client from hitting the marking routes or /dashboard as fast as
+# it liked, so a buggy script or a refresh storm could take every pooled connection.
+# Two checks run before each request, in every worker process:
+#
+# - Per-client budgets: each endpoint in RATE_LIMITS gets a token bucket per logged-in
+#   user (per client IP when logged out) refilling at `rate` requests per second up to
+#   `burst`. Every request also draws from a bucket of its IP address, which holds
+#   RATE_LIMIT_IP_FACTOR times the budget, so neither logging in as many users from one
+#   address nor spreading one user over many addresses gets around the limit. An empty
+#   bucket answers 429 with Retry-After; other clients are unaffected.
+# - Global: once a request in this process has waited SHED_POOL_WAIT_MS for a database
+#   connection, new requests get a 503 straight away instead of joining the queue,
+#   until the queue drains.
+#
+# Budgets are per process, so a client can get up to SERVER_WORKERS times the budget.
+
+# Endpoints never shed
+EXEMPT = {'static', 'metrics', 'health'}
+
+
+class RateLimited(Exception):
+    """Raised when a client has used up its budget for an endpoint."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Rate limit exceeded, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """Raised when requests are already queueing too long for a database connection."""
+
+
+def parse_budgets(text):
+    # "dashboard=2:20,quick_mark_attendance=1:10" -> {endpoint: (per second, burst)}
+    budgets = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        endpoint, _, budget = item.partition('=')
+        rate, _, burst = budget.partition(':')
+        rate = float(rate)
+        budgets[endpoint.strip()] = (rate, float(burst) if burst else max(rate, 1.0))
+    return budgets
+
+
+class Limiter:
+    def __init__(self, app=None, mysql=None):
+        self._lock = threading.Lock()
+        self._shed = {}    # (endpoint, reason) -> count
+        self._buckets = None
+        if app is not None:
+            self.init_app(app, mysql)
+
+    def init_app(self, app, mysql):
+        self.app = app
+        self.mysql = mysql
+        app.config.setdefault('RATE_LIMITS', '')
+        app.config.setdefault('RATE_LIMIT_KEYS', 10000)
+        app.config.setdefault('RATE_LIMIT_IP_FACTOR', 10)
+        app.config.setdefault('SHED_POOL_WAIT_MS', 0)
+        app.config.setdefault('TRUSTED_PROXIES', 0)
+        budgets = app.config['RATE_LIMITS']
+        self.budgets = parse_budgets(budgets) if isinstance(budgets, str) else dict(budgets)
+        self.ip_factor = float(app.config['RATE_LIMIT_IP_FACTOR'])
+        self.max_wait = float(app.config['SHED_POOL_WAIT_MS']) / 1000
+        self.proxies = int(app.config['TRUSTED_PROXIES'])
+        # (endpoint, client) -> (tokens, updated); a bucket left alone long enough to
+        # refill completely expires, which is the same as a full one
+        refill = max((burst / rate for rate, burst in self.budgets.values() if rate > 0), default=0)
+        self._buckets = TTLCache(maxsize=int(app.config['RATE_LIMIT_KEYS']), ttl=math.ceil(refill) + 1)
+        app.before_request(self._before_request)
+
+    def client_ip(self):
+        # With TRUSTED_PROXIES in front, the address the outermost trusted one saw
+        if self.proxies:
+            route = [address.strip() for address in request.headers.get('X-Forwarded-For', '').split(',')
+                     if address.strip()]
+            if len(route) >= self.proxies:
+                return route[-self.proxies]
+        return request.remote_addr
+
+    def take(self, endpoint, clients):
+        # Spend one token from each client's bucket, or none if any of them is empty.
+        # clients: [(key, budget multiple)]. Returns 0, or the seconds until every
+        # bucket has a token again.
+        rate, burst = self.budgets[endpoint]
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            for client, factor in clients:
+                tokens, updated = self._buckets.get((endpoint, client), (burst * factor, now))
+                buckets.append((client, factor, min(burst * factor, tokens + (now - updated) * rate * factor)))
+            spend = 1 if all(tokens >= 1 for _, _, tokens in buckets) else 0
+            for client, _, tokens in buckets:
+                self._buckets.set((endpoint, client), (tokens - spend, now))
+        if spend:
+            return 0
+        if rate <= 0:
+            return 60
+        return max((1 - tokens) / (rate * factor) for _, factor, tokens in buckets if tokens < 1)
+
+    def _before_request(self):
+        endpoint = request.endpoint
+        if endpoint is None or endpoint in EXEMPT:
+            return
+        if endpoint in self.budgets:
+            user_id = session.get('user_id')
+            ip = self.client_ip()
+            clients = [(f'user:{user_id}' if user_id else f'anonymous:{ip}', 1)]
+            if self.ip_factor:
+                clients.append((f'ip:{ip}', self.ip_factor))
+            wait = self.take(endpoint, clients)
+            if wait:
+                self._count(endpoint, 'rate_limited')
+                raise RateLimited(max(1, math.ceil(wait)))
+        if self.max_wait and self.mysql.pool_wait() >= self.max_wait:
+            self._count(endpoint, 'overloaded')
+            raise Overloaded(f'Requests waited over {self.max_wait}s for a database connection')
+
+    def _count(self, endpoint, reason):
+        with self._lock:
+            self._shed[(endpoint, reason)] = self._shed.get((endpoint, reason), 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._shed)
+
+    # For Instrumentation.add_collector
+    def metric_lines(self):
+        lines = ['# HELP sixtypercent_shed_requests_total Requests turned away before reaching the database',
+                 '# TYPE sixtypercent_shed_requests_total counter']
+        lines.extend(f'sixtypercent_shed_requests_total{{endpoint="{endpoint}",reason="{reason}"}} {count}'
+                     for (endpoint, reason), count in sorted(self.stats().items()))
+        return lines
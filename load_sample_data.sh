@@ -100,6 +100,27 @@ INSERT INTO attendance_records (enrollment_id, class_date, status, notes) VALUES
 (5, '2025-10-08', 'present', 'Macbeth'),
 (5, '2025-10-10', 'present', 'Poetry analysis');
 
+-- Build attendance counters for the sample enrollments
+INSERT INTO attendance_counters (enrollment_id, classes_held, present_count, absent_count)
+SELECT e.id,
+    COUNT(ar.id),
+    COALESCE(SUM(CASE WHEN ar.status = 'present' THEN 1 ELSE 0 END), 0),
+    COALESCE(SUM(CASE WHEN ar.status = 'absent' THEN 1 ELSE 0 END), 0)
+FROM enrollments e
+LEFT JOIN attendance_records ar ON e.id = ar.enrollment_id
+WHERE e.user_id = @user_id
+GROUP BY e.id;
+
+-- Build the running-total series read by the trend API (as `flask rebuild-series`)
+INSERT INTO attendance_series (enrollment_id, class_date, held, present)
+SELECT ar.enrollment_id, ar.class_date,
+    COUNT(*) OVER w,
+    SUM(CASE WHEN ar.status = 'present' THEN 1 ELSE 0 END) OVER w
+FROM attendance_records ar
+JOIN enrollments e ON e.id = ar.enrollment_id
+WHERE e.user_id = @user_id
+WINDOW w AS (PARTITION BY ar.enrollment_id ORDER BY ar.class_date ROWS UNBOUNDED PRECEDING);
+
 EOF
 
 if [ $? -eq 0 ]; then
@@ -113,6 +134,8 @@ if [ $? -eq 0 ]; then
         (SELECT COUNT(*) FROM courses) as courses,
         (SELECT COUNT(*) FROM enrollments) as enrollments,
         (SELECT COUNT(*) FROM attendance_records) as attendance_records,
+        (SELECT COUNT(*) FROM attendance_counters) as attendance_counters,
+        (SELECT COUNT(*) FROM attendance_series) as attendance_series,
         (SELECT COUNT(*) FROM attendance_settings) as attendance_settings;
     "
     echo ""
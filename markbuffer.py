@@ -0,0 +1,333 @@
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date
+
+from counters import counter_delta, MARKED, DUPLICATE, FULL, NOT_ENROLLED, ARCHIVED
+from importer import write_marks
+
+# Write-behind buffer for attendance marks (MARK_BUFFER=true)
+# At class start thousands of marks arrive within a minute and each one would commit
+# its own transaction. With the buffer on, a mark is validated with one read, appended
+# to a local journal (an SQLite file in WAL mode, fsynced before the mark is
+# acknowledged) and written to the database later by a background flusher, which
+# moves up to MARK_FLUSH_BATCH marks per transaction with multi-row inserts.
+#
+# The journal is shared by every worker process on the server. It rejects duplicate
+# dates and, together with the database counters, enforces total_classes, so pages
+# rendered by any worker include the marks still waiting in it. Only one process
+# flushes at a time (a lock file next to the journal). Marks left in the journal by a
+# crash or restart are flushed by the first worker that starts. The flusher checks
+# every mark again against the database, so replaying a mark that was already
+# written is harmless; marks the database no longer accepts (course deleted or
+# archived meanwhile) are dropped and logged.
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pending_marks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        course_id INTEGER NOT NULL,
+        enrollment_id INTEGER NOT NULL,
+        class_date TEXT NOT NULL,
+        status TEXT NOT NULL,
+        notes TEXT NOT NULL DEFAULT '',
+        UNIQUE (enrollment_id, class_date)
+    );
+    CREATE INDEX IF NOT EXISTS idx_pending_user ON pending_marks (user_id);
+    -- Bumped whenever a user's pending marks change; part of their page ETags
+    CREATE TABLE IF NOT EXISTS pending_versions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL
+    );
+"""
+
+# Everything needed to accept a mark, in one read. Args: (class_date, user_id, course_id)
+ENROLLMENT_SQL = """
+    SELECT e.id as enrollment_id, c.total_classes, c.archived_at,
+        COALESCE(ac.classes_held, 0) as classes_held,
+        (SELECT COUNT(*) FROM attendance_records ar
+         WHERE ar.enrollment_id = e.id AND ar.class_date = %s) as recorded
+    FROM enrollments e
+    JOIN courses c ON e.course_id = c.id
+    LEFT JOIN attendance_counters ac ON ac.enrollment_id = e.id
+    WHERE e.user_id = %s AND e.course_id = %s AND c.deleted_at IS NULL
+"""
+
+BUMP_VERSION_SQL = """
+    INSERT INTO pending_versions (user_id, version) VALUES (?, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+"""
+
+
+class MarkBuffer:
+    def __init__(self, app=None, mysql=None):
+        self._local = threading.local()
+        self._lock = threading.Lock()           # one flush per process at a time
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._flusher = None
+        self._flusher_pid = None
+        self._lock_file = None
+        self._lock_file_pid = None
+        if app is not None:
+            self.init_app(app, mysql)
+
+    def init_app(self, app, mysql):
+        self.app = app
+        self.mysql = mysql
+        app.config.setdefault('MARK_BUFFER', False)
+        app.config.setdefault('MARK_JOURNAL_PATH', 'marks-journal.db')
+        app.config.setdefault('MARK_FLUSH_INTERVAL', 0.5)
+        app.config.setdefault('MARK_FLUSH_BATCH', 500)
+        self.enabled = bool(app.config['MARK_BUFFER'])
+        self.path = app.config['MARK_JOURNAL_PATH']
+        self.interval = float(app.config['MARK_FLUSH_INTERVAL'])
+        self.batch_size = int(app.config['MARK_FLUSH_BATCH'])
+
+    # One journal connection per thread, opened lazily (and again after a fork or
+    # when MARK_JOURNAL_PATH changed)
+    @property
+    def journal(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid() or self._local.path != self.path:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.executescript(JOURNAL_SCHEMA)
+            self._local.conn, self._local.pid, self._local.path = conn, os.getpid(), self.path
+        return conn
+
+    def start(self):
+        # Start the background flusher of this process (no-op when already running).
+        # Called on every use, so the first request after a restart replays the journal.
+        if self._flusher_pid == os.getpid() and self._flusher.is_alive():
+            return
+        with self._start_lock:
+            if self._flusher_pid != os.getpid() or not self._flusher.is_alive():
+                self._stopping.clear()
+                self._flusher = threading.Thread(target=self._run, name='mark-flusher', daemon=True)
+                self._flusher.start()
+                self._flusher_pid = os.getpid()
+
+    def stop(self):
+        # Stop the flusher after one last flush (worker shutdown)
+        if self._flusher_pid == os.getpid() and self._flusher.is_alive():
+            self._stopping.set()
+            self._wake.set()
+            self._flusher.join(timeout=10)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # The database is unavailable; the marks stay in the journal for the next round
+                logger.exception('Flushing buffered attendance marks failed')
+        self.flush()
+
+    def record(self, cur, user_id, course_id, class_date, status, notes):
+        # Validate one mark against the database (cur, read only) and the journal, then
+        # append it. Returns a counters.record_mark() outcome; MARKED once it is durable.
+        if isinstance(class_date, str):
+            class_date = date.fromisoformat(class_date)
+        self.start()
+        journal = self.journal
+        # The journal's write lock is taken before the database read. flush() holds it
+        # from before its database commit until the flushed marks have left the journal,
+        # so the counters and the pending marks read here never miss (or double count)
+        # a mark that is being flushed.
+        journal.execute('BEGIN IMMEDIATE')
+        try:
+            cur.execute(ENROLLMENT_SQL, (class_date, user_id, course_id))
+            enrollment = cur.fetchone()
+            pending = enrollment and journal.execute("""
+                SELECT COUNT(*) as marks, SUM(class_date = ?) as same_date
+                FROM pending_marks WHERE enrollment_id = ?
+            """, (class_date.isoformat(), enrollment['enrollment_id'])).fetchone()
+            if not enrollment:
+                outcome = NOT_ENROLLED
+            elif enrollment['archived_at']:
+                outcome = ARCHIVED
+            elif enrollment['recorded'] or pending['same_date']:
+                outcome = DUPLICATE
+            elif enrollment['classes_held'] + pending['marks'] >= enrollment['total_classes']:
+                outcome = FULL
+            else:
+                journal.execute("""
+                    INSERT INTO pending_marks (user_id, course_id, enrollment_id, class_date, status, notes)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (user_id, course_id, enrollment['enrollment_id'], class_date.isoformat(), status, notes or ''))
+                journal.execute(BUMP_VERSION_SQL, (user_id,))
+                outcome = MARKED
+            journal.execute('COMMIT')
+        except Exception:
+            journal.execute('ROLLBACK')
+            raise
+        # A full batch is waiting: flush now instead of at the next interval
+        if outcome == MARKED and self.batch_size and \
+                journal.execute('SELECT COUNT(*) FROM pending_marks').fetchone()[0] >= self.batch_size:
+            self._wake.set()
+        return outcome
+
+    # Read side: unflushed marks of one user, for the page overlays below
+
+    def version(self, user_id):
+        if not self.enabled:
+            return 0
+        self.start()
+        row = self.journal.execute('SELECT version FROM pending_versions WHERE user_id = ?', (user_id,)).fetchone()
+        return row['version'] if row else 0
+
+    def pending(self, user_id, enrollment_id=None):
+        if not self.enabled:
+            return []
+        query = 'SELECT course_id, enrollment_id, class_date, status, notes FROM pending_marks WHERE user_id = ?'
+        args = [user_id]
+        if enrollment_id is not None:
+            query += ' AND enrollment_id = ?'
+            args.append(enrollment_id)
+        rows = self.journal.execute(query + ' ORDER BY class_date DESC', args).fetchall()
+        return [dict(row, class_date=date.fromisoformat(row['class_date']), id=None, pending=True) for row in rows]
+
+    def stats(self):
+        row = self.journal.execute('SELECT COUNT(*) as marks, COUNT(DISTINCT user_id) as users FROM pending_marks').fetchone()
+        return {'pending_marks': row['marks'], 'pending_users': row['users']}
+
+    # Write side
+
+    def _acquire_flush_lock(self):
+        # Cross-process lock; False when another worker is flushing
+        if self._lock_file is None or self._lock_file_pid != os.getpid() or \
+                self._lock_file.name != self.path + '.lock':
+            self._lock_file = open(self.path + '.lock', 'a')
+            self._lock_file_pid = os.getpid()
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def flush(self):
+        # Write every journalled mark to the database, MARK_FLUSH_BATCH per transaction.
+        # Returns (marks written, marks dropped).
+        written = dropped = 0
+        with self._lock:
+            if not self._acquire_flush_lock():
+                return written, dropped
+            try:
+                while True:
+                    # The journal stays write-locked from before the database commit until
+                    # the batch is forgotten; record() reads both under the same lock. The
+                    # connection is borrowed first: requests waiting for the journal hold
+                    # pooled connections, so borrowing under the lock could deadlock.
+                    with self.app.app_context():
+                        conn = self.mysql.connection
+                        journal = self.journal
+                        journal.execute('BEGIN IMMEDIATE')
+                        try:
+                            rows = journal.execute('SELECT * FROM pending_marks ORDER BY id LIMIT ?',
+                                                   (self.batch_size or -1,)).fetchall()
+                            if rows:
+                                inserted, rejected = self._write(conn, rows)
+                                self._forget(rows)
+                            journal.execute('COMMIT')
+                        except Exception:
+                            journal.execute('ROLLBACK')
+                            raise
+                    if not rows:
+                        break
+                    written += inserted
+                    dropped += len(rejected)
+                    for row, reason in rejected:
+                        logger.warning('Dropped buffered mark of user %s for course %s on %s: %s',
+                                       row['user_id'], row['course_id'], row['class_date'], reason)
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        return written, dropped
+
+    def _write(self, conn, rows):
+        # One transaction: lock the enrollments' counters, skip marks that are already
+        # recorded (a replay) or no longer allowed, then multi-row insert the rest.
+        enrollment_ids = sorted({row['enrollment_id'] for row in rows})
+        placeholders = ', '.join(['%s'] * len(enrollment_ids))
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                SELECT e.id as enrollment_id, c.total_classes, c.archived_at,
+                    COALESCE(ac.classes_held, 0) as classes_held
+                FROM enrollments e
+                JOIN courses c ON e.course_id = c.id
+                LEFT JOIN attendance_counters ac ON ac.enrollment_id = e.id
+                WHERE e.id IN ({placeholders}) AND c.deleted_at IS NULL
+                FOR UPDATE
+            """, enrollment_ids)
+            enrollments = {e['enrollment_id']: e for e in cur.fetchall()}
+            dates = [date.fromisoformat(row['class_date']) for row in rows]
+            cur.execute(f"""
+                SELECT enrollment_id, class_date FROM attendance_records
+                WHERE enrollment_id IN ({placeholders})
+                AND class_date BETWEEN %s AND %s
+            """, (*enrollment_ids, min(dates), max(dates)))
+            existing = {(r['enrollment_id'], r['class_date']) for r in cur.fetchall()}
+
+            held = {enrollment_id: e['classes_held'] for enrollment_id, e in enrollments.items()}
+            values, deltas, rejected, users = [], {}, [], set()
+            for row, class_date in zip(rows, dates):
+                enrollment = enrollments.get(row['enrollment_id'])
+                if not enrollment:
+                    rejected.append((row, 'no longer enrolled'))
+                    continue
+                if (row['enrollment_id'], class_date) in existing:
+                    continue
+                if enrollment['archived_at']:
+                    rejected.append((row, 'semester archived'))
+                    continue
+                if held[row['enrollment_id']] >= enrollment['total_classes']:
+                    rejected.append((row, 'all classes already marked'))
+                    continue
+
+                existing.add((row['enrollment_id'], class_date))
+                held[row['enrollment_id']] += 1
+                values.append((row['enrollment_id'], class_date, row['status'], row['notes']))
+                delta = deltas.setdefault(row['enrollment_id'], [0, 0, 0])
+                for i, change in enumerate(counter_delta(row['status'])):
+                    delta[i] += change
+                users.add(row['user_id'])
+
+            write_marks(cur, values, deltas)
+            if users:
+                cur.execute(f"""
+                    UPDATE users SET data_version = data_version + 1, data_updated_at = CURRENT_TIMESTAMP
+                    WHERE id IN ({', '.join(['%s'] * len(users))})
+                """, sorted(users))
+            conn.commit()
+            return len(values), rejected
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def _forget(self, rows):
+        # Drop flushed marks from the journal (inside flush()'s journal transaction); the
+        # version bump makes pages rendered with them as pending marks stale
+        self.journal.executemany('DELETE FROM pending_marks WHERE id = ?', [(row['id'],) for row in rows])
+        self.journal.executemany(BUMP_VERSION_SQL, [(user_id,) for user_id in {row['user_id'] for row in rows}])
+
+
+def overlay_counters(row, pending):
+    # Copy of a page row whose classes_held/present_count/absent_count include pending marks
+    row = dict(row)
+    for mark in pending:
+        for key, change in zip(('classes_held', 'present_count', 'absent_count'), counter_delta(mark['status'])):
+            if key in row:
+                row[key] += change
+    return row
@@ -0,0 +1,27 @@
+-- Migration 001: per-enrollment attendance counters
+-- Apply to an existing database with:
+--   mysql -u root -p sixtypercent < migrations/001_attendance_counters.sql
+
+CREATE TABLE IF NOT EXISTS attendance_counters (
+    enrollment_id INT PRIMARY KEY,
+    classes_held INT NOT NULL DEFAULT 0,
+    present_count INT NOT NULL DEFAULT 0,
+    absent_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (enrollment_id) REFERENCES enrollments(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Backfill from existing attendance records
+-- (same statement as `flask --app app rebuild-counters`)
+INSERT INTO attendance_counters (enrollment_id, classes_held, present_count, absent_count)
+SELECT e.id,
+    COUNT(ar.id),
+    COALESCE(SUM(CASE WHEN ar.status = 'present' THEN 1 ELSE 0 END), 0),
+    COALESCE(SUM(CASE WHEN ar.status = 'absent' THEN 1 ELSE 0 END), 0)
+FROM enrollments e
+LEFT JOIN attendance_records ar ON e.id = ar.enrollment_id
+GROUP BY e.id
+ON DUPLICATE KEY UPDATE
+    classes_held = VALUES(classes_held),
+    present_count = VALUES(present_count),
+    absent_count = VALUES(absent_count);
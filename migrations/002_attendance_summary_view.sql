@@ -0,0 +1,27 @@
+-- Migration 002: attendance_summary reads attendance_counters
+-- The view no longer aggregates attendance_records, adds username, semester and
+-- total_classes, and reports the percentage over total classes like the dashboard.
+-- Requires migration 001.
+
+CREATE OR REPLACE VIEW attendance_summary AS
+SELECT 
+    u.id as user_id,
+    u.username,
+    u.full_name,
+    c.id as course_id,
+    c.course_code,
+    c.course_name,
+    c.semester,
+    c.total_classes,
+    t.name as teacher_name,
+    COALESCE(ac.classes_held, 0) as total_marked,
+    COALESCE(ac.present_count, 0) as present_count,
+    COALESCE(ac.absent_count, 0) as absent_count,
+    ROUND(COALESCE(ac.present_count, 0) * 100.0 / NULLIF(c.total_classes, 0), 2) as attendance_percentage,
+    COALESCE(ats.required_percentage, 60.00) as required_percentage
+FROM users u
+JOIN enrollments e ON u.id = e.user_id
+JOIN courses c ON e.course_id = c.id
+JOIN teachers t ON c.teacher_id = t.id
+LEFT JOIN attendance_counters ac ON e.id = ac.enrollment_id
+LEFT JOIN attendance_settings ats ON u.id = ats.user_id AND c.id = ats.course_id;
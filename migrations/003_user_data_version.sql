@@ -0,0 +1,6 @@
+-- Migration 003: per-user data version for ETags and the rendered-page cache
+-- Bumped by every write route; pages cached under an older version stop matching.
+
+ALTER TABLE users
+    ADD COLUMN data_version INT NOT NULL DEFAULT 0 AFTER email,
+    ADD COLUMN data_updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP AFTER data_version;
@@ -0,0 +1,20 @@
+-- Migration 004: semester archival
+-- Courses of a closed semester are marked archived_at and their attendance records are
+-- moved into attendance_archive by `flask --app app archive-semester <semester>`.
+-- attendance_records then only holds open semesters; counters cover both tables.
+-- Apply to an existing database with:
+--   mysql -u root -p sixtypercent < migrations/004_attendance_archive.sql
+
+ALTER TABLE courses
+    ADD COLUMN archived_at TIMESTAMP NULL DEFAULT NULL AFTER total_classes;
+
+CREATE TABLE IF NOT EXISTS attendance_archive (
+    id INT NOT NULL,
+    enrollment_id INT NOT NULL,
+    class_date DATE NOT NULL,
+    status ENUM('present', 'absent') NOT NULL,
+    notes VARCHAR(255),
+    created_at TIMESTAMP NULL DEFAULT NULL,
+    PRIMARY KEY (enrollment_id, class_date),
+    FOREIGN KEY (enrollment_id) REFERENCES enrollments(id) ON DELETE CASCADE
+) ENGINE=InnoDB ROW_FORMAT=COMPRESSED;
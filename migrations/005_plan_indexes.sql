@@ -0,0 +1,13 @@
+-- Migration 005: indexes found missing by benchmarks/query_plans.py
+-- teachers (user_id, name) returns a user's teachers already sorted by name (teacher
+-- list, course forms) instead of sorting them; it replaces idx_user.
+-- courses (semester) serves the report's semester filter and archive-semester.
+-- Apply to an existing database with:
+--   mysql -u root -p sixtypercent < migrations/005_plan_indexes.sql
+
+ALTER TABLE teachers
+    ADD INDEX idx_user_name (user_id, name),
+    DROP INDEX idx_user;
+
+ALTER TABLE courses
+    ADD INDEX idx_semester (semester);
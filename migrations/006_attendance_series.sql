@@ -0,0 +1,28 @@
+-- Migration 006: attendance trend series
+-- Running classes held / attended per enrollment and class date, read by
+-- /api/courses/<id>/trend and kept up to date by every attendance write.
+-- Requires MySQL 8.0+ (window functions) and migration 004.
+-- Apply to an existing database with:
+--   mysql -u root -p sixtypercent < migrations/006_attendance_series.sql
+
+CREATE TABLE IF NOT EXISTS attendance_series (
+    enrollment_id INT NOT NULL,
+    class_date DATE NOT NULL,
+    held INT NOT NULL,
+    present INT NOT NULL,
+    PRIMARY KEY (enrollment_id, class_date),
+    FOREIGN KEY (enrollment_id) REFERENCES enrollments(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Backfill from live and archived records
+-- (same statement as `flask --app app rebuild-series`)
+INSERT INTO attendance_series (enrollment_id, class_date, held, present)
+SELECT enrollment_id, class_date,
+    COUNT(*) OVER w,
+    SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END) OVER w
+FROM (
+    SELECT enrollment_id, class_date, status FROM attendance_records
+    UNION ALL
+    SELECT enrollment_id, class_date, status FROM attendance_archive
+) ar
+WINDOW w AS (PARTITION BY enrollment_id ORDER BY class_date ROWS UNBOUNDED PRECEDING);
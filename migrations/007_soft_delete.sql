@@ -0,0 +1,47 @@
+-- Migration 007: soft delete
+-- Deleting a course, teacher or user sets deleted_at; the rows and their attendance
+-- are removed afterwards in small batches by the purge job (purge.py).
+-- courses.live is 1 while a course isn't deleted and NULL after, so the unique key
+-- lets a deleted course code be added again before the purge gets to it.
+-- Requires MySQL 5.7+ (indexed virtual columns) and migration 004.
+-- Apply to an existing database with:
+--   mysql -u root -p sixtypercent < migrations/007_soft_delete.sql
+
+ALTER TABLE users
+    ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL AFTER data_updated_at,
+    ADD INDEX idx_deleted (deleted_at);
+
+ALTER TABLE teachers
+    ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL AFTER department,
+    ADD INDEX idx_deleted (deleted_at);
+
+ALTER TABLE courses
+    ADD COLUMN deleted_at TIMESTAMP NULL DEFAULT NULL AFTER archived_at,
+    ADD COLUMN live TINYINT AS (IF(deleted_at IS NULL, 1, NULL)) VIRTUAL AFTER deleted_at,
+    DROP INDEX unique_user_course,
+    ADD UNIQUE KEY unique_user_course (user_id, course_code, live),
+    ADD INDEX idx_deleted (deleted_at);
+
+CREATE OR REPLACE VIEW attendance_summary AS
+SELECT 
+    u.id as user_id,
+    u.username,
+    u.full_name,
+    c.id as course_id,
+    c.course_code,
+    c.course_name,
+    c.semester,
+    c.total_classes,
+    t.name as teacher_name,
+    COALESCE(ac.classes_held, 0) as total_marked,
+    COALESCE(ac.present_count, 0) as present_count,
+    COALESCE(ac.absent_count, 0) as absent_count,
+    ROUND(COALESCE(ac.present_count, 0) * 100.0 / NULLIF(c.total_classes, 0), 2) as attendance_percentage,
+    COALESCE(ats.required_percentage, 60.00) as required_percentage
+FROM users u
+JOIN enrollments e ON u.id = e.user_id
+JOIN courses c ON e.course_id = c.id
+JOIN teachers t ON c.teacher_id = t.id
+LEFT JOIN attendance_counters ac ON e.id = ac.enrollment_id
+LEFT JOIN attendance_settings ats ON u.id = ats.user_id AND c.id = ats.course_id
+WHERE c.deleted_at IS NULL AND u.deleted_at IS NULL;
@@ -0,0 +1,108 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing off the request threads
+# scrypt is deliberately slow; during a login storm, hashing on the request threads
+# pins every CPU and ordinary page views queue behind it. Hashes are instead computed
+# in a small per-process pool of HASH_POOL_WORKERS processes. At most HASH_POOL_QUEUE
+# more requests may wait for it; beyond that (or after HASH_POOL_TIMEOUT seconds)
+# HashPoolBusy is raised straight away so the request can be answered with a 503.
+# HASH_POOL_WORKERS = 0 hashes inline on the request thread.
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hashing pool is saturated."""
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+def _generate(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _noop():
+    return None
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self._executor = None
+        self._executor_pid = None
+        self._slots = None
+        self._current_prefix = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+        app.config.setdefault('HASH_POOL_WORKERS', 2)
+        app.config.setdefault('HASH_POOL_QUEUE', 32)
+        app.config.setdefault('HASH_POOL_TIMEOUT', 10.0)
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = int(app.config['HASH_POOL_WORKERS'])
+        self.timeout = float(app.config['HASH_POOL_TIMEOUT'])
+        # Requests hashing at once: one per worker plus the waiting queue
+        self._slots = threading.BoundedSemaphore(self.workers + int(app.config['HASH_POOL_QUEUE']))
+
+    # Created lazily per process, like the database pool. On Linux the hashing processes
+    # are forked all at once on first use, so warm() them before starting request threads.
+    @property
+    def executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolBusy('Password hashing queue is full')
+        try:
+            future = self.executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._executor = None
+            raise HashPoolBusy('Password hashing pool restarted')
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the hash finishes, even if this request gave up on it
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashPoolBusy(f'Password hashing took longer than {self.timeout}s')
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            self._executor = None
+            raise HashPoolBusy('Password hashing pool restarted')
+
+    # Start every worker process ahead of traffic
+    def warm(self):
+        if self.workers > 0:
+            for future in [self.executor.submit(_noop) for _ in range(self.workers)]:
+                future.result()
+
+    def hash(self, password):
+        return self._run(_generate, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(_verify, pwhash, password)
+
+    # True when pwhash was made with other parameters than PASSWORD_HASH_METHOD,
+    # e.g. "pbkdf2:sha256:600000" or an older scrypt cost, and should be replaced
+    def needs_rehash(self, pwhash):
+        if self._current_prefix is None:
+            self._current_prefix = generate_password_hash('', method=self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._current_prefix
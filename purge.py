@@ -0,0 +1,218 @@
+import logging
+import os
+import threading
+import time
+
+# Background purge of deleted courses, teachers and users
+# Deleting a course used to be one DELETE that cascaded through every enrollment and
+# attendance record in a single transaction, holding locks and growing the undo log
+# while other users' writes waited. Deletes now only set deleted_at, which hides the
+# row straight away, and this job removes the data afterwards: attendance rows in
+# batches of PURGE_BATCH_SIZE, one short transaction each, sleeping PURGE_PAUSE
+# seconds between batches. Parents are deleted once their children are gone, so the
+# final cascading DELETE has nothing left to cascade.
+#
+# Deleting a user also marks their courses and teachers deleted; a teacher is only
+# deleted once none of their courses is live. On MySQL a named lock keeps it to one
+# purge at a time across all workers and servers.
+
+logger = logging.getLogger(__name__)
+
+# Per-enrollment tables, each with a unique (enrollment_id, class_date) index
+DATED_TABLES = ('attendance_records', 'attendance_archive', 'attendance_series')
+
+# Enrollments of a deleted course, then of a deleted user (two queries so each can
+# start from the deleted_at index)
+DOOMED_ENROLLMENTS_SQL = (
+    """
+    SELECT e.id FROM courses c
+    JOIN enrollments e ON e.course_id = c.id
+    WHERE c.deleted_at IS NOT NULL
+    LIMIT %s
+    """,
+    """
+    SELECT e.id FROM users u
+    JOIN enrollments e ON e.user_id = u.id
+    WHERE u.deleted_at IS NOT NULL
+    LIMIT %s
+    """,
+)
+
+
+def delete_dated_rows(cur, table, enrollment_id, batch_size):
+    # Delete at most batch_size rows of one enrollment, oldest first, as an index range.
+    # Returns the number deleted.
+    cur.execute(f"""
+        SELECT class_date FROM {table} WHERE enrollment_id = %s
+        ORDER BY class_date LIMIT 1 OFFSET %s
+    """, (enrollment_id, batch_size - 1))
+    boundary = cur.fetchone()
+    if boundary:
+        cur.execute(f"DELETE FROM {table} WHERE enrollment_id = %s AND class_date <= %s",
+                    (enrollment_id, boundary['class_date']))
+    else:
+        cur.execute(f"DELETE FROM {table} WHERE enrollment_id = %s", (enrollment_id,))
+    return cur.rowcount
+
+
+def purge_deleted(conn, batch_size=1000, pause=0.1, stopping=None):
+    # Remove everything marked deleted. Returns the number of rows deleted per table.
+    # Safe to run in several processes at once; each batch commits on its own.
+    deleted = {}
+
+    def commit(table, rows):
+        conn.commit()
+        if rows:
+            deleted[table] = deleted.get(table, 0) + rows
+            if pause:
+                time.sleep(pause)
+
+    cur = conn.cursor()
+    try:
+        while not (stopping and stopping.is_set()):
+            enrollment_ids = []
+            for sql in DOOMED_ENROLLMENTS_SQL:
+                cur.execute(sql, (100,))
+                enrollment_ids += [row['id'] for row in cur.fetchall() if row['id'] not in enrollment_ids]
+            conn.commit()
+            if not enrollment_ids:
+                break
+            for enrollment_id in enrollment_ids:
+                for table in DATED_TABLES:
+                    while not (stopping and stopping.is_set()):
+                        rows = delete_dated_rows(cur, table, enrollment_id, batch_size)
+                        commit(table, rows)
+                        if rows < batch_size:
+                            break
+                if stopping and stopping.is_set():
+                    break
+                # Small rows left: its counters, then the enrollment itself
+                cur.execute("DELETE FROM attendance_counters WHERE enrollment_id = %s", (enrollment_id,))
+                cur.execute("DELETE FROM enrollments WHERE id = %s", (enrollment_id,))
+                commit('enrollments', cur.rowcount)
+
+        if stopping and stopping.is_set():
+            return deleted
+
+        # Parents without children left, a batch at a time
+        for table, sql in (
+            ('courses', """
+                SELECT c.id FROM courses c
+                WHERE c.deleted_at IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM enrollments e WHERE e.course_id = c.id)
+                LIMIT %s
+            """),
+            ('teachers', """
+                SELECT t.id FROM teachers t
+                WHERE t.deleted_at IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM courses c WHERE c.teacher_id = t.id)
+                LIMIT %s
+            """),
+            ('users', """
+                SELECT u.id FROM users u
+                WHERE u.deleted_at IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM courses c WHERE c.user_id = u.id)
+                AND NOT EXISTS (SELECT 1 FROM teachers t WHERE t.user_id = u.id)
+                AND NOT EXISTS (SELECT 1 FROM enrollments e WHERE e.user_id = u.id)
+                LIMIT %s
+            """),
+        ):
+            while True:
+                cur.execute(sql, (batch_size,))
+                ids = [row['id'] for row in cur.fetchall()]
+                if not ids:
+                    conn.commit()
+                    break
+                placeholders = ', '.join(['%s'] * len(ids))
+                if table == 'courses':
+                    cur.execute(f"DELETE FROM attendance_settings WHERE course_id IN ({placeholders})", ids)
+                cur.execute(f"DELETE FROM {table} WHERE id IN ({placeholders}) AND deleted_at IS NOT NULL", ids)
+                commit(table, cur.rowcount)
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def pending_deletions(cur):
+    # Rows still marked deleted, per table
+    counts = {}
+    for table in ('courses', 'teachers', 'users'):
+        cur.execute(f"SELECT COUNT(*) as pending FROM {table} WHERE deleted_at IS NOT NULL")
+        counts[table] = cur.fetchone()['pending']
+    return counts
+
+
+class Purger:
+    # Runs purge_deleted() in a background thread of each worker process every
+    # PURGE_INTERVAL seconds, and soon after a delete (wake)
+    def __init__(self, app=None, mysql=None):
+        self._thread = None
+        self._thread_pid = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, mysql)
+
+    def init_app(self, app, mysql):
+        self.app = app
+        self.mysql = mysql
+        app.config.setdefault('PURGE_INTERVAL', 60.0)
+        app.config.setdefault('PURGE_BATCH_SIZE', 1000)
+        app.config.setdefault('PURGE_PAUSE', 0.1)
+        self.interval = float(app.config['PURGE_INTERVAL'])
+
+    def start(self):
+        if self.interval <= 0 or (self._thread_pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='purger', daemon=True)
+                self._thread.start()
+                self._thread_pid = os.getpid()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join(timeout=10)
+
+    def run_once(self, stopping=None):
+        # Returns rows deleted per table, or None when another process is purging
+        with self.app.app_context():
+            conn = self.mysql.connection
+            if self.mysql.backend == 'mysql':
+                cur = conn.cursor()
+                cur.execute("SELECT GET_LOCK('sixtypercent_purge', 0) as locked")
+                locked = cur.fetchone()['locked']
+                cur.close()
+                if not locked:
+                    return None
+            try:
+                return purge_deleted(conn, int(self.app.config['PURGE_BATCH_SIZE']),
+                                     float(self.app.config['PURGE_PAUSE']), stopping)
+            finally:
+                if self.mysql.backend == 'mysql':
+                    cur = conn.cursor()
+                    cur.execute("SELECT RELEASE_LOCK('sixtypercent_purge')")
+                    cur.fetchall()
+                    cur.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                deleted = self.run_once(self._stopping)
+                if deleted:
+                    logger.info('Purged deleted rows: %s', deleted)
+            except Exception:
+                logger.exception('Purging deleted rows failed')
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from decimal import Decimal
+
+from attendance import course_metrics_batch
+from db import streaming_cursor
+
+# Institution-wide attendance report
+# Rows come from the attendance_summary view through an unbuffered server-side cursor
+# and are fetched in chunks, so memory stays flat however many enrollments there are.
+# Metrics for each chunk are computed with the vectorised course_metrics_batch().
+
+ZONES = ('dead', 'danger', 'at-risk', 'ok')
+FORMATS = ('csv', 'jsonl')
+COLUMNS = ('user_id', 'username', 'full_name', 'course_id', 'course_code', 'course_name',
+           'semester', 'teacher_name', 'total_classes', 'classes_held', 'present_count',
+           'absent_count', 'required_percentage', 'attendance_percentage', 'classes_needed',
+           'classes_can_miss', 'zone')
+
+
+def iter_report_rows(conn, semester=None, course_code=None, zone=None, chunk_size=1000):
+    conditions, args = [], []
+    if semester:
+        conditions.append('semester = %s')
+        args.append(semester)
+    if course_code:
+        conditions.append('course_code = %s')
+        args.append(course_code)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    cur = streaming_cursor(conn)
+    try:
+        cur.execute(f"""
+            SELECT user_id, username, full_name, course_id, course_code, course_name,
+                semester, teacher_name, total_classes, total_marked as classes_held,
+                present_count, absent_count, required_percentage
+            FROM attendance_summary
+            {where}
+            ORDER BY user_id, course_code
+        """, args)
+        while True:
+            chunk = cur.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield from _with_metrics(chunk, zone)
+    finally:
+        cur.close()
+
+
+def _with_metrics(chunk, zone):
+    metrics = course_metrics_batch([r['total_classes'] for r in chunk],
+                                   [r['classes_held'] for r in chunk],
+                                   [r['present_count'] for r in chunk],
+                                   [r['required_percentage'] for r in chunk])
+    for i, row in enumerate(chunk):
+        row_zone = 'dead' if metrics['dead_zone'][i] else 'danger' if metrics['danger_zone'][i] else 'ok'
+        if zone == 'at-risk' and row_zone == 'ok':
+            continue
+        if zone in ('dead', 'danger', 'ok') and row_zone != zone:
+            continue
+        row = dict(row)
+        row['attendance_percentage'] = float(metrics['attendance_percentage'][i])
+        row['classes_needed'] = int(metrics['classes_needed'][i])
+        row['classes_can_miss'] = int(metrics['classes_can_miss'][i])
+        row['zone'] = row_zone
+        yield row
+
+
+def render_csv(rows, chunk_rows=500):
+    # Yield the CSV text a few hundred rows at a time
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def render_jsonl(rows):
+    for row in rows:
+        yield json.dumps({key: _json_value(row[key]) for key in COLUMNS}) + '\n'
+
+
+def render(rows, fmt):
+    return render_csv(rows) if fmt == 'csv' else render_jsonl(rows)
+
+
+def _json_value(value):
+    return float(value) if isinstance(value, Decimal) else value
@@ -2,6 +2,16 @@
 
 # Run Website Script for SixtyPercent Attendance Tracker
 # This script starts the Flask development server
+#
+# Usage:
+#   ./run.sh               development server (debugger, auto-reload)
+#   ./run.sh production    multi-process production server (serve.py / gunicorn)
+
+MODE="${1:-development}"
+if [ "$MODE" != "development" ] && [ "$MODE" != "production" ]; then
+    echo "Usage: $0 [development|production]"
+    exit 1
+fi
 
 echo "=========================================="
 echo "  SixtyPercent Attendance Tracker"
@@ -37,22 +47,36 @@ else
 fi
 
 echo ""
-echo "🚀 Starting Flask development server..."
-echo ""
-echo "📍 Access the website at:"
-echo "   - http://127.0.0.1:5000"
-echo "   - http://localhost:5000"
-echo ""
-echo "⚙️  Configuration:"
-echo "   - Debug mode: ON"
-echo "   - Auto-reload: ENABLED"
-echo "   - Host: 0.0.0.0 (all interfaces)"
-echo "   - Port: 5000"
-echo ""
-echo "💡 Tips:"
-echo "   - Press CTRL+C to stop the server"
-echo "   - Changes to code will auto-reload"
-echo "   - Check .env file for database settings"
+if [ "$MODE" = "production" ]; then
+    echo "🚀 Starting production server..."
+    echo ""
+    echo "⚙️  Configuration (from .env, see SERVER_* settings):"
+    echo "   - Debug mode: OFF"
+    echo "   - Workers: preforked, app preloaded, templates and DB pool warmed"
+    echo "   - Bind: SERVER_BIND (default 0.0.0.0:5000)"
+    echo ""
+    echo "💡 Tips:"
+    echo "   - Press CTRL+C to stop the server"
+    echo "   - Deploy new code without downtime: python3 serve.py reload"
+    echo "   - Graceful stop from another shell: python3 serve.py stop"
+else
+    echo "🚀 Starting Flask development server..."
+    echo ""
+    echo "📍 Access the website at:"
+    echo "   - http://127.0.0.1:5000"
+    echo "   - http://localhost:5000"
+    echo ""
+    echo "⚙️  Configuration:"
+    echo "   - Debug mode: ON"
+    echo "   - Auto-reload: ENABLED"
+    echo "   - Host: 0.0.0.0 (all interfaces)"
+    echo "   - Port: 5000"
+    echo ""
+    echo "💡 Tips:"
+    echo "   - Press CTRL+C to stop the server"
+    echo "   - Changes to code will auto-reload"
+    echo "   - Check .env file for database settings"
+fi
 echo ""
 echo "=========================================="
 echo ""
@@ -63,10 +87,14 @@ if [ -d "venv" ]; then
     source venv/bin/activate
 fi
 
-# Check if Flask is installed
-if ! python3 -c "import flask" 2>/dev/null; then
+# Check if Flask (and gunicorn in production) is installed
+CHECK_IMPORTS="import flask"
+if [ "$MODE" = "production" ]; then
+    CHECK_IMPORTS="import flask, gunicorn"
+fi
+if ! python3 -c "$CHECK_IMPORTS" 2>/dev/null; then
     echo "⚠️  Flask not found. Installing dependencies..."
-    pip install flask flask-mysqldb python-dotenv
+    pip install -r requirements.txt
 fi
 
 # Check if .env file exists
@@ -105,7 +133,14 @@ echo "🌐 Starting server..."
 echo ""
 
 # Run Flask app
-python3 app.py
+if [ "$MODE" = "production" ]; then
+    echo "📦 Building static assets and templates..."
+    python3 -m flask --app app build-assets
+    python3 -m flask --app app compile-templates
+    python3 serve.py
+else
+    python3 app.py
+fi
 
 # This line will execute when server stops
 echo ""
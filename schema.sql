@@ -11,8 +11,12 @@ CREATE TABLE users (
     password_hash VARCHAR(255) NOT NULL,
     full_name VARCHAR(100) NOT NULL,
     email VARCHAR(100),
+    data_version INT NOT NULL DEFAULT 0,
+    data_updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    INDEX idx_username (username)
+    INDEX idx_username (username),
+    INDEX idx_deleted (deleted_at)
 ) ENGINE=InnoDB;
 
 -- Table 2: Teachers
@@ -22,10 +26,12 @@ CREATE TABLE teachers (
     name VARCHAR(100) NOT NULL,
     email VARCHAR(100),
     department VARCHAR(100),
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_name (name),
-    INDEX idx_user (user_id)
+    INDEX idx_user_name (user_id, name),
+    INDEX idx_deleted (deleted_at)
 ) ENGINE=InnoDB;
 
 -- Table 3: Courses
@@ -37,13 +43,19 @@ CREATE TABLE courses (
     teacher_id INT NOT NULL,
     semester VARCHAR(20),
     total_classes INT NOT NULL DEFAULT 0,
+    archived_at TIMESTAMP NULL DEFAULT NULL,
+    deleted_at TIMESTAMP NULL DEFAULT NULL,
+    -- 1 while not deleted, NULL after, so a deleted code can be added again
+    live TINYINT AS (IF(deleted_at IS NULL, 1, NULL)) VIRTUAL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (teacher_id) REFERENCES teachers(id) ON DELETE CASCADE,
-    UNIQUE KEY unique_user_course (user_id, course_code),
+    UNIQUE KEY unique_user_course (user_id, course_code, live),
     INDEX idx_course_code (course_code),
     INDEX idx_teacher (teacher_id),
-    INDEX idx_user (user_id)
+    INDEX idx_user (user_id),
+    INDEX idx_semester (semester),
+    INDEX idx_deleted (deleted_at)
 ) ENGINE=InnoDB;
 
 -- Table 4: Student Course Enrollment
@@ -73,6 +85,39 @@ CREATE TABLE attendance_records (
     INDEX idx_date (class_date)
 ) ENGINE=InnoDB;
 
+-- Table 5a: Attendance Archive (records of closed semesters, moved by `flask archive-semester`)
+-- Clustered by enrollment and compressed; records keep their original ids
+CREATE TABLE attendance_archive (
+    id INT NOT NULL,
+    enrollment_id INT NOT NULL,
+    class_date DATE NOT NULL,
+    status ENUM('present', 'absent') NOT NULL,
+    notes VARCHAR(255),
+    created_at TIMESTAMP NULL DEFAULT NULL,
+    PRIMARY KEY (enrollment_id, class_date),
+    FOREIGN KEY (enrollment_id) REFERENCES enrollments(id) ON DELETE CASCADE
+) ENGINE=InnoDB ROW_FORMAT=COMPRESSED;
+
+-- Table 5b: Attendance Counters (held/present/absent per enrollment, kept in sync by the app)
+CREATE TABLE attendance_counters (
+    enrollment_id INT PRIMARY KEY,
+    classes_held INT NOT NULL DEFAULT 0,
+    present_count INT NOT NULL DEFAULT 0,
+    absent_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (enrollment_id) REFERENCES enrollments(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Table 5c: Attendance Series (running held/present per enrollment and class date, for trends)
+CREATE TABLE attendance_series (
+    enrollment_id INT NOT NULL,
+    class_date DATE NOT NULL,
+    held INT NOT NULL,
+    present INT NOT NULL,
+    PRIMARY KEY (enrollment_id, class_date),
+    FOREIGN KEY (enrollment_id) REFERENCES enrollments(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
 -- Table 6: Attendance Settings (for customizable percentage threshold)
 CREATE TABLE attendance_settings (
     id INT PRIMARY KEY AUTO_INCREMENT,
@@ -89,23 +134,27 @@ CREATE TABLE attendance_settings (
 -- No sample data - users will create their own courses and teachers!
 
 -- Create a view for easy attendance summary
+-- (percentages are over the course's total classes, like the dashboard)
 CREATE VIEW attendance_summary AS
 SELECT 
     u.id as user_id,
+    u.username,
     u.full_name,
     c.id as course_id,
     c.course_code,
     c.course_name,
+    c.semester,
+    c.total_classes,
     t.name as teacher_name,
-    COUNT(ar.id) as total_marked,
-    SUM(CASE WHEN ar.status = 'present' THEN 1 ELSE 0 END) as present_count,
-    SUM(CASE WHEN ar.status = 'absent' THEN 1 ELSE 0 END) as absent_count,
-    ROUND((SUM(CASE WHEN ar.status = 'present' THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(ar.id), 0)), 2) as attendance_percentage,
+    COALESCE(ac.classes_held, 0) as total_marked,
+    COALESCE(ac.present_count, 0) as present_count,
+    COALESCE(ac.absent_count, 0) as absent_count,
+    ROUND(COALESCE(ac.present_count, 0) * 100.0 / NULLIF(c.total_classes, 0), 2) as attendance_percentage,
     COALESCE(ats.required_percentage, 60.00) as required_percentage
 FROM users u
 JOIN enrollments e ON u.id = e.user_id
 JOIN courses c ON e.course_id = c.id
 JOIN teachers t ON c.teacher_id = t.id
-LEFT JOIN attendance_records ar ON e.id = ar.enrollment_id
+LEFT JOIN attendance_counters ac ON e.id = ac.enrollment_id
 LEFT JOIN attendance_settings ats ON u.id = ats.user_id AND c.id = ats.course_id
-GROUP BY u.id, c.id, u.full_name, c.course_code, c.course_name, t.name, ats.required_percentage;
+WHERE c.deleted_at IS NULL AND u.deleted_at IS NULL;
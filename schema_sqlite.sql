@@ -0,0 +1,155 @@
+-- SixtyPercent Attendance Tracker Database Schema (SQLite)
+-- SQLite translation of schema.sql for DB_BACKEND=sqlite; keep the two in sync.
+-- ENUMs become CHECK constraints, ON UPDATE CURRENT_TIMESTAMP becomes a trigger and
+-- secondary indexes are created separately. SQLite stores any text in a DATE column,
+-- so class dates are checked the way MySQL rejects them. Safe to run against an
+-- existing file.
+PRAGMA journal_mode = WAL;
+PRAGMA foreign_keys = ON;
+
+-- Table 1: Users (Students)
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    full_name VARCHAR(100) NOT NULL,
+    email VARCHAR(100),
+    data_version INT NOT NULL DEFAULT 0,
+    data_updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleted_at TIMESTAMP DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_users_deleted ON users (deleted_at);
+
+-- Table 2: Teachers
+CREATE TABLE IF NOT EXISTS teachers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(100),
+    department VARCHAR(100),
+    deleted_at TIMESTAMP DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_teachers_name ON teachers (name);
+CREATE INDEX IF NOT EXISTS idx_teachers_user_name ON teachers (user_id, name);
+CREATE INDEX IF NOT EXISTS idx_teachers_deleted ON teachers (deleted_at);
+
+-- Table 3: Courses
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    course_code VARCHAR(20) NOT NULL,
+    course_name VARCHAR(150) NOT NULL,
+    teacher_id INT NOT NULL REFERENCES teachers(id) ON DELETE CASCADE,
+    semester VARCHAR(20),
+    total_classes INT NOT NULL DEFAULT 0,
+    archived_at TIMESTAMP DEFAULT NULL,
+    deleted_at TIMESTAMP DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- Partial index instead of MySQL's generated `live` column
+CREATE UNIQUE INDEX IF NOT EXISTS unique_user_course ON courses (user_id, course_code) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_courses_course_code ON courses (course_code);
+CREATE INDEX IF NOT EXISTS idx_courses_teacher ON courses (teacher_id);
+CREATE INDEX IF NOT EXISTS idx_courses_user ON courses (user_id);
+CREATE INDEX IF NOT EXISTS idx_courses_semester ON courses (semester);
+CREATE INDEX IF NOT EXISTS idx_courses_deleted ON courses (deleted_at);
+
+-- Table 4: Student Course Enrollment
+CREATE TABLE IF NOT EXISTS enrollments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    course_id INT NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    enrolled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_enrollment UNIQUE (user_id, course_id)
+);
+CREATE INDEX IF NOT EXISTS idx_enrollments_course ON enrollments (course_id);
+
+-- Table 5: Attendance Records
+CREATE TABLE IF NOT EXISTS attendance_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    enrollment_id INT NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+    class_date DATE NOT NULL CHECK (date(class_date) IS NOT NULL),
+    status VARCHAR(7) NOT NULL CHECK (status IN ('present', 'absent')),
+    notes VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_attendance UNIQUE (enrollment_id, class_date)
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance_records (class_date);
+
+-- Table 5a: Attendance Archive (records of closed semesters, moved by `flask archive-semester`)
+CREATE TABLE IF NOT EXISTS attendance_archive (
+    id INT NOT NULL,
+    enrollment_id INT NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+    class_date DATE NOT NULL CHECK (date(class_date) IS NOT NULL),
+    status VARCHAR(7) NOT NULL CHECK (status IN ('present', 'absent')),
+    notes VARCHAR(255),
+    created_at TIMESTAMP DEFAULT NULL,
+    PRIMARY KEY (enrollment_id, class_date)
+) WITHOUT ROWID;
+
+-- Table 5b: Attendance Counters (held/present/absent per enrollment, kept in sync by the app)
+CREATE TABLE IF NOT EXISTS attendance_counters (
+    enrollment_id INT PRIMARY KEY REFERENCES enrollments(id) ON DELETE CASCADE,
+    classes_held INT NOT NULL DEFAULT 0,
+    present_count INT NOT NULL DEFAULT 0,
+    absent_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TRIGGER IF NOT EXISTS attendance_counters_updated_at
+AFTER UPDATE ON attendance_counters FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE attendance_counters SET updated_at = CURRENT_TIMESTAMP WHERE enrollment_id = NEW.enrollment_id;
+END;
+
+-- Table 5c: Attendance Series (running held/present per enrollment and class date, for trends)
+CREATE TABLE IF NOT EXISTS attendance_series (
+    enrollment_id INT NOT NULL REFERENCES enrollments(id) ON DELETE CASCADE,
+    class_date DATE NOT NULL CHECK (date(class_date) IS NOT NULL),
+    held INT NOT NULL,
+    present INT NOT NULL,
+    PRIMARY KEY (enrollment_id, class_date)
+) WITHOUT ROWID;
+
+-- Table 6: Attendance Settings (for customizable percentage threshold)
+CREATE TABLE IF NOT EXISTS attendance_settings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    course_id INT NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    required_percentage DECIMAL(5,2) DEFAULT 60.00,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT unique_setting UNIQUE (user_id, course_id)
+);
+CREATE INDEX IF NOT EXISTS idx_settings_course ON attendance_settings (course_id);
+CREATE TRIGGER IF NOT EXISTS attendance_settings_updated_at
+AFTER UPDATE ON attendance_settings FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE attendance_settings SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+-- Create a view for easy attendance summary
+-- (percentages are over the course's total classes, like the dashboard)
+CREATE VIEW IF NOT EXISTS attendance_summary AS
+SELECT 
+    u.id as user_id,
+    u.username,
+    u.full_name,
+    c.id as course_id,
+    c.course_code,
+    c.course_name,
+    c.semester,
+    c.total_classes,
+    t.name as teacher_name,
+    COALESCE(ac.classes_held, 0) as total_marked,
+    COALESCE(ac.present_count, 0) as present_count,
+    COALESCE(ac.absent_count, 0) as absent_count,
+    ROUND(COALESCE(ac.present_count, 0) * 100.0 / NULLIF(c.total_classes, 0), 2) as attendance_percentage,
+    COALESCE(ats.required_percentage, 60.00) as required_percentage
+FROM users u
+JOIN enrollments e ON u.id = e.user_id
+JOIN courses c ON e.course_id = c.id
+JOIN teachers t ON c.teacher_id = t.id
+LEFT JOIN attendance_counters ac ON e.id = ac.enrollment_id
+LEFT JOIN attendance_settings ats ON u.id = ats.user_id AND c.id = ats.course_id
+WHERE c.deleted_at IS NULL AND u.deleted_at IS NULL;
@@ -0,0 +1,177 @@
+"""Production server.
+
+Runs the app under gunicorn: a master process that creates the app once (preload) and
+forks SERVER_WORKERS workers, each with SERVER_THREADS threads. Templates are loaded
+in the master before forking (from TEMPLATE_CACHE_DIR when `flask compile-templates`
+has run), and every worker opens its database pool and starts its password hashing
+processes before it accepts traffic. Workers are recycled gracefully after
+SERVER_MAX_REQUESTS requests (plus jitter, so they don't all restart at once).
+
+    python serve.py                 # start (settings from .env / config.py)
+    python serve.py --asgi          # serve asgi.py with uvicorn workers instead
+    python serve.py reload          # zero-downtime reload of new code
+    python serve.py stop            # graceful shutdown
+
+`reload` starts a new master with the new code next to the old one (USR2), polls
+/health until a warm worker of the new master answers, then gracefully stops the old
+master (TERM), which lets in-flight requests finish. Plain HUP would only restart
+workers from the preloaded old code.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+import urllib.request
+
+from gunicorn.app.base import BaseApplication
+
+from config import Config
+
+
+def server_options(asgi=False):
+    return {
+        'bind': Config.SERVER_BIND,
+        'workers': Config.SERVER_WORKERS,
+        'threads': Config.SERVER_THREADS,
+        'worker_class': 'uvicorn.workers.UvicornWorker' if asgi else 'gthread',
+        'preload_app': True,
+        'timeout': Config.SERVER_TIMEOUT,
+        'graceful_timeout': Config.SERVER_GRACEFUL_TIMEOUT,
+        'keepalive': Config.SERVER_KEEPALIVE,
+        'max_requests': Config.SERVER_MAX_REQUESTS,
+        'max_requests_jitter': Config.SERVER_MAX_REQUESTS_JITTER,
+        'pidfile': Config.SERVER_PIDFILE,
+        'accesslog': Config.SERVER_ACCESS_LOG or None,
+        'errorlog': '-',
+        'post_worker_init': warm_worker,
+        'worker_exit': stop_worker,
+    }
+
+
+# Load every template once in the master so forked workers share the compiled code
+def warm_templates(app):
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+# Runs in each worker after it loads the app and before it accepts connections
+def warm_worker(worker):
+    from app import marks_buffer, mysql, passwords, purger
+    with worker.app.flask_app.app_context():
+        mysql.pool.warm()
+    passwords.warm()
+    if marks_buffer.enabled:
+        marks_buffer.start()    # also replays marks journalled before a restart
+    purger.start()
+    worker.log.info('Worker %s warm: %s database connection(s), %s hashing process(es)',
+                    worker.pid, mysql.pool.stats()['size'], passwords.workers)
+
+
+# Runs in each worker as it exits: flush the mark journal and stop purging before it goes
+def stop_worker(server, worker):
+    from app import marks_buffer, purger
+    marks_buffer.stop()
+    purger.stop()
+
+
+class Server(BaseApplication):
+    def __init__(self, asgi=False):
+        self.asgi = asgi
+        self.options = server_options(asgi)
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        if self.asgi:
+            from asgi import application
+            self.flask_app = application.app
+        else:
+            from app import create_app
+            application = self.flask_app = create_app()
+        warm_templates(self.flask_app)
+        return application
+
+
+def read_pid(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def signal_master(sig):
+    pid = read_pid(Config.SERVER_PIDFILE)
+    if pid is None:
+        sys.exit(f'No running server (pidfile {Config.SERVER_PIDFILE} not found)')
+    os.kill(pid, sig)
+    return pid
+
+
+def health_url():
+    # The readiness probe on SERVER_BIND, or None for a unix socket
+    bind = Config.SERVER_BIND.split(',')[0].strip()
+    if bind.startswith('unix:'):
+        return None
+    host, _, port = bind.rpartition(':')
+    host = {'': '127.0.0.1', '0.0.0.0': '127.0.0.1', '[::]': '[::1]'}.get(host, host)
+    return f'http://{host}:{port}/health'
+
+
+def serves(url, master_pid):
+    # True once a worker of master_pid answers the probe. Old and new workers share the
+    # listening socket, so a few requests are made to reach a new one.
+    for _ in range(Config.SERVER_WORKERS * 2):
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if json.load(response).get('master') == master_pid:
+                    return True
+        except (OSError, ValueError):
+            return False
+    return False
+
+
+def reload(wait):
+    old_pid = signal_master(signal.SIGUSR2)
+    url = health_url()
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        # The new master writes <pidfile>.2 until the old one exits and it is promoted
+        new_pid = read_pid(Config.SERVER_PIDFILE + '.2')
+        if new_pid and new_pid != old_pid:
+            if url is None:
+                # No HTTP probe over a unix socket: give the new workers a fixed time to warm
+                time.sleep(Config.SERVER_RELOAD_GRACE)
+            elif not serves(url, new_pid):
+                time.sleep(0.2)
+                continue
+            os.kill(old_pid, signal.SIGTERM)
+            print(f'Reloaded: new master {new_pid}, old master {old_pid} shutting down gracefully')
+            return
+        time.sleep(0.2)
+    sys.exit(f'New master was not ready within {wait}s; old master {old_pid} left running')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', nargs='?', default='start', choices=('start', 'reload', 'stop'))
+    parser.add_argument('--asgi', action='store_true', help='Serve asgi.py with uvicorn workers')
+    parser.add_argument('--wait', type=float, default=60, help='Seconds reload waits for the new master')
+    args = parser.parse_args()
+
+    if args.command == 'reload':
+        reload(args.wait)
+    elif args.command == 'stop':
+        signal_master(signal.SIGTERM)
+    else:
+        Server(asgi=args.asgi).run()
+
+
+if __name__ == '__main__':
+    main()
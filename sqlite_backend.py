@@ -0,0 +1,152 @@
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+# Embedded SQLite backend
+# For single-node deployments and fast local runs. Connections behave like MySQLdb
+# DictCursor connections, so the routes run unchanged: queries keep MySQL syntax and
+# are translated once per distinct statement (placeholders, ON DUPLICATE KEY UPDATE,
+# FOR UPDATE). The database runs in WAL mode, so readers never block the writer.
+#
+# Transactions: plain reads run in autocommit. The first write, or the first
+# SELECT ... FOR UPDATE, opens BEGIN IMMEDIATE, which takes the database write lock
+# up front - the SQLite equivalent of the row locks the MySQL code relies on.
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_sqlite.sql')
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+
+_UPSERT = re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b(.*)$', re.I | re.S)
+_NOOP_UPDATE = re.compile(r'^\s*(\w+)\s*=\s*\1\s*$')
+_VALUES_REF = re.compile(r'\bVALUES\((\w+)\)', re.I)
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE\b', re.I)
+_READ_ONLY = re.compile(r'^\s*(SELECT|WITH)\b', re.I)
+
+
+@lru_cache(maxsize=512)
+def translate(query, has_args):
+    # Returns (SQLite statement, whether it needs the write lock)
+    locking = bool(_FOR_UPDATE.search(query))
+    sql = _FOR_UPDATE.sub('', query)
+
+    upsert = _UPSERT.search(sql)
+    if upsert:
+        assignments = upsert.group(1)
+        if _NOOP_UPDATE.match(assignments):
+            clause = 'ON CONFLICT DO NOTHING'
+        else:
+            clause = 'ON CONFLICT DO UPDATE SET' + _VALUES_REF.sub(r'excluded.\1', assignments)
+        sql = sql[:upsert.start()] + clause
+
+    # MySQLdb only interpolates (and unescapes %%) when arguments are passed
+    if has_args:
+        sql = sql.replace('%s', '?').replace('%%', '%')
+    return sql, locking or not _READ_ONLY.match(sql)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+
+    def execute(self, query, args=None):
+        sql, writes = translate(query, args is not None)
+        self._connection.begin_if_needed(writes)
+        self._cursor.execute(sql, tuple(args) if args is not None else ())
+        return self._cursor.rowcount
+
+    def executemany(self, query, args):
+        sql, writes = translate(query, True)
+        self._connection.begin_if_needed(writes)
+        self._cursor.executemany(sql, [tuple(row) for row in args])
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    backend = 'sqlite'
+    # DB-API exception attribute, as on MySQLdb connections: `except conn.IntegrityError`
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    # cursorclass is accepted for MySQLdb compatibility; SQLite cursors always return
+    # dict rows and step through results lazily
+    def cursor(self, cursorclass=None):
+        return SQLiteCursor(self)
+
+    def begin_if_needed(self, writes):
+        if writes and not self.raw.in_transaction:
+            self.raw.execute('BEGIN IMMEDIATE')
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def ping(self):
+        self.raw.execute('SELECT 1').fetchone()
+
+    def close(self):
+        self.raw.close()
+
+
+def connect(path, busy_timeout=5.0):
+    raw = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None,
+                          detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    raw.row_factory = _dict_row
+    raw.execute('PRAGMA journal_mode = WAL')
+    raw.execute('PRAGMA synchronous = NORMAL')
+    raw.execute('PRAGMA foreign_keys = ON')
+    return SQLiteConnection(raw)
+
+
+# Create the tables and views from schema_sqlite.sql (no-op for existing tables)
+def init_schema(path, schema_file=SCHEMA_FILE):
+    with open(schema_file) as f:
+        script = f.read()
+    conn = connect(path)
+    try:
+        conn.raw.executescript(script)
+    finally:
+        conn.close()
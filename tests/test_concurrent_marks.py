@@ -0,0 +1,202 @@
+"""Parallel attendance marks against one enrollment must keep the counters exact.
+
+The automated counterpart of benchmarks/concurrent_marks.py: threads post marks
+through the app, directly and through the write-behind buffer, and the counters
+are compared with the records afterwards. It runs on SQLite in a temporary
+directory, or on the scratch MySQL database named in TEST_DB_NAME (loaded with
+schema.sql, other settings from .env). Each test adds its own user and course.
+
+    python -m pytest tests/test_concurrent_marks.py
+    TEST_DB_NAME=sixtypercent_test python -m pytest tests/test_concurrent_marks.py
+"""
+import os
+import sys
+import threading
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+TOTAL_CLASSES = 10
+THREADS = 24
+PASSWORD = 'marker123'
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sqlite_backend  # noqa: E402
+from app import create_app, marks_buffer, mysql  # noqa: E402
+
+
+@pytest.fixture(params=[False, True], ids=['direct', 'buffered'])
+def app(request, tmp_path):
+    if TEST_DB_NAME:
+        backend = {'DB_BACKEND': 'mysql', 'MYSQL_DB': TEST_DB_NAME}
+    else:
+        sqlite_backend.init_schema(str(tmp_path / 'marks.db'))
+        backend = {'DB_BACKEND': 'sqlite', 'SQLITE_PATH': str(tmp_path / 'marks.db'), 'SQLITE_BUSY_TIMEOUT': 30}
+    app = create_app(dict(backend, **{
+        'TESTING': True,
+        'MYSQL_POOL_MAX_SIZE': THREADS,
+        'MYSQL_POOL_TIMEOUT': 30,
+        'MARK_BUFFER': request.param,
+        'MARK_JOURNAL_PATH': str(tmp_path / 'journal.db'),
+        'MARK_FLUSH_INTERVAL': 3600,
+        'MARK_FLUSH_BATCH': 0,
+        'RATE_LIMITS': '',
+        'SHED_POOL_WAIT_MS': 0,
+        'HASH_POOL_WORKERS': 0,
+        'PURGE_INTERVAL': 0,
+        'PAGE_CACHE_TTL': 0,
+        'USER_CACHE_TTL': 0,
+        'TEMPLATE_CACHE_DIR': '',
+    }))
+    yield app
+    marks_buffer.stop()
+
+
+def query(app, sql, args=()):
+    # One row, read through the app's own connection
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute(sql, args)
+        row = cur.fetchone()
+        cur.close()
+    return row
+
+
+@pytest.fixture
+def course(app):
+    # A new user owning one course of TOTAL_CLASSES classes (owners are enrolled
+    # automatically); returns the session cookie, course id and enrollment id
+    username = f'marker_{uuid.uuid4().hex[:12]}'
+    client = app.test_client()
+    client.post('/register', data={'username': username, 'password': PASSWORD, 'confirm_password': PASSWORD,
+                                   'full_name': 'Marker', 'email': ''})
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    client.post('/teacher/add', data={'name': 'Teacher', 'email': '', 'department': ''})
+    teacher = query(app, """
+        SELECT t.id FROM teachers t JOIN users u ON u.id = t.user_id WHERE u.username = %s
+    """, (username,))
+    client.post('/course/add', data={'course_code': 'CS101', 'course_name': 'Course', 'teacher_id': teacher['id'],
+                                     'semester': 'Fall', 'total_classes': str(TOTAL_CLASSES)})
+    enrollment = query(app, """
+        SELECT e.id, e.course_id FROM enrollments e JOIN users u ON u.id = e.user_id WHERE u.username = %s
+    """, (username,))
+    return client.get_cookie('session').value, enrollment['course_id'], enrollment['id']
+
+
+def mark_in_parallel(app, course, class_dates):
+    # One client per thread, all released at once; returns the response status codes
+    cookie, course_id, _ = course
+    barrier = threading.Barrier(len(class_dates))
+    statuses = []
+
+    def mark(class_date):
+        client = app.test_client()
+        client.set_cookie('session', cookie)
+        barrier.wait()
+        response = client.post(f'/course/{course_id}/mark', data={'class_date': class_date.isoformat(),
+                                                                   'status': 'present', 'notes': ''})
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=mark, args=(class_date,)) for class_date in class_dates]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if marks_buffer.enabled:
+        marks_buffer.flush()
+    return statuses
+
+
+def check_counters(app, course, expected_records):
+    state = query(app, """
+        SELECT ac.classes_held, ac.present_count, ac.absent_count,
+            (SELECT COUNT(*) FROM attendance_records ar WHERE ar.enrollment_id = ac.enrollment_id) as records,
+            (SELECT COUNT(DISTINCT ar.class_date) FROM attendance_records ar
+             WHERE ar.enrollment_id = ac.enrollment_id) as dates,
+            (SELECT COALESCE(MAX(s.held), 0) FROM attendance_series s
+             WHERE s.enrollment_id = ac.enrollment_id) as series_held
+        FROM attendance_counters ac WHERE ac.enrollment_id = %s
+    """, (course[2],))
+    assert state['records'] == expected_records
+    assert state['classes_held'] == state['records']
+    assert state['present_count'] + state['absent_count'] == state['records']
+    assert state['dates'] == state['records']
+    assert state['series_held'] == state['records']
+    assert state['records'] <= TOTAL_CLASSES
+
+
+def test_distinct_dates_stop_at_total_classes(app, course):
+    dates = [date(2025, 1, 1) + timedelta(days=i) for i in range(THREADS)]
+    statuses = mark_in_parallel(app, course, dates)
+    assert statuses == [302] * THREADS
+    check_counters(app, course, TOTAL_CLASSES)
+
+
+def test_double_submit_records_one_mark(app, course):
+    statuses = mark_in_parallel(app, course, [date(2025, 1, 1)] * THREADS)
+    assert statuses == [302] * THREADS
+    check_counters(app, course, 1)
+
+
+def test_repeated_dates_past_the_cap(app, course):
+    # Twice as many dates as classes, each submitted more than once
+    dates = [date(2025, 1, 1) + timedelta(days=i % (TOTAL_CLASSES * 2)) for i in range(THREADS * 2)]
+    statuses = mark_in_parallel(app, course, dates)
+    assert statuses == [302] * len(dates)
+    check_counters(app, course, TOTAL_CLASSES)
+
+    # Retrying a date that was recorded is still "already marked" on the full course
+    cookie, course_id, enrollment_id = course
+    recorded = query(app, 'SELECT class_date FROM attendance_records WHERE enrollment_id = %s LIMIT 1',
+                     (enrollment_id,))['class_date']
+    client = app.test_client()
+    client.set_cookie('session', cookie)
+    response = client.post(f'/course/{course_id}/mark', follow_redirects=True,
+                           data={'class_date': recorded.isoformat(), 'status': 'present', 'notes': ''})
+    assert b'was already marked' in response.data
+    assert b'Cannot add more attendance' not in response.data
+    check_counters(app, course, TOTAL_CLASSES)
+
+
+def test_flushes_during_buffered_marks(app, course):
+    # A flusher runs in a loop while the marks arrive: every mark the app acknowledged
+    # must reach the database, and none beyond the cap
+    if not marks_buffer.enabled:
+        pytest.skip('write-behind buffer only')
+    cookie, course_id, _ = course
+    dates = [date(2025, 1, 1) + timedelta(days=i) for i in range(THREADS)]
+    barrier = threading.Barrier(len(dates) + 1)
+    marking = threading.Event()
+    marking.set()
+    acknowledged = []
+    dropped = []
+
+    def mark(class_date):
+        client = app.test_client()
+        client.set_cookie('session', cookie)
+        barrier.wait()
+        response = client.post(f'/course/{course_id}/mark', follow_redirects=True,
+                               data={'class_date': class_date.isoformat(), 'status': 'present', 'notes': ''})
+        if b'Attendance marked successfully!' in response.data:
+            acknowledged.append(class_date)
+
+    def flush():
+        barrier.wait()
+        while marking.is_set():
+            dropped.append(marks_buffer.flush()[1])
+
+    threads = [threading.Thread(target=mark, args=(class_date,)) for class_date in dates]
+    flusher = threading.Thread(target=flush)
+    flusher.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    marking.clear()
+    flusher.join()
+    dropped.append(marks_buffer.flush()[1])
+
+    assert sum(dropped) == 0
+    assert len(acknowledged) == TOTAL_CLASSES
+    check_counters(app, course, TOTAL_CLASSES)
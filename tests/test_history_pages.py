@@ -0,0 +1,180 @@
+"""Cursor pagination of a course's attendance history, live and archived.
+
+Runs on SQLite in a temporary directory with HISTORY_PAGE_SIZE=3; each test adds its
+own user and a course with RECORDED classes, written straight into attendance_records.
+
+    python -m pytest tests/test_history_pages.py
+"""
+import os
+import re
+import sys
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+PAGE_SIZE = 3
+FIRST_DATE = date(2025, 1, 1)
+RECORDED = 7
+PASSWORD = 'history123'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sqlite_backend  # noqa: E402
+from app import create_app, marks_buffer, mysql, parse_history_cursor  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    sqlite_backend.init_schema(str(tmp_path / 'history.db'))
+    app = create_app({
+        'TESTING': True,
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': str(tmp_path / 'history.db'),
+        'MARK_JOURNAL_PATH': str(tmp_path / 'journal.db'),
+        'HISTORY_PAGE_SIZE': PAGE_SIZE,
+        'RATE_LIMITS': '',
+        'SHED_POOL_WAIT_MS': 0,
+        'HASH_POOL_WORKERS': 0,
+        'PURGE_INTERVAL': 0,
+        'PAGE_CACHE_TTL': 0,
+        'USER_CACHE_TTL': 0,
+        'TEMPLATE_CACHE_DIR': '',
+    })
+    yield app
+    marks_buffer.stop()
+
+
+def query(app, sql, args=()):
+    # Every row, read through the app's own connection
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute(sql, args)
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+@pytest.fixture
+def course(app):
+    # A logged-in client whose course has RECORDED daily classes from FIRST_DATE;
+    # returns the client and the course id
+    username = f'history_{uuid.uuid4().hex[:12]}'
+    client = app.test_client()
+    client.post('/register', data={'username': username, 'password': PASSWORD, 'confirm_password': PASSWORD,
+                                   'full_name': 'History', 'email': ''})
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    client.post('/teacher/add', data={'name': 'Teacher', 'email': '', 'department': ''})
+    teacher, = query(app, """
+        SELECT t.id FROM teachers t JOIN users u ON u.id = t.user_id WHERE u.username = %s
+    """, (username,))
+    client.post('/course/add', data={'course_code': 'CS101', 'course_name': 'Course', 'teacher_id': teacher['id'],
+                                     'semester': 'Fall', 'total_classes': '20'})
+    enrollment, = query(app, """
+        SELECT e.id, e.course_id FROM enrollments e JOIN users u ON u.id = e.user_id WHERE u.username = %s
+    """, (username,))
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.executemany("""
+            INSERT INTO attendance_records (enrollment_id, class_date, status, notes) VALUES (%s, %s, 'present', '')
+        """, [(enrollment['id'], FIRST_DATE + timedelta(days=n)) for n in range(RECORDED)])
+        mysql.connection.commit()
+        cur.close()
+    client.get('/dashboard')    # consume the flashes
+    return client, enrollment['course_id']
+
+
+def page(client, course_id, **args):
+    # The dates listed on one history page and its "Load older records" cursor
+    response = client.get(f'/course/{course_id}', query_string=args)
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    dates = re.findall(r'<td>(\d{4}-\d{2}-\d{2})</td>', html)
+    cursor = re.search(r'before=([^&"]+)', html)
+    return dates, cursor.group(1) if cursor else None, html
+
+
+def day(n):
+    return (FIRST_DATE + timedelta(days=n)).isoformat()
+
+
+@pytest.mark.parametrize('value', [None, '', 'garbage', '2025-01-05', '2025-01-05_', '2025-01-05_x',
+                                   '2025-13-01_5', '2025-02-30_5', '_5', '5_2025-01-05'])
+def test_malformed_cursor_is_ignored(value):
+    assert parse_history_cursor(value) is None
+
+
+def test_cursor_parses_date_and_id():
+    assert parse_history_cursor('2025-01-05_42') == (date(2025, 1, 5), 42)
+
+
+def test_pages_walk_the_whole_history(app, course):
+    client, course_id = course
+    seen, cursor, pages = [], None, 0
+    while True:
+        dates, cursor, html = page(client, course_id, **({'before': cursor} if cursor else {}))
+        assert ('Back to newest' in html) == (pages > 0)
+        seen += dates
+        pages += 1
+        if not cursor:
+            break
+    assert pages == 3
+    assert seen == [day(n) for n in reversed(range(RECORDED))]
+
+
+def test_full_last_page_has_no_next_link(app, course):
+    # With one record gone, two full pages and no third empty one
+    client, course_id = course
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute('DELETE FROM attendance_records WHERE class_date = %s', (day(0),))
+        mysql.connection.commit()
+        cur.close()
+    dates, cursor, _ = page(client, course_id)
+    dates, cursor, html = page(client, course_id, before=cursor)
+    assert dates == [day(3), day(2), day(1)]
+    assert cursor is None
+    assert 'Back to newest' in html
+
+
+@pytest.mark.parametrize('value', ['garbage', '2025-01-05', '2025-02-30_1'])
+def test_bad_cursor_shows_the_first_page(app, course, value):
+    client, course_id = course
+    dates, cursor, html = page(client, course_id, before=value)
+    assert dates == [day(6), day(5), day(4)]
+    assert cursor is not None
+    assert 'Back to newest' not in html
+
+
+def test_cursor_id_breaks_ties_on_the_date(app, course):
+    client, course_id = course
+    record, = query(app, 'SELECT id FROM attendance_records WHERE class_date = %s', (day(3),))
+    assert page(client, course_id, before=f"{day(3)}_{record['id']}")[0] == [day(2), day(1), day(0)]
+    assert page(client, course_id, before=f"{day(3)}_{record['id'] + 1}")[0] == [day(3), day(2), day(1)]
+
+
+def test_cursor_past_the_end_shows_no_older_records(app, course):
+    client, course_id = course
+    dates, cursor, html = page(client, course_id, before=f'{day(0)}_1')
+    assert dates == [] and cursor is None
+    assert 'No older attendance records.' in html
+    assert 'Back to newest' in html
+
+
+def test_archived_history_pages_keep_the_archive_flag(app, course):
+    client, course_id = course
+    result = app.test_cli_runner().invoke(args=['archive-semester', 'Fall'])
+    assert result.exit_code == 0, result.output
+
+    dates, cursor, html = page(client, course_id)
+    assert dates == []
+    assert 'This semester is archived.' in html
+
+    seen, cursor = [], None
+    while True:
+        args = {'archive': '1', **({'before': cursor} if cursor else {})}
+        dates, cursor, html = page(client, course_id, **args)
+        if cursor:
+            assert 'archive=1' in html.split('Load older records')[0].rsplit('<a ', 1)[1]
+        seen += dates
+        if not cursor:
+            break
+    assert seen == [day(n) for n in reversed(range(RECORDED))]
@@ -0,0 +1,191 @@
+"""Rejected rows and duplicates in the bulk attendance import.
+
+Runs on SQLite in a temporary directory; each test adds its own user and a course of
+TOTAL_CLASSES classes, then imports through /attendance/import or importer directly.
+
+    python -m pytest tests/test_importer.py
+"""
+import io
+import os
+import sys
+import uuid
+
+import pytest
+
+TOTAL_CLASSES = 4
+PASSWORD = 'importer123'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import importer  # noqa: E402
+import sqlite_backend  # noqa: E402
+from app import create_app, marks_buffer, mysql  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    sqlite_backend.init_schema(str(tmp_path / 'import.db'))
+    app = create_app({
+        'TESTING': True,
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': str(tmp_path / 'import.db'),
+        'MARK_JOURNAL_PATH': str(tmp_path / 'journal.db'),
+        'RATE_LIMITS': '',
+        'SHED_POOL_WAIT_MS': 0,
+        'HASH_POOL_WORKERS': 0,
+        'PURGE_INTERVAL': 0,
+        'PAGE_CACHE_TTL': 0,
+        'USER_CACHE_TTL': 0,
+        'TEMPLATE_CACHE_DIR': '',
+    })
+    yield app
+    marks_buffer.stop()
+
+
+def query(app, sql, args=()):
+    # Every row, read through the app's own connection
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute(sql, args)
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+@pytest.fixture
+def course(app):
+    # A logged-in client enrolled in CS101; returns the client, user id, course id
+    # and enrollment id
+    username = f'importer_{uuid.uuid4().hex[:12]}'
+    client = app.test_client()
+    client.post('/register', data={'username': username, 'password': PASSWORD, 'confirm_password': PASSWORD,
+                                   'full_name': 'Importer', 'email': ''})
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    client.post('/teacher/add', data={'name': 'Teacher', 'email': '', 'department': ''})
+    teacher, = query(app, """
+        SELECT t.id FROM teachers t JOIN users u ON u.id = t.user_id WHERE u.username = %s
+    """, (username,))
+    client.post('/course/add', data={'course_code': 'CS101', 'course_name': 'Course', 'teacher_id': teacher['id'],
+                                     'semester': 'Fall', 'total_classes': str(TOTAL_CLASSES)})
+    enrollment, = query(app, """
+        SELECT e.id, e.user_id, e.course_id FROM enrollments e JOIN users u ON u.id = e.user_id
+        WHERE u.username = %s
+    """, (username,))
+    client.get('/dashboard')    # consume the flashes
+    return client, enrollment['user_id'], enrollment['course_id'], enrollment['id']
+
+
+def run_import(app, user_id, text, fmt='csv', batch_size=1000):
+    with app.app_context():
+        return importer.import_attendance(mysql.connection, user_id, io.StringIO(text), fmt, batch_size)
+
+
+def records(app, enrollment_id):
+    return [(str(r['class_date']), r['status']) for r in query(app, """
+        SELECT class_date, status FROM attendance_records WHERE enrollment_id = %s ORDER BY class_date
+    """, (enrollment_id,))]
+
+
+def counters(app, enrollment_id):
+    row, = query(app, """
+        SELECT classes_held, present_count, absent_count FROM attendance_counters WHERE enrollment_id = %s
+    """, (enrollment_id,))
+    return row['classes_held'], row['present_count'], row['absent_count']
+
+
+def test_bad_rows_are_reported_by_line(app, course):
+    _, user_id, course_id, enrollment_id = course
+    report = run_import(app, user_id, (
+        'course_id,course_code,class_date,status,notes\n'
+        f'{course_id},,2025-01-06,present,\n'       # line 2
+        f'{course_id},,06/01/2025,present,\n'       # line 3
+        f'{course_id},,2025-02-30,present,\n'       # line 4
+        f'{course_id},,2025-01-07,late,\n'          # line 5
+        ',,2025-01-08,present,\n'                   # line 6
+        'abc,,2025-01-08,present,\n'                # line 7
+        ',CS999,2025-01-08,present,\n'              # line 8
+        f'{course_id + 1000},,2025-01-08,present,\n'  # line 9
+        ',CS101,2025-01-09,absent,\n'               # line 10
+    ))
+    assert (report.rows, report.inserted, report.failed) == (9, 2, 7)
+    assert report.errors == [
+        (3, "Invalid class_date: '06/01/2025' (expected YYYY-MM-DD)"),
+        (4, "Invalid class_date: '2025-02-30' (expected YYYY-MM-DD)"),
+        (5, "Invalid status: 'late'"),
+        (6, 'Missing course_id or course_code'),
+        (7, "Invalid course_id: 'abc'"),
+        (8, 'Not enrolled in course CS999'),
+        (9, f'Not enrolled in course {course_id + 1000}'),
+    ]
+    assert records(app, enrollment_id) == [('2025-01-06', 'present'), ('2025-01-09', 'absent')]
+    assert counters(app, enrollment_id) == (2, 1, 1)
+
+
+def test_bad_json_lines_are_reported(app, course):
+    _, user_id, course_id, enrollment_id = course
+    report = run_import(app, user_id, (
+        f'{{"course_id": {course_id}, "class_date": "2025-01-06", "status": "present"}}\n'
+        '{"course_id": \n'
+        '\n'
+        '["not", "an", "object"]\n'
+        f'{{"course_id": {course_id}, "class_date": "2025-01-07", "status": "Absent"}}\n'
+    ), fmt='jsonl')
+    assert (report.rows, report.inserted, report.failed) == (4, 2, 2)
+    assert report.errors[0][0] == 2 and report.errors[0][1].startswith('Invalid JSON: ')
+    assert report.errors[1] == (4, 'Expected a JSON object')
+    assert records(app, enrollment_id) == [('2025-01-06', 'present'), ('2025-01-07', 'absent')]
+
+
+@pytest.mark.parametrize('batch_size', [1000, 2])
+def test_duplicates_are_rejected(app, course, batch_size):
+    # Within the file, across batches and against marks already recorded
+    _, user_id, course_id, enrollment_id = course
+    run_import(app, user_id, f'course_id,class_date,status\n{course_id},2025-01-06,present\n')
+    report = run_import(app, user_id, (
+        'course_id,course_code,class_date,status\n'
+        f'{course_id},,2025-01-06,absent\n'    # line 2: already recorded
+        f'{course_id},,2025-01-07,present\n'   # line 3
+        ',CS101,2025-01-07,absent\n'           # line 4: same class as line 3
+        f'{course_id},,2025-01-08,absent\n'    # line 5
+    ), batch_size=batch_size)
+    assert (report.rows, report.inserted, report.failed) == (4, 2, 2)
+    assert report.errors == [
+        (2, 'Attendance for 2025-01-06 already recorded'),
+        (4, 'Attendance for 2025-01-07 already recorded'),
+    ]
+    assert records(app, enrollment_id) == [('2025-01-06', 'present'), ('2025-01-07', 'present'),
+                                           ('2025-01-08', 'absent')]
+    assert counters(app, enrollment_id) == (3, 2, 1)
+
+
+def test_rows_past_total_classes_are_rejected(app, course):
+    _, user_id, course_id, enrollment_id = course
+    rows = ''.join(f'{course_id},2025-01-{day:02d},present\n' for day in range(1, TOTAL_CLASSES + 3))
+    report = run_import(app, user_id, 'course_id,class_date,status\n' + rows, batch_size=3)
+    assert (report.inserted, report.failed) == (TOTAL_CLASSES, 2)
+    assert {message for _, message in report.errors} == {f'CS101 already has all {TOTAL_CLASSES} classes marked'}
+    assert counters(app, enrollment_id) == (TOTAL_CLASSES, TOTAL_CLASSES, 0)
+
+
+def test_archived_course_is_rejected(app, course):
+    _, user_id, course_id, enrollment_id = course
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute('UPDATE courses SET archived_at = CURRENT_TIMESTAMP WHERE id = %s', (course_id,))
+        mysql.connection.commit()
+        cur.close()
+    report = run_import(app, user_id, f'course_id,class_date,status\n{course_id},2025-01-06,present\n')
+    assert report.errors == [(2, 'CS101 belongs to an archived semester')]
+    assert records(app, enrollment_id) == []
+
+
+def test_upload_reports_the_rejections(app, course):
+    client, _, course_id, enrollment_id = course
+    upload = (f'course_id,class_date,status\n{course_id},2025-01-06,present\n'
+              f'{course_id},2025-01-06,present\n{course_id},someday,present\n').encode()
+    response = client.post('/attendance/import', data={'file': (io.BytesIO(upload), 'marks.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert b'Import finished: 3 rows read, 1 inserted, 2 rejected' in response.data
+    assert b'Attendance for 2025-01-06 already recorded' in response.data
+    assert b'Invalid class_date' in response.data
+    assert records(app, enrollment_id) == [('2025-01-06', 'present')]
+    assert counters(app, enrollment_id) == (1, 1, 0)
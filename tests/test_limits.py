@@ -0,0 +1,140 @@
+"""Per-client budgets and load shedding of limits.Limiter.
+
+A small Flask app with the limiter and the app's 429/503 handlers. time.monotonic is
+replaced by a clock the tests move, so refills don't depend on the speed of the test.
+
+    python -m pytest tests/test_limits.py
+"""
+import os
+import sys
+
+import pytest
+from flask import Flask, session
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import limits  # noqa: E402
+from app import overloaded, rate_limited  # noqa: E402
+from limits import Limiter, Overloaded, RateLimited  # noqa: E402
+
+
+class StubDatabase:
+    # Stands in for db.Database: only the pool wait is read
+    wait = 0.0
+
+    def pool_wait(self):
+        return self.wait
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(limits.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(dict({'SECRET_KEY': 'test', 'RATE_LIMITS': 'page=1:3'}, **config))
+    app.database = StubDatabase()
+    app.limiter = Limiter(app, app.database)
+    app.register_error_handler(RateLimited, rate_limited)
+    app.register_error_handler(Overloaded, overloaded)
+
+    @app.route('/page')
+    def page():
+        return 'ok'
+
+    @app.route('/other')
+    def other():
+        return 'ok'
+
+    @app.route('/metrics')
+    def metrics():
+        return 'ok'
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        session['user_id'] = user_id
+        return 'ok'
+
+    return app
+
+
+def client(app, user_id=None, ip='10.0.0.1'):
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = ip
+    if user_id is not None:
+        client.get(f'/login/{user_id}')
+    return client
+
+
+def statuses(client, count, path='/page'):
+    return [client.get(path).status_code for _ in range(count)]
+
+
+def test_burst_then_429(clock):
+    app = make_app()
+    alice = client(app, user_id=1)
+    assert statuses(alice, 4) == [200, 200, 200, 429]
+    response = alice.get('/page')
+    assert response.headers['Retry-After'] == '1'
+    # Endpoints without a budget are unaffected
+    assert statuses(alice, 5, '/other') == [200] * 5
+
+
+def test_refill_at_the_rate(clock):
+    app = make_app(RATE_LIMITS='page=2:2')
+    alice = client(app, user_id=1)
+    assert statuses(alice, 3) == [200, 200, 429]
+    clock[0] += 0.5    # one token at 2/s
+    assert statuses(alice, 2) == [200, 429]
+    clock[0] += 60     # never more than the burst
+    assert statuses(alice, 3) == [200, 200, 429]
+
+
+def test_users_have_separate_budgets(clock):
+    app = make_app()
+    assert statuses(client(app, user_id=1), 4) == [200, 200, 200, 429]
+    assert statuses(client(app, user_id=2), 3) == [200, 200, 200]
+
+
+def test_logged_out_clients_are_limited_per_ip(clock):
+    app = make_app()
+    assert statuses(client(app, ip='10.0.0.1'), 4) == [200, 200, 200, 429]
+    assert statuses(client(app, ip='10.0.0.1'), 1) == [429]
+    assert statuses(client(app, ip='10.0.0.2'), 1) == [200]
+
+
+def test_many_users_from_one_ip_share_its_budget(clock):
+    # RATE_LIMIT_IP_FACTOR=2: the address holds two users' bursts
+    app = make_app(RATE_LIMIT_IP_FACTOR=2)
+    results = [status for user_id in range(1, 5) for status in statuses(client(app, user_id=user_id), 3)]
+    assert results == [200] * 6 + [429] * 6
+    assert statuses(client(app, user_id=5, ip='10.0.0.2'), 1) == [200]
+
+
+def test_one_user_from_many_ips_keeps_one_budget(clock):
+    app = make_app()
+    results = [status for n in range(4) for status in statuses(client(app, user_id=1, ip=f'10.0.0.{n}'), 1)]
+    assert results == [200, 200, 200, 429]
+
+
+def test_shed_while_the_pool_is_backed_up(clock):
+    app = make_app(SHED_POOL_WAIT_MS=500)
+    alice = client(app, user_id=1)
+    app.database.wait = 0.6
+    response = alice.get('/other')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert alice.get('/metrics').status_code == 200    # exempt
+    app.database.wait = 0.1
+    assert alice.get('/other').status_code == 200
+
+
+def test_shed_and_limited_requests_are_counted(clock):
+    app = make_app(SHED_POOL_WAIT_MS=500)
+    alice = client(app, user_id=1)
+    statuses(alice, 4)
+    app.database.wait = 1.0
+    alice.get('/other')
+    assert app.limiter.stats() == {('page', 'rate_limited'): 1, ('other', 'overloaded'): 1}
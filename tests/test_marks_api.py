@@ -0,0 +1,198 @@
+"""Validation of attendance marks, through the mark form and the batch marks API.
+
+Runs on SQLite in a temporary directory; each test adds its own user and course.
+
+    python -m pytest tests/test_marks_api.py
+"""
+import os
+import sqlite3
+import sys
+import uuid
+
+import pytest
+
+TOTAL_CLASSES = 5
+PASSWORD = 'marker123'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sqlite_backend  # noqa: E402
+from app import create_app, marks_buffer, mysql  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    sqlite_backend.init_schema(str(tmp_path / 'marks.db'))
+    app = create_app({
+        'TESTING': True,
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': str(tmp_path / 'marks.db'),
+        'MARK_JOURNAL_PATH': str(tmp_path / 'journal.db'),
+        'RATE_LIMITS': '',
+        'SHED_POOL_WAIT_MS': 0,
+        'HASH_POOL_WORKERS': 0,
+        'PURGE_INTERVAL': 0,
+        'PAGE_CACHE_TTL': 0,
+        'USER_CACHE_TTL': 0,
+        'TEMPLATE_CACHE_DIR': '',
+    })
+    yield app
+    marks_buffer.stop()
+
+
+def query(app, sql, args=()):
+    # Every row, read through the app's own connection
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute(sql, args)
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+@pytest.fixture
+def course(app):
+    # A logged-in client owning one course of TOTAL_CLASSES classes; returns the
+    # client, course id and enrollment id
+    username = f'marker_{uuid.uuid4().hex[:12]}'
+    client = app.test_client()
+    client.post('/register', data={'username': username, 'password': PASSWORD, 'confirm_password': PASSWORD,
+                                   'full_name': 'Marker', 'email': ''})
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    client.post('/teacher/add', data={'name': 'Teacher', 'email': '', 'department': ''})
+    teacher, = query(app, """
+        SELECT t.id FROM teachers t JOIN users u ON u.id = t.user_id WHERE u.username = %s
+    """, (username,))
+    client.post('/course/add', data={'course_code': 'CS101', 'course_name': 'Course', 'teacher_id': teacher['id'],
+                                     'semester': 'Fall', 'total_classes': str(TOTAL_CLASSES)})
+    enrollment, = query(app, """
+        SELECT e.id, e.course_id FROM enrollments e JOIN users u ON u.id = e.user_id WHERE u.username = %s
+    """, (username,))
+    return client, enrollment['course_id'], enrollment['id']
+
+
+def records(app, enrollment_id):
+    return query(app, 'SELECT class_date, status FROM attendance_records WHERE enrollment_id = %s ORDER BY class_date',
+                 (enrollment_id,))
+
+
+@pytest.mark.parametrize('class_date', ['', 'tomorrow', '2025-02-30', '2025-13-01'])
+def test_form_rejects_bad_class_date(app, course, class_date):
+    client, course_id, enrollment_id = course
+    response = client.post(f'/course/{course_id}/mark', data={'class_date': class_date, 'status': 'present',
+                                                              'notes': ''})
+    assert response.status_code == 400
+    assert b'Invalid class date' in response.data
+    assert records(app, enrollment_id) == []
+
+    # The course page still renders afterwards
+    assert client.get(f'/course/{course_id}').status_code == 200
+
+
+@pytest.mark.parametrize('class_date', ['not a date', '2025-02-30', 20250101])
+def test_api_rejects_bad_class_date(app, course, class_date):
+    client, course_id, enrollment_id = course
+    response = client.post('/api/attendance/marks', json={'marks': [
+        {'course_id': course_id, 'date': '2025-01-01', 'status': 'present'},
+        {'course_id': course_id, 'date': class_date, 'status': 'present'},
+    ]})
+    assert response.status_code == 400
+    assert [error['index'] for error in response.get_json()['errors']] == [1]
+    assert records(app, enrollment_id) == []
+
+
+def test_schema_rejects_bad_class_date(app, course):
+    # Rows written outside the app are checked too, since SQLite accepts any text as a DATE
+    _, _, enrollment_id = course
+    for table, columns, values in [
+        ('attendance_records', 'enrollment_id, class_date, status', "%s, 'soon', 'present'"),
+        ('attendance_archive', 'id, enrollment_id, class_date, status', "1, %s, 'soon', 'present'"),
+        ('attendance_series', 'enrollment_id, class_date, held, present', "%s, 'soon', 1, 1"),
+    ]:
+        with app.app_context():
+            cur = mysql.connection.cursor()
+            with pytest.raises(sqlite3.IntegrityError):
+                cur.execute(f'INSERT INTO {table} ({columns}) VALUES ({values})', (enrollment_id,))
+            mysql.connection.rollback()
+            cur.close()
+
+
+def marks(course_id, *days, status='present'):
+    return {'marks': [{'course_id': course_id, 'date': f'2025-01-{day:02d}', 'status': status} for day in days]}
+
+
+def test_api_records_every_mark(app, course):
+    client, course_id, enrollment_id = course
+    response = client.post('/api/attendance/marks', json=marks(course_id, 1, 2))
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['marked'] == 2
+    course_data, = body['courses']
+    assert (course_data['course_id'], course_data['classes_held'], course_data['present_count'],
+            course_data['absent_count']) == (course_id, 2, 2, 0)
+    assert len(records(app, enrollment_id)) == 2
+
+
+@pytest.mark.parametrize('payload', [None, [], {}, {'marks': []}, {'marks': 'present'}, {'marks': {'course_id': 1}}])
+def test_api_rejects_a_malformed_body(app, course, payload):
+    client, _, enrollment_id = course
+    response = client.post('/api/attendance/marks', json=payload)
+    assert response.status_code == 400
+    assert 'marks' in response.get_json()['error']
+    assert records(app, enrollment_id) == []
+
+
+def test_api_rejects_bad_marks_by_index(app, course):
+    client, course_id, enrollment_id = course
+    response = client.post('/api/attendance/marks', json={'marks': [
+        {'course_id': course_id, 'date': '2025-01-01', 'status': 'present'},
+        'present',
+        {'course_id': course_id, 'date': '2025-01-02', 'status': 'late'},
+        {'date': '2025-01-03', 'status': 'absent'},
+    ]})
+    assert response.status_code == 400
+    assert [error['index'] for error in response.get_json()['errors']] == [1, 2, 3]
+    assert records(app, enrollment_id) == []
+
+
+def test_api_limits_the_marks_per_request(app, course):
+    client, course_id, enrollment_id = course
+    app.config['API_MAX_MARKS'] = 3
+    response = client.post('/api/attendance/marks', json=marks(course_id, 1, 2, 3, 4))
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'At most 3 marks per request.'
+    assert records(app, enrollment_id) == []
+    assert client.post('/api/attendance/marks', json=marks(course_id, 1, 2, 3)).status_code == 200
+
+
+@pytest.mark.parametrize('days, rejected', [
+    ((1, 2, 2), [2]),                                       # the same class twice
+    ((1, 2, 3, 4, 5, 6), [5]),                              # more than TOTAL_CLASSES
+])
+def test_api_conflict_records_nothing(app, course, days, rejected):
+    client, course_id, enrollment_id = course
+    response = client.post('/api/attendance/marks', json=marks(course_id, *days))
+    assert response.status_code == 409
+    assert [error['index'] for error in response.get_json()['errors']] == rejected
+    assert records(app, enrollment_id) == []
+
+
+def test_api_conflicts_with_recorded_marks(app, course):
+    client, course_id, enrollment_id = course
+    assert client.post('/api/attendance/marks', json=marks(course_id, 1)).status_code == 200
+    response = client.post('/api/attendance/marks', json=marks(course_id, 2, 1, status='absent'))
+    assert response.status_code == 409
+    error, = response.get_json()['errors']
+    assert error == {'index': 1, 'error': 'Attendance for 2025-01-01 already recorded'}
+    assert [record['status'] for record in records(app, enrollment_id)] == ['present']
+    counters, = query(app, 'SELECT classes_held FROM attendance_counters WHERE enrollment_id = %s',
+                      (enrollment_id,))
+    assert counters['classes_held'] == 1
+
+
+def test_api_conflict_on_a_course_not_enrolled_in(app, course):
+    client, course_id, enrollment_id = course
+    payload = marks(course_id, 1)
+    payload['marks'].append({'course_id': course_id + 1000, 'date': '2025-01-01', 'status': 'present'})
+    response = client.post('/api/attendance/marks', json=payload)
+    assert response.status_code == 409
+    assert response.get_json()['errors'] == [{'index': 1, 'error': f'Not enrolled in course {course_id + 1000}'}]
+    assert records(app, enrollment_id) == []
@@ -0,0 +1,133 @@
+"""Conditional GETs and the rendered-page cache of the dashboard and course pages.
+
+Runs on SQLite in a temporary directory; each test adds its own user and course.
+
+    python -m pytest tests/test_page_cache.py
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+PASSWORD = 'cached123'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sqlite_backend  # noqa: E402
+from app import create_app, marks_buffer, mysql, page_cache  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    sqlite_backend.init_schema(str(tmp_path / 'pages.db'))
+    app = create_app({
+        'TESTING': True,
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': str(tmp_path / 'pages.db'),
+        'MARK_JOURNAL_PATH': str(tmp_path / 'journal.db'),
+        'RATE_LIMITS': '',
+        'SHED_POOL_WAIT_MS': 0,
+        'HASH_POOL_WORKERS': 0,
+        'PURGE_INTERVAL': 0,
+        'PAGE_CACHE_TTL': 300,
+        'USER_CACHE_TTL': 300,
+        'TEMPLATE_CACHE_DIR': '',
+    })
+    page_cache.clear()
+    yield app
+    marks_buffer.stop()
+
+
+def execute(app, sql, args=()):
+    # Runs one statement through the app's own connection and returns its first row.
+    # Writes made this way happen behind the app's back, as by another process.
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute(sql, args)
+        row = cur.fetchone()
+        mysql.connection.commit()
+        cur.close()
+    return row
+
+
+@pytest.fixture
+def course(app):
+    # A logged-in client owning one course; returns the client, username and course id
+    username = f'cached_{uuid.uuid4().hex[:12]}'
+    client = app.test_client()
+    client.post('/register', data={'username': username, 'password': PASSWORD, 'confirm_password': PASSWORD,
+                                   'full_name': 'Cached', 'email': ''})
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    client.post('/teacher/add', data={'name': 'Teacher', 'email': '', 'department': ''})
+    teacher = execute(app, """
+        SELECT t.id FROM teachers t JOIN users u ON u.id = t.user_id WHERE u.username = %s
+    """, (username,))
+    client.post('/course/add', data={'course_code': 'CS101', 'course_name': 'Original name',
+                                     'teacher_id': teacher['id'], 'semester': 'Fall', 'total_classes': '10'})
+    course = execute(app, """
+        SELECT c.id FROM courses c JOIN users u ON u.id = c.user_id WHERE u.username = %s
+    """, (username,))
+    client.get('/dashboard')    # shows the flashed messages of the setup, uncached
+    return client, username, course['id']
+
+
+@pytest.mark.parametrize('path', ['/dashboard', '/course/{course_id}', '/api/courses/{course_id}/trend'])
+def test_unchanged_page_is_304(app, course, path):
+    client, _, course_id = course
+    path = path.format(course_id=course_id)
+    first = client.get(path)
+    assert first.status_code == 200 and first.headers['ETag']
+    assert 'private' in first.headers['Cache-Control'] and 'no-cache' in first.headers['Cache-Control']
+
+    again = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+def test_write_changes_the_etag(app, course):
+    client, _, course_id = course
+    etag = client.get('/dashboard').headers['ETag']
+    client.post(f'/course/{course_id}/mark', data={'class_date': '2025-01-01', 'status': 'present', 'notes': ''})
+    client.get('/dashboard')    # the flash of the mark is shown once, uncached
+    response = client.get('/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_cached_html_until_a_write(app, course):
+    client, username, course_id = course
+    assert b'Original name' in client.get('/dashboard').data
+
+    # Not written through the app, so the data version is unchanged and the stored page is served
+    execute(app, "UPDATE courses SET course_name = 'Renamed' WHERE id = %s", (course_id,))
+    assert b'Original name' in client.get('/dashboard').data
+
+    # Any write through the app bumps the version: the page is rendered again
+    client.post(f'/course/{course_id}/mark', data={'class_date': '2025-01-01', 'status': 'present', 'notes': ''})
+    client.get('/dashboard')
+    page = client.get('/dashboard').data
+    assert b'Renamed' in page and b'Original name' not in page
+
+
+def test_session_newer_than_the_cached_user_is_not_served_a_stale_page(app, course):
+    # Another worker wrote for this session: its cookie carries the new data version,
+    # which this worker's cached user is older than
+    client, username, course_id = course
+    etag = client.get('/dashboard').headers['ETag']
+    execute(app, "UPDATE courses SET course_name = 'Renamed' WHERE id = %s", (course_id,))
+    execute(app, 'UPDATE users SET data_version = data_version + 1 WHERE username = %s', (username,))
+    with client.session_transaction() as session:
+        session['data_version'] += 1
+
+    response = client.get('/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Renamed' in response.data
+
+
+def test_pages_with_flashes_are_not_cached(app, course):
+    client, _, course_id = course
+    client.post(f'/course/{course_id}/mark', data={'class_date': '2025-01-01', 'status': 'present', 'notes': ''})
+    flashed = client.get(f'/course/{course_id}')
+    assert b'Attendance marked successfully!' in flashed.data
+    assert 'ETag' not in flashed.headers
+    assert b'Attendance marked successfully!' not in client.get(f'/course/{course_id}').data
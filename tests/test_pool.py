@@ -0,0 +1,151 @@
+"""Exhaustion, timeouts and broken connections in db.ConnectionPool.
+
+No database is needed: the pool is given a connect() that returns stub connections,
+which can be told to fail their rollback or ping the way a dropped connection does.
+
+    python -m pytest tests/test_pool.py
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from db import ConnectionPool, PoolTimeout  # noqa: E402
+
+
+class StubConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.broken = False
+
+    def rollback(self):
+        if self.broken:
+            raise ConnectionError('server has gone away')
+
+    def ping(self):
+        if self.broken:
+            raise ConnectionError('server has gone away')
+
+    def close(self):
+        self.closed = True
+
+
+class Connector:
+    # connect() for the pool; fails while failing is set
+    def __init__(self):
+        self.made = []
+        self.failing = False
+
+    def __call__(self):
+        if self.failing:
+            raise ConnectionError('connection refused')
+        conn = StubConnection(len(self.made))
+        self.made.append(conn)
+        return conn
+
+
+@pytest.fixture
+def connect():
+    return Connector()
+
+
+def make_pool(connect, **options):
+    return ConnectionPool(connect, **dict({'min_size': 0, 'max_size': 2, 'timeout': 5.0, 'ping_interval': 3600},
+                                          **options))
+
+
+def acquire_in_thread(pool):
+    # Start a caller that waits for a connection; returns its thread and result
+    result = {}
+
+    def borrow():
+        try:
+            result['conn'] = pool.acquire()
+        except PoolTimeout as e:
+            result['error'] = e
+    thread = threading.Thread(target=borrow, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while pool.stats()['waiting'] < 1:
+        assert time.monotonic() < deadline, 'the caller never waited'
+        time.sleep(0.005)
+    return thread, result
+
+
+def test_exhausted_pool_times_out(connect):
+    pool = make_pool(connect, timeout=0.05)
+    held = [pool.acquire(), pool.acquire()]
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.05
+    stats = pool.stats()
+    assert (stats['timeouts'], stats['waits'], stats['size'], stats['in_use']) == (1, 1, 2, 2)
+    assert stats['wait_seconds_max'] >= 0.05
+    assert stats['waiting'] == 0 and stats['oldest_wait_seconds'] == 0.0
+    assert len(connect.made) == 2
+
+    # Once one is back, it is handed out again without opening another
+    pool.release(held.pop())
+    assert pool.acquire() is connect.made[1]
+    assert len(connect.made) == 2
+
+
+def test_waiting_caller_gets_the_released_connection(connect):
+    pool = make_pool(connect, max_size=1)
+    conn = pool.acquire()
+    thread, result = acquire_in_thread(pool)
+    assert pool.oldest_wait() > 0
+    pool.release(conn)
+    thread.join(5)
+    assert result == {'conn': conn}
+    stats = pool.stats()
+    assert (stats['waits'], stats['timeouts'], stats['created'], stats['acquired']) == (1, 0, 1, 2)
+
+
+def test_discarded_connection_frees_its_slot(connect):
+    pool = make_pool(connect, max_size=1)
+    conn = pool.acquire()
+    thread, result = acquire_in_thread(pool)
+    pool.release(conn, discard=True)
+    thread.join(5)
+    assert conn.closed
+    assert result['conn'] is connect.made[1]
+    stats = pool.stats()
+    assert (stats['size'], stats['closed'], stats['created']) == (1, 1, 2)
+
+
+def test_connection_that_fails_its_rollback_is_not_reused(connect):
+    pool = make_pool(connect)
+    conn = pool.acquire()
+    conn.broken = True
+    pool.release(conn)
+    assert conn.closed
+    assert pool.stats()['size'] == 0
+    assert pool.acquire() is connect.made[1]
+
+
+def test_idle_connection_that_fails_its_ping_is_replaced(connect):
+    pool = make_pool(connect, ping_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.broken = True
+    assert pool.acquire() is connect.made[1]
+    assert conn.closed
+    stats = pool.stats()
+    assert (stats['ping_failures'], stats['closed'], stats['size']) == (1, 1, 1)
+
+
+def test_failed_connect_frees_its_slot(connect):
+    pool = make_pool(connect, max_size=1, timeout=0.05)
+    connect.failing = True
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            pool.acquire()
+    assert pool.stats()['size'] == 0
+    connect.failing = False
+    assert pool.acquire() is connect.made[0]
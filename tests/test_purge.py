@@ -0,0 +1,205 @@
+"""Soft deletes of courses, teachers and users, and the purge that removes their data.
+
+Runs on SQLite in a temporary directory. Each test adds users through the app, each
+with a teacher, a live course and an archived one, all with marks recorded, then
+checks that a delete hides rows at once and the purge removes exactly those rows.
+
+    python -m pytest tests/test_purge.py
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+PASSWORD = 'purger123'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import purge  # noqa: E402
+import sqlite_backend  # noqa: E402
+from app import create_app, marks_buffer, mysql, purger  # noqa: E402
+
+# Tables keyed by enrollment, and the rest keyed by owner
+ENROLLMENT_TABLES = ('attendance_records', 'attendance_archive', 'attendance_series', 'attendance_counters')
+OWNER_TABLES = {'users': 'id', 'teachers': 'user_id', 'courses': 'user_id', 'enrollments': 'user_id',
+                'attendance_settings': 'user_id'}
+
+
+@pytest.fixture
+def app(tmp_path):
+    sqlite_backend.init_schema(str(tmp_path / 'purge.db'))
+    app = create_app({
+        'TESTING': True,
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': str(tmp_path / 'purge.db'),
+        'MARK_JOURNAL_PATH': str(tmp_path / 'journal.db'),
+        'RATE_LIMITS': '',
+        'SHED_POOL_WAIT_MS': 0,
+        'HASH_POOL_WORKERS': 0,
+        'PURGE_INTERVAL': 0,
+        'PURGE_BATCH_SIZE': 2,
+        'PURGE_PAUSE': 0,
+        'PAGE_CACHE_TTL': 0,
+        'USER_CACHE_TTL': 0,
+        'TEMPLATE_CACHE_DIR': '',
+    })
+    yield app
+    marks_buffer.stop()
+
+
+def query(app, sql, args=()):
+    # Every row, read through the app's own connection
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute(sql, args)
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+def add_account(app):
+    # A logged-in user with one teacher, a live course (LIVE) and a course archived
+    # with the 'Old' semester (OLD), three marks each; returns the client and ids
+    username = f'purger_{uuid.uuid4().hex[:12]}'
+    client = app.test_client()
+    client.post('/register', data={'username': username, 'password': PASSWORD, 'confirm_password': PASSWORD,
+                                   'full_name': 'Purger', 'email': ''})
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    client.post('/teacher/add', data={'name': 'Teacher', 'email': '', 'department': ''})
+    teacher, = query(app, """
+        SELECT t.id, t.user_id FROM teachers t JOIN users u ON u.id = t.user_id WHERE u.username = %s
+    """, (username,))
+    for code, semester in (('LIVE', 'Fall'), ('OLD', 'Old')):
+        client.post('/course/add', data={'course_code': code, 'course_name': code, 'teacher_id': teacher['id'],
+                                         'semester': semester, 'total_classes': '10'})
+    courses = {row['course_code']: row for row in query(app, """
+        SELECT c.id, c.course_code, e.id as enrollment_id FROM courses c JOIN enrollments e ON e.course_id = c.id
+        WHERE c.user_id = %s
+    """, (teacher['user_id'],))}
+    response = client.post('/api/attendance/marks', json={'marks': [
+        {'course_id': course['id'], 'date': f'2025-01-0{day}', 'status': 'present'}
+        for course in courses.values() for day in (1, 2, 3)
+    ]})
+    assert response.status_code == 200
+    client.get('/dashboard')    # consume the flashes
+    return {'client': client, 'username': username, 'user_id': teacher['user_id'], 'teacher_id': teacher['id'],
+            'courses': {code: course['id'] for code, course in courses.items()},
+            'enrollments': {code: course['enrollment_id'] for code, course in courses.items()}}
+
+
+@pytest.fixture
+def accounts(app):
+    # Two users; the 'Old' semester of both is archived
+    accounts = [add_account(app), add_account(app)]
+    result = app.test_cli_runner().invoke(args=['archive-semester', 'Old'])
+    assert result.exit_code == 0, result.output
+    return accounts
+
+
+def remaining(app, account):
+    # Rows left per table for the account's user and enrollments
+    counts = {}
+    for table, column in OWNER_TABLES.items():
+        counts[table] = query(app, f'SELECT COUNT(*) as n FROM {table} WHERE {column} = %s',
+                              (account['user_id'],))[0]['n']
+    enrollment_ids = list(account['enrollments'].values())
+    placeholders = ', '.join(['%s'] * len(enrollment_ids))
+    for table in ENROLLMENT_TABLES:
+        counts[table] = query(app, f'SELECT COUNT(*) as n FROM {table} WHERE enrollment_id IN ({placeholders})',
+                              enrollment_ids)[0]['n']
+    return counts
+
+
+def enrollment_rows(app, enrollment_id):
+    return {table: query(app, f'SELECT COUNT(*) as n FROM {table} WHERE enrollment_id = %s',
+                         (enrollment_id,))[0]['n'] for table in ENROLLMENT_TABLES}
+
+
+def run_purge(app, batch_size=2):
+    with app.app_context():
+        return purge.purge_deleted(mysql.connection, batch_size=batch_size, pause=0)
+
+
+def test_accounts_start_with_rows_everywhere(app, accounts):
+    # So that the zero counts below mean something
+    assert all(remaining(app, accounts[0]).values())
+    assert enrollment_rows(app, accounts[0]['enrollments']['OLD'])['attendance_archive'] == 3
+    assert enrollment_rows(app, accounts[0]['enrollments']['LIVE'])['attendance_records'] == 3
+
+
+def test_deleted_course_is_hidden_then_purged(app, accounts):
+    owner, other = accounts
+    client, course_id = owner['client'], owner['courses']['LIVE']
+    before = remaining(app, other)
+    client.post(f'/course/{course_id}/delete')
+
+    # Hidden at once, though its rows are still there
+    assert b'LIVE' not in client.get('/courses').data
+    assert b'LIVE' not in client.get('/dashboard').data
+    assert client.get(f'/course/{course_id}').status_code == 302
+    assert enrollment_rows(app, owner['enrollments']['LIVE'])['attendance_records'] == 3
+
+    deleted = run_purge(app)
+    assert deleted == {'attendance_records': 3, 'attendance_series': 3, 'enrollments': 1, 'courses': 1}
+    assert set(enrollment_rows(app, owner['enrollments']['LIVE']).values()) == {0}
+    assert query(app, 'SELECT COUNT(*) as n FROM attendance_settings WHERE course_id = %s',
+                 (course_id,))[0]['n'] == 0
+    # The owner's other course and the other user are untouched
+    assert enrollment_rows(app, owner['enrollments']['OLD'])['attendance_archive'] == 3
+    assert remaining(app, other) == before
+    assert run_purge(app) == {}
+
+
+def test_teacher_is_purged_after_its_deleted_courses(app, accounts):
+    owner, _ = accounts
+    client = owner['client']
+    for course_id in owner['courses'].values():
+        client.post(f'/course/{course_id}/delete')
+    client.post(f"/teacher/{owner['teacher_id']}/delete")
+    assert b'Teacher deleted successfully!' in client.get('/teachers').data
+
+    deleted = run_purge(app, batch_size=1)
+    assert (deleted['courses'], deleted['teachers'], deleted['attendance_archive']) == (2, 1, 3)
+    counts = remaining(app, owner)
+    assert counts.pop('users') == 1
+    assert set(counts.values()) == {0}
+
+
+def test_deleted_user_is_logged_out_then_purged_by_the_cli(app, accounts):
+    owner, other = accounts
+    before = remaining(app, other)
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['delete-user', owner['username']])
+    assert result.exit_code == 0, result.output
+
+    assert owner['client'].get('/dashboard').status_code == 302
+    response = app.test_client().post('/login', data={'username': owner['username'], 'password': PASSWORD})
+    assert b'Invalid username or password.' in response.data
+
+    result = runner.invoke(args=['purge-deleted', '--dry-run'])
+    assert 'Waiting: 2 courses, 1 teachers, 1 users' in result.output
+    assert remaining(app, owner)['attendance_records'] == 3
+
+    result = runner.invoke(args=['purge-deleted'])
+    assert result.exit_code == 0, result.output
+    assert set(remaining(app, owner).values()) == {0}
+    assert remaining(app, other) == before
+    assert 'Waiting: 0 courses, 0 teachers, 0 users' in runner.invoke(args=['purge-deleted', '--dry-run']).output
+
+
+def test_stopped_purge_leaves_the_rest_for_the_next_run(app, accounts):
+    owner, _ = accounts
+    owner['client'].post(f"/course/{owner['courses']['LIVE']}/delete")
+
+    class Stopping:
+        # Set from the third check on, which comes after the first batch is deleted
+        def __init__(self):
+            self.checks = 0
+
+        def is_set(self):
+            self.checks += 1
+            return self.checks > 2
+
+    assert purger.run_once(Stopping()) == {'attendance_records': 2}
+    assert enrollment_rows(app, owner['enrollments']['LIVE'])['attendance_records'] == 1
+    assert purger.run_once()['courses'] == 1
+    assert set(enrollment_rows(app, owner['enrollments']['LIVE']).values()) == {0}
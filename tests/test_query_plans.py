@@ -0,0 +1,101 @@
+"""Query plans of the hot paths must not scan whole tables.
+
+Runs the guard of benchmarks/query_plans.py at a small scale on a temporary SQLite
+database: every table holds more rows than MAX_ROWS, so any full scan is reported.
+
+    python -m pytest tests/test_query_plans.py
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import query_plans  # noqa: E402
+import sqlite_backend  # noqa: E402
+from app import create_app, mysql  # noqa: E402
+
+MAX_ROWS = 250
+
+# Endpoints (and the flusher) serving every page view and mark, the admin report and
+# the background purge
+HOT_LABELS = ['login', 'dashboard', 'course_detail', 'course_trend', 'courses', 'mark_attendance',
+              'api_mark_attendance', 'mark flusher', 'attendance_report', 'cli purge-deleted']
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('plans')
+    sqlite_backend.init_schema(str(tmp / 'plans.db'))
+    return create_app({
+        'TESTING': True,
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': str(tmp / 'plans.db'),
+        'MARK_JOURNAL_PATH': str(tmp / 'journal.db'),
+        'RATE_LIMITS': '',
+        'HASH_POOL_WORKERS': 0,
+        'PURGE_INTERVAL': 0,
+        'PAGE_CACHE_TTL': 0,
+        'TEMPLATE_CACHE_DIR': '',
+    })
+
+
+@pytest.fixture(scope='module')
+def checked(app):
+    sizes, results = query_plans.check_plans(app, users=300, courses=5, records=10, max_rows=MAX_ROWS)
+    assert min(sizes[table] for table in sizes if table != 'attendance_archive') > MAX_ROWS
+    return sizes, results
+
+
+@pytest.fixture(scope='module')
+def plans(checked):
+    return checked[1]
+
+
+@pytest.mark.parametrize('label', HOT_LABELS)
+def test_hot_query_plans(plans, label):
+    statements = [(key, lines, issues) for name, key, lines, issues, _ in plans if name == label]
+    assert statements, f'no statements captured for {label}'
+    for key, lines, issues in statements:
+        assert not issues, f'{label}: {key}\n' + '\n'.join(lines + issues)
+
+
+def test_no_plan_regressions(plans):
+    failures = [f'{label}: {key} {issues}' for label, key, _, issues, verdict in plans if verdict == 'FAIL']
+    assert not failures, '\n'.join(failures)
+
+
+def test_aliases_inside_views():
+    views = {'attendance_summary': 'SELECT c.id FROM users u JOIN enrollments e ON u.id = e.user_id '
+                                   'JOIN courses c ON e.course_id = c.id'}
+    aliases = query_plans.table_aliases('SELECT * FROM attendance_summary WHERE user_id = %s', views)
+    assert aliases['c'] == {'courses'}
+    assert aliases['e'] == {'enrollments'}
+    assert aliases['attendance_summary'] == {'users', 'enrollments', 'courses'}
+
+
+def test_alias_reused_in_subquery():
+    aliases = query_plans.table_aliases(
+        'SELECT * FROM courses c WHERE c.id IN (SELECT e.course_id FROM enrollments e '
+        'JOIN attendance_counters c ON c.enrollment_id = e.id)')
+    assert aliases['c'] == {'courses', 'attendance_counters'}
+
+
+def test_archive_and_purge_ran(plans):
+    # A real semester was archived and deleted rows were purged, so their statements were explained
+    statements = {label: [key for name, key, _, _, _ in plans if name == label]
+                  for label in ('cli archive-semester', 'cli purge-deleted')}
+    assert any(key.startswith('INSERT INTO attendance_archive') for key in statements['cli archive-semester'])
+    assert any(key.startswith('DELETE FROM courses') for key in statements['cli purge-deleted'])
+
+
+def test_scan_reports_the_aliased_table(app, checked):
+    # attendance_summary joins courses as c; filtering on an unindexed column scans it
+    sizes, _ = checked
+    with app.app_context():
+        _, issues = query_plans.explain_sqlite(mysql.connection, 'SELECT * FROM attendance_summary '
+                                               'WHERE course_name = %s', ('x',), sizes, MAX_ROWS)
+    assert any(issue.startswith('full scan of courses ') for issue in issues)
+    assert not any('attendance_records' in issue for issue in issues)
@@ -0,0 +1,192 @@
+"""Read replica routing of db.Database, against stub connections.
+
+No MySQL server is needed: the extension's connect() is replaced by stubs that
+remember which host they belong to and answer SHOW SLAVE STATUS with the lag set
+in the lag fixture (None for stopped replication, no entry for one that is down).
+
+    python -m pytest tests/test_replicas.py
+"""
+import os
+import sys
+import time
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from db import Database, Replica  # noqa: E402
+
+REPLICAS = ['replica1', 'replica2']
+
+
+class StubCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.row = None
+
+    def execute(self, sql, args=None):
+        self.conn.queries.append(sql)
+        if sql == 'SHOW SLAVE STATUS':
+            self.row = {'Seconds_Behind_Master': self.conn.lag[self.conn.host]}
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    def __init__(self, host, lag):
+        self.host = host
+        self.lag = lag
+        self.queries = []
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def rollback(self):
+        pass
+
+    def ping(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def lag():
+    # Replica host -> Seconds_Behind_Master; remove a host to take it down
+    return {replica: 0 for replica in REPLICAS}
+
+
+@pytest.fixture
+def app(lag):
+    app = Flask(__name__)
+    app.config.update({
+        'SECRET_KEY': 'test',
+        'MYSQL_HOST': 'primary',
+        'MYSQL_USER': 'app',
+        'MYSQL_PASSWORD': '',
+        'MYSQL_DB': 'sixtypercent',
+        'MYSQL_REPLICAS': REPLICAS,
+        'MYSQL_REPLICA_PIN_SECONDS': 5.0,
+        'MYSQL_REPLICA_MAX_LAG': 10.0,
+        # Long enough that the checks below are the only ones, unless a test shortens it
+        'MYSQL_REPLICA_CHECK_INTERVAL': 3600,
+    })
+    database = Database(app)
+
+    def connect(settings=None):
+        host = (settings or {}).get('host', app.config['MYSQL_HOST'])
+        if host != 'primary' and host not in lag:
+            raise ConnectionError(f'{host} is down')
+        return StubConnection(host, lag)
+    database.connect = connect
+
+    @app.route('/read', methods=['GET', 'POST'])
+    @database.read_replica
+    def read():
+        return database.connection.host
+
+    @app.route('/write', methods=['POST'])
+    def write():
+        return database.connection.host
+
+    @app.route('/plain')
+    def plain():
+        return database.connection.host
+
+    app.database = database
+    return app
+
+
+def checked(app):
+    # The replicas once the background thread has checked each of them
+    replicas = app.database.replicas
+    deadline = time.monotonic() + 5
+    while any(replica.checked_at == 0 for replica in replicas):
+        assert time.monotonic() < deadline, 'replicas were never checked'
+        time.sleep(0.01)
+    return replicas
+
+
+def test_gets_of_read_only_views_use_the_replicas(app):
+    checked(app)
+    client = app.test_client()
+    hosts = [client.get('/read').text for _ in range(4)]
+    assert sorted(hosts) == ['replica1', 'replica1', 'replica2', 'replica2']
+    assert client.post('/read').text == 'primary'
+    assert client.get('/plain').text == 'primary'
+
+
+def test_no_healthy_replica_reads_from_the_primary(app, lag):
+    lag['replica1'] = None
+    lag['replica2'] = 60
+    replicas = checked(app)
+    assert [replica.reason for replica in replicas] == ['replication stopped', '60s behind']
+    assert app.test_client().get('/read').text == 'primary'
+
+
+def test_session_is_pinned_to_the_primary_after_a_write(app):
+    checked(app)
+    client = app.test_client()
+    assert client.post('/write').text == 'primary'
+    with client.session_transaction() as session:
+        assert 'written_at' in session
+    assert client.get('/read').text == 'primary'
+
+    # Once the pin expires, the up-to-date replicas serve the session again
+    with client.session_transaction() as session:
+        session['written_at'] = time.time() - 60
+    assert client.get('/read').text in REPLICAS
+
+
+def test_lagging_replica_is_skipped_until_it_caught_up_with_the_write(app, lag):
+    lag['replica1'] = 8
+    checked(app)
+    app.config['MYSQL_REPLICA_PIN_SECONDS'] = 0
+    client = app.test_client()
+
+    # Written 3s ago: replica1, 8s behind, may not have applied it yet
+    with client.session_transaction() as session:
+        session['written_at'] = time.time() - 3
+    assert {client.get('/read').text for _ in range(4)} == {'replica2'}
+
+    # Written 30s ago: both replicas have it
+    with client.session_transaction() as session:
+        session['written_at'] = time.time() - 30
+    assert {client.get('/read').text for _ in range(4)} == set(REPLICAS)
+
+
+def test_caught_up_counts_the_time_since_the_check():
+    replica = Replica('replica1', pool=None)
+    assert not replica.healthy and not replica.caught_up(60)    # unused until its first check
+    replica.lag, replica.checked_at = 2, time.monotonic()
+    assert replica.caught_up(5)
+    assert not replica.caught_up(3)     # lag is rounded to whole seconds
+    replica.checked_at -= 10
+    assert not replica.caught_up(5)     # it may have fallen behind since
+
+
+def test_health_thread_follows_the_replicas(app, lag):
+    app.config['MYSQL_REPLICA_CHECK_INTERVAL'] = 0.01
+    replicas = checked(app)
+    assert all(replica.healthy for replica in replicas)
+
+    def wait_for(condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    del lag['replica1']
+    wait_for(lambda: not replicas[0].healthy)
+    assert replicas[0].reason.startswith('unreachable')
+    assert app.test_client().get('/read').text == 'replica2'
+
+    lag['replica1'] = 0
+    wait_for(lambda: replicas[0].healthy)
+    assert replicas[0].reason == 'ok'
+    app.config['MYSQL_REPLICA_CHECK_INTERVAL'] = 3600
@@ -0,0 +1,64 @@
+from attendance import course_metrics_batch
+
+# Attendance trends
+# The trend endpoint reads attendance_series (kept up to date in counters.py): one
+# index range per course, no replay of attendance_records.
+
+# The series of one enrollment, oldest first (a primary key range). Args: (enrollment_id,)
+TREND_SQL = """
+    SELECT class_date, held, present FROM attendance_series
+    WHERE enrollment_id = %s
+    ORDER BY class_date
+"""
+
+
+def with_pending(series, pending):
+    # Series points with unflushed write-behind marks (markbuffer) folded in
+    if not pending:
+        return series
+    steps, held, present = {}, 0, 0
+    for row in series:
+        steps[row['class_date']] = [row['held'] - held, row['present'] - present]
+        held, present = row['held'], row['present']
+    for mark in pending:
+        step = steps.setdefault(mark['class_date'], [0, 0])
+        step[0] += 1
+        step[1] += 1 if mark['status'] == 'present' else 0
+
+    points, held, present = [], 0, 0
+    for class_date in sorted(steps):
+        held += steps[class_date][0]
+        present += steps[class_date][1]
+        points.append({'class_date': class_date, 'held': held, 'present': present})
+    return points
+
+
+def trend_payload(course, series, required_percentage):
+    # Column-oriented JSON for charting: parallel arrays, one entry per class date, plus
+    # the dates on which the zone changed. Zones use the course's current total_classes
+    # and required percentage, the same math as the course page.
+    dates = [row['class_date'].isoformat() for row in series]
+    held = [row['held'] for row in series]
+    present = [row['present'] for row in series]
+    count = len(series)
+    metrics = course_metrics_batch([course['total_classes']] * count, held, present,
+                                   [required_percentage] * count)
+
+    zones, previous = [], None
+    for i in range(count):
+        zone = 'dead' if metrics['dead_zone'][i] else 'danger' if metrics['danger_zone'][i] else 'ok'
+        if zone != previous:
+            zones.append([dates[i], zone])
+            previous = zone
+
+    return {
+        'course_id': course['id'],
+        'course_code': course['course_code'],
+        'total_classes': course['total_classes'],
+        'required_percentage': float(required_percentage),
+        'dates': dates,
+        'held': held,
+        'present': present,
+        'percentage': [float(p) for p in metrics['attendance_percentage']],
+        'zones': zones,
+    }